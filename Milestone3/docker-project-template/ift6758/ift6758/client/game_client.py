@@ -3,6 +3,7 @@ import logging
 import os
 from pathlib import Path
 import tempfile
+import threading
 import omegaconf
 from rich.logging import RichHandler
 
@@ -20,9 +21,18 @@ class GameClient:
 
         The cache is updated at each request (if the sample is not already in the cache)
             and is used to avoid sending the same sample to the model multiple times
+
+    Note about the raw data:
+        the json file of the game is fetched with an HTTP_Cache (sqlite file next to the json files) storing its ETag/Last-Modified,
+            so that polling a live game makes conditional GET requests (304 ---> no body downloaded)
+            and a finished game is not requested anymore once saved locally
+        the HTTP_Cache is built once per process and shared by the clients (a client is built at each poll of a live game)
     
     '''
 
+    _http_caches = {} # sqlite file ---> HTTP_Cache, see `get_http_cache()`
+    _http_caches_lock = threading.Lock()
+
     def __init__(
             self,
             game_id: str,
@@ -35,6 +45,20 @@ class GameClient:
         self.cache_sqllite_path_file = Path(cache_sqllite_path_file)
         self._init_cache()
         self.cache_sqllite_path_file.parent.mkdir(parents=True, exist_ok=True)
+        self.raw_data_dir = Path(os.getenv('DATA_FOLDER')) / 'raw_data'
+        self.http_cache = self.get_http_cache(self.raw_data_dir / 'http_cache.sqlite')
+
+    @staticmethod
+    def get_http_cache(sqlite_path_file : Path):
+        """
+        HTTP_Cache of the raw json files stored in `sqlite_path_file`, built once per process (one sqlite connection) and shared by the clients.
+        """
+
+        from ..data.http_cache import HTTP_Cache
+        with GameClient._http_caches_lock:
+            if sqlite_path_file not in GameClient._http_caches:
+                GameClient._http_caches[sqlite_path_file] = HTTP_Cache(sqlite_path_file)
+            return GameClient._http_caches[sqlite_path_file]
 
     def _init_cache(self) -> None:
         """
@@ -59,6 +83,7 @@ class GameClient:
             response_raw_data = Game_endpoints_Fetcher(f"game/{self.game_id}/feed/live").fetch(
                         output_format="json",
                         save_local=output_path_raw_data,
+                        cache=self.http_cache,
                     )
         elif self.nhl_api_version == "v2":
             from ..data.nhl_rest_api_fetcher_V2 import Game_endpoints_Fetcher_v2
@@ -67,6 +92,7 @@ class GameClient:
                     ).fetch(
                         output_format="json",
                         save_local=output_path_raw_data,
+                        cache=self.http_cache,
                     )
         
         return response_raw_data, output_path_raw_data
@@ -87,6 +113,7 @@ class GameClient:
                 path_csv_output = output_path_csv,
                 json_files_to_consider = [Path(raw_json_path)],
                 shotGoalOnly=True,
+                stream=True,
             )
         
         return parser_obj
@@ -98,7 +125,7 @@ class GameClient:
         """
 
         # --------------------- Fetching data from NHL API
-        json_output_path = Path(os.getenv('DATA_FOLDER')) / 'raw_data' / f'{self.game_id}.json'
+        json_output_path = self.raw_data_dir / f'{self.game_id}.json'
         json_output_path.parent.mkdir(parents=True, exist_ok=True)
         raw_json_data, raw_json_path = self.fetch_nhl_api(json_output_path)
 
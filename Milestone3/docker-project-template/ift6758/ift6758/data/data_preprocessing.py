@@ -322,7 +322,8 @@ class NHL_data_preprocessor:
         df = data.copy()
 
         logger.info("IMPUTE NA IN shotType COLUMN BY 'Wrist Shot'")
-        df['shotType'] = df['shotType'].fillna('Wrist Shot')
+        # encoded from its values : a categorical (see play_schema.py) would also get a column per unused category
+        df['shotType'] = df['shotType'].astype(object).fillna('Wrist Shot')
         one_hot_encoded_df = pd.get_dummies(df, columns=['shotType'], prefix='', prefix_sep='shotType_')
         logger.info('ONE-HOT ENCODING shotType COLUMN : {}'.format(df['shotType'].nunique()))
         return one_hot_encoded_df
@@ -347,7 +348,8 @@ class NHL_data_preprocessor:
 
         df = data.copy()
 
-        isAwayTeam = (df["byTeam"] != df["homeTeam"])
+        # byTeam and homeTeam are categoricals whose categories differ (see play_schema.py), compared as values
+        isAwayTeam = (df["byTeam"].astype(object) != df["homeTeam"].astype(object))
         df["strength"] = df["homeSkaters"] - df["awaySkaters"]
         df.loc[isAwayTeam, "strength"] = -df.loc[isAwayTeam, "strength"]
 
@@ -388,6 +390,9 @@ class NHL_data_preprocessor:
             'EMERGENCY_GOALTENDER'
         ]
 
+        # encoded from its values : 'OTHER' is not a category of the categorical eventType (see play_schema.py)
+        # and the event types grouped into 'OTHER' would still get a column
+        df['lastEventType'] = df['lastEventType'].astype(object)
         df.loc[df['lastEventType'].isin(other_events), 'lastEventType'] = 'OTHER'
         one_hot_encoded_df = pd.get_dummies(df, columns=['lastEventType'], prefix='', prefix_sep='lastEventType_')
         logger.info('ONE-HOT ENCODING lastEventType COLUMN : {}'.format(df['lastEventType'].nunique()))
@@ -414,7 +419,7 @@ class NHL_data_preprocessor:
         df = data.copy()
 
         unique_games_df = df.drop_duplicates(subset='gameId')
-        team_wins = unique_games_df.groupby(['season', 'winTeam']).size()
+        team_wins = unique_games_df.groupby(['season', 'winTeam'], observed=True).size()
         team_rank = team_wins.groupby(level=0, group_keys=False).rank(method='first', ascending=False)
 
         df = df.join(team_rank.rename('team_rank'), on=['season', 'winTeam'])
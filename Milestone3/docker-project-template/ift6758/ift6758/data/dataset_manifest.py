@@ -0,0 +1,181 @@
+"""
+Persistent record (sqlite file next to the dataset, with the sqlite_utils library) of the raw games that went into a dataset
+written by `JsonParser.load_all_seasons()` / `JsonParser_v2.load_all_seasons()`, used by their `incremental` mode
+to only parse the games that are new or whose file changed since the last run : their rows are then appended to the dataset
+or replace the previous ones (see `parquet_dataset.update_dataset()`), instead of rebuilding the dataset from scratch.
+
+    raw_data_2016_2020.parquet/
+    raw_data_2016_2020.parquet.sources.sqlite
+
+A game is identified by its gameId and fingerprinted by the sha256 of its file (of its compressed frame for a game of a .nhlpack archive).
+A file is only hashed again if its size or modification time differ from the ones recorded, so checking
+5 seasons that did not change costs one stat per file (per archive).
+
+The manifest is updated once the dataset is written : after a crash, the next run parses the same games again
+and their rows replace the ones already written, never a game missing or counted twice.
+
+Tables :
+    - `games`   : gameId, source (path of the file or of the archive), sha256, recorded_at
+    - `sources` : path, size, mtime_ns (of the files and archives at the time their games were parsed)
+    - `options` : name, value (json) of the options the dataset was parsed with (i.e. shotGoalOnly), other options means a full rebuild
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+from sqlite_utils import Database
+
+from .fetch_manifest import sha256_of_file
+from .raw_archive import Season_Archive, is_raw_archive
+
+MANIFEST_SUFFIX = ".sources.sqlite"
+
+class Game_Fingerprint(NamedTuple):
+    source : str
+    size : int
+    mtime_ns : int
+    sha256 : str
+
+def manifest_path_of(dataset_path : Union[str, Path]) -> Path:
+    """Sqlite file of the manifest of a dataset, next to it (not inside a .parquet directory, which is replaced at every full write)
+    """
+    dataset_path = Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name + MANIFEST_SUFFIX)
+
+
+class Dataset_Manifest:
+
+    def __init__(self, dataset_path : Union[str, Path]) -> None:
+        self.dataset_path = Path(dataset_path)
+        self.sqlite_path_file = manifest_path_of(self.dataset_path)
+        self.sqlite_path_file.parent.mkdir(parents=True, exist_ok=True)
+        self.db = Database(self.sqlite_path_file)
+
+        self.db["games"].create(
+            {
+                "gameId": int,
+                "source": str,
+                "sha256": str,
+                "recorded_at": float,
+            },
+            pk="gameId",
+            if_not_exists=True,
+        )
+        self.db["sources"].create(
+            {
+                "path": str,
+                "size": int,
+                "mtime_ns": int,
+            },
+            pk="path",
+            if_not_exists=True,
+        )
+        self.db["options"].create(
+            {
+                "name": str,
+                "value": str,
+            },
+            pk="name",
+            if_not_exists=True,
+        )
+
+    # ------------------------------------------------------------------ options
+
+    def matches(self, options : dict) -> bool:
+        """True if the dataset exists and its recorded games were parsed with `options`
+            (False for a dataset written without the incremental mode : nothing is known about its games)
+        """
+        recorded = {row["name"]: row["value"] for row in self.db["options"].rows}
+        return self.dataset_path.exists() and recorded == {name: json.dumps(value) for name, value in options.items()}
+
+    def reset(self, options : dict) -> None:
+        """Forget every game recorded, before a full rebuild of the dataset with `options`
+        """
+        with self.db.conn:
+            for table in ("games", "sources", "options"):
+                self.db[table].delete_where()
+            self.db["options"].insert_all(
+                [{"name": name, "value": json.dumps(value)} for name, value in options.items()],
+                pk="name",
+            )
+
+    # ------------------------------------------------------------------ games
+
+    def scan(self, paths : Iterable[Union[str, Path]], game_ids : Iterable[int] = None) -> Dict[int, Game_Fingerprint]:
+        """Fingerprint of every game of `paths` (filtered by `game_ids`, as in `raw_archive.iter_raw_json()`),
+            the sha256 recorded is reused for the files and archives whose size and modification time did not change
+        """
+        game_ids = None if game_ids is None else set(map(int, game_ids))
+        sources = {row["path"]: row for row in self.db["sources"].rows}
+        recorded_sha256 = {(row["source"], row["gameId"]): row["sha256"] for row in self.db["games"].rows}
+
+        fingerprints = {}
+        for path in map(Path, paths):
+            stat = path.stat()
+            entry = sources.get(str(path), None)
+            unchanged = entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+            def fingerprint(game_id, compute_sha256):
+                sha256 = recorded_sha256.get((str(path), game_id), None) if unchanged else None
+                return Game_Fingerprint(str(path), stat.st_size, stat.st_mtime_ns, sha256 or compute_sha256())
+
+            if is_raw_archive(path):
+                with Season_Archive(path) as archive:
+                    for game_id in archive.game_ids():
+                        if game_ids is None or game_id in game_ids:
+                            fingerprints[game_id] = fingerprint(
+                                game_id, lambda: hashlib.sha256(archive.read_frame(game_id)).hexdigest(),
+                            )
+            else:
+                game_id = path.name.split(".")[0]
+                if game_id.isdigit() and (game_ids is None or int(game_id) in game_ids):
+                    fingerprints[int(game_id)] = fingerprint(int(game_id), lambda: sha256_of_file(path))
+
+        return fingerprints
+
+    def changes(self, fingerprints : Dict[int, Game_Fingerprint]) -> Tuple[List[int], List[int]]:
+        """Compare the games scanned (see `scan()`) to the games recorded
+
+        Returns:
+            Tuple[List[int], List[int]]: games to parse (new or changed, in the order of `fingerprints`),
+                and games whose rows are to be removed from the dataset (the ones to parse, plus the recorded games
+                no longer found : their file was deleted or they are not in their archive anymore)
+        """
+        recorded = {row["gameId"]: row for row in self.db["games"].rows}
+        scanned_sources = {fingerprint.source for fingerprint in fingerprints.values()}
+
+        to_parse = [
+            game_id for game_id, fingerprint in fingerprints.items()
+            if game_id not in recorded or recorded[game_id]["sha256"] != fingerprint.sha256
+        ]
+        removed = [
+            game_id for game_id, entry in recorded.items()
+            if game_id not in fingerprints and (entry["source"] in scanned_sources or not Path(entry["source"]).exists())
+        ]
+        return to_parse, to_parse + removed
+
+    def record(self, fingerprints : Dict[int, Game_Fingerprint], removed : Iterable[int] = ()) -> None:
+        """Record the games scanned (once their rows are written in the dataset) and forget the `removed` ones
+        """
+        now = time.time()
+        with self.db.conn:
+            self.db["games"].upsert_all(
+                [
+                    {"gameId": game_id, "source": fingerprint.source, "sha256": fingerprint.sha256, "recorded_at": now}
+                    for game_id, fingerprint in fingerprints.items()
+                ],
+                pk="gameId",
+            )
+            self.db["sources"].upsert_all(
+                list({
+                    fingerprint.source: {"path": fingerprint.source, "size": fingerprint.size, "mtime_ns": fingerprint.mtime_ns}
+                    for fingerprint in fingerprints.values()
+                }.values()),
+                pk="path",
+            )
+            removed = [game_id for game_id in removed if game_id not in fingerprints]
+            if removed:
+                self.db["games"].delete_where(f"gameId IN ({', '.join('?' * len(removed))})", removed)
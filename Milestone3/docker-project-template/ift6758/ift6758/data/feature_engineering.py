@@ -1,154 +1,223 @@
-from copy import deepcopy
+from functools import cached_property
+import hashlib
+import json
 import logging
 import os
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
+from typing import Sequence
+from .feature_registry import FEATURES, Feature, feature, resolve_features
+from .feature_store import Feature_Store, feature_key, raw_data_hash
 from .misc  import unify_coordinates_referential
-from datetime import timedelta
+from .parquet_dataset import read_dataset
+from .play_schema import PLAY_SCHEMA
 
 logger = logging.getLogger(__name__)
 
+EVENT_ORDER = ['gameId', 'period', 'periodTime']
+# the previous event of an event is looked for in the same game and period
+LAG_GROUPS = ['gameId', 'period']
+# columns read by `unify_coordinates_referential()`
+UNIFY_COLUMNS = ['coordinateX', 'coordinateY', 'rinkSide', 'gameId', 'byTeam', 'period', 'eventType']
+
+class Event_Sequence:
+    '''
+    Chronological order of the events of a DataFrame (sorted by EVENT_ORDER), computed once and shared by the features
+    looking at the previous event : a column is put in this order with `sort()`, and a result computed in this order
+    is put back in the order (and on the index) of the DataFrame with `scatter()`, instead of sorting (and copying) the whole DataFrame per feature.
+
+    `lag()` gives the k-th previous event of the same game and period (grouped shift on LAG_GROUPS) :
+    the first event of a period has no previous event, it does not see the last event of the previous period or game.
+    '''
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        # same (stable) ordering as df.sort_values(by=EVENT_ORDER), only the key columns are copied
+        sortedKeys = df[EVENT_ORDER].reset_index(drop=True).sort_values(by=EVENT_ORDER)
+        self.order = sortedKeys.index.to_numpy()
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(len(self.order))
+
+        # position (in chronological order) of the first event of the game and period of each event
+        newGroup = np.zeros(len(self.order), dtype=bool)
+        for column in LAG_GROUPS:
+            keys = sortedKeys[column]
+            newGroup |= keys.ne(keys.shift(1)).to_numpy(dtype=bool, na_value=True)
+        self.position = np.arange(len(self.order))
+        self.groupStart = np.maximum.accumulate(np.where(newGroup, self.position, 0))
+
+    def sort(self, data):
+        '''
+        Series/DataFrame `data` (aligned with the DataFrame) in chronological order, with its index
+        '''
+        return data.take(self.order)
+
+    def scatter(self, sortedData: pd.Series) -> pd.Series:
+        '''
+        Series computed in chronological order, back in the order of the DataFrame (same as .reindex(df.index))
+        '''
+        return sortedData.take(self.inverse)
+
+    def lag(self, sortedData, k: int = 1):
+        '''
+        Series/DataFrame `sortedData` (in chronological order, see `sort()`) of the k-th previous event of the same game and period,
+        NaN for the first k events of a period. All the columns of a DataFrame are shifted at once,
+        the last 3 events are lag(sortedData, 1), lag(sortedData, 2) and lag(sortedData, 3).
+        '''
+        previous = self.position - k
+        previous[previous < self.groupStart] = -1
+        # one take of every column, -1 (no previous event) filled with NaN
+        positional = sortedData.set_axis(pd.RangeIndex(len(self.position)), axis=0)
+        return positional.reindex(previous).set_axis(sortedData.index, axis=0)
+
+def power_play_state(gameIds: np.ndarray, gameSeconds: np.ndarray, penaltyMinutes: np.ndarray, homePenalized: np.ndarray):
+    '''
+    Skaters of each team and time elapsed since the start of the power play, for events in chronological order.
+
+    A penalty of `penaltyMinutes` given at an event removes a skater of the penalized team from the next event
+    until (excluded) its end, at most 2 skaters per team are removed. The number of penalties running at an event
+    is the number of penalties given before it in the game minus the ones already over,
+    which is counted for every event at once by binary search of the sorted ends of the penalties.
+
+    Args:
+        gameIds (np.ndarray): gameId of each event, the events of a game are contiguous
+        gameSeconds (np.ndarray): seconds since the start of the game (20 minutes per period)
+        penaltyMinutes (np.ndarray): minutes of the penalty given at each event, NaN if no penalty
+        homePenalized (np.ndarray): True if the penalty is given to the home team (else to the away team)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: elapsedPowerPlay (seconds, 0 when the skaters are even), homeSkaters, awaySkaters
+    '''
+    position = np.arange(len(gameIds))
+    newGame = np.ones(len(gameIds), dtype=bool)
+    newGame[1:] = gameIds[1:] != gameIds[:-1]
+    game = np.cumsum(newGame) - 1
+    gameStart = np.flatnonzero(newGame)[game]
+
+    minutes = np.nan_to_num(penaltyMinutes, nan=0).astype(np.int64)
+    # a penalty of 0 minutes is already over at the next event
+    isPenalty = ~np.isnan(penaltyMinutes) & (minutes > 0)
+    end = gameSeconds + 60 * minutes
+    # (game, end) encoded as one sortable integer
+    span = end.max(initial=0) + 1
+
+    skaters = []
+    for penalized in (homePenalized, ~homePenalized):
+        teamPenalty = isPenalty & penalized
+        given = np.cumsum(teamPenalty) - teamPenalty
+        given = given - given[gameStart]
+        # a penalty ends after the event it is given at, so every penalty over at an event was given before it
+        ends = np.sort(game[teamPenalty] * span + end[teamPenalty])
+        over = np.searchsorted(ends, game * span + gameSeconds, side='right') - np.searchsorted(ends, game * span, side='left')
+        skaters.append(np.maximum(5 - (given - over), 3))
+    homeSkaters, awaySkaters = skaters
+
+    powerPlay = homeSkaters != awaySkaters
+    previousPowerPlay = np.zeros(len(gameIds), dtype=bool)
+    previousPowerPlay[1:] = powerPlay[:-1]
+    powerPlayStart = powerPlay & (newGame | ~previousPowerPlay)
+    lastStart = np.maximum.accumulate(np.where(powerPlayStart, position, 0))
+    elapsedPowerPlay = np.where(powerPlay, gameSeconds - gameSeconds[lastStart], 0)
+
+    return elapsedPowerPlay.astype(np.int64), homeSkaters.astype(float), awaySkaters.astype(float)
+
 class NHLFeatureEngineering:
-    
+
+    # columns of `eventSequence`, restricted to the ones the features computed look back at (see the `lags` of `feature()`)
+    lagColumns = ['eventType', 'coordinateX', 'coordinateY', 'rawCoordinateX', 'rawCoordinateY', 'periodSeconds']
+
     def __init__(
             self, 
             RAW_DATA_PATH: Path,
-            distanceToGoal: bool,
-            angleToGoal: bool,
-            isGoal: bool,
-            emptyNet: bool,
-            verbose: bool,
-            imputeRinkSide: bool,
-            periodTimeSeconds: bool,
-            lastEvent: bool,
-            lastCoordinates: bool,
-            timeElapsed: bool,
-            distanceFromLastEvent: bool,
-            rebound: bool,
-            changeAngle: bool,
-            speed: bool,
-            computePowerPlayFeatures: bool,
+            features: Sequence[str],
             GOAL_POSITION: list,
             version : int,
             nhl_api_version : int,
+            imputeRinkSide: bool = True,
+            verbose: bool = False,
+            rawDataColumns : list = None,
+            rawDataFilters : list = None,
         ):
+        """`RAW_DATA_PATH` is a csv file or a Parquet dataset (see `parquet_dataset.py`) written by `JsonParser.load_all_seasons()`,
+            only the columns `rawDataColumns` and the rows matching `rawDataFilters` are loaded (i.e. [("season", "=", 2020), ("gameType", "=", "P")]),
+            with a Parquet dataset the other columns and partitions are not even read from disk.
+
+            `features` are names of the registered features (see `feature_registry.py`, i.e. ["distanceToGoal", "angleToGoal"]) :
+            only these and the features they require are computed, and only the columns of `features` are added to dfUnify.
+        """
         
         self.RAW_DATA_PATH = RAW_DATA_PATH
-        logger.info(f"Loading raw data from {self.RAW_DATA_PATH}")
-        self.df = pd.read_csv(RAW_DATA_PATH)
-        self.dfUnify = pd.DataFrame()
+        self.rawDataColumns = rawDataColumns
+        self.rawDataFilters = rawDataFilters
+        logger.info(f"Loading raw data from {self.RAW_DATA_PATH} (columns : {rawDataColumns}, filters : {rawDataFilters})")
+        self.df = read_dataset(RAW_DATA_PATH, rawDataColumns, rawDataFilters)
         self.verbose = verbose
         self.imputeRinkSide = imputeRinkSide
         self.GOAL_POSITION = GOAL_POSITION
         logger.info(f"Calculations of distance/angle done w.r.t GOAL_POSITION = {self.GOAL_POSITION}")
 
-        self.distanceToGoal = distanceToGoal
-        self.angleToGoal = angleToGoal
-        self.isGoal = isGoal
-        self.emptyNet = emptyNet
-        self.periodTimeSeconds = periodTimeSeconds
-        self.lastEvent = lastEvent
-        self.lastCoordinates = lastCoordinates
-        self.timeElapsed = timeElapsed
-        self.distanceFromLastEvent = distanceFromLastEvent
-        self.rebound = rebound
-        self.changeAngle = changeAngle
-        self.speed = speed
-        self.computePowerPlayFeatures = computePowerPlayFeatures
-
-        if self.distanceToGoal or self.angleToGoal:
-            self.dfUnify = self._printNaStatsBeforeUnifying()
-            logger.info("UNIFYING THE DATAFRAME ON ONE RINKSIDE")
-            self.dfUnify = unify_coordinates_referential(self.dfUnify, self.imputeRinkSide)
-
-        if self.distanceToGoal:
-            logger.info("CALCULATING DISTANCE TO GOAL - ADDING COLUMN distanceToGoal TO DATAFRAME")
-            self.df['distanceToGoal'] = self.calculateDistanceToGoal()
-            self.dfUnify['distanceToGoal'] = self.df.loc[self.dfUnify.index, 'distanceToGoal']
-
-        if self.angleToGoal:
-            logger.info("CALCULATING ANGLE TO GOAL - ADDING COLUMN angleToGoal TO DATAFRAME")
-            self.df['angleToGoal'] = self.calculateAngleToGoal()
-            self.dfUnify['angleToGoal'] = self.df.loc[self.dfUnify.index, 'angleToGoal']
-
-        if self.isGoal:
-            logger.info("CALCULATING IS GOAL - ADDING COLUMN isGoal TO DATAFRAME")
-            self.df['isGoal'] = self.calculateIsGoal()
-            self.dfUnify['isGoal'] = self.df.loc[self.dfUnify.index, 'isGoal']
-
-        if self.emptyNet:
-            logger.info("CALCULATING EMPTY NET - ADDING COLUMN emptyNet TO DATAFRAME")
-            self.df['emptyNet'] = self.calculateEmptyNet()
-            self.dfUnify['emptyNet'] = self.df.loc[self.dfUnify.index, 'emptyNet']
-
-        if self.periodTimeSeconds:
-            logger.info("CALCULATING PERIOD TIME IN SECONDS - ADDING COLUMN periodTimeSeconds TO DATAFRAME")
-            self.df['periodTimeSeconds'] = self.calculatePeriodTimeSeconds()
-            self.dfUnify['periodTimeSeconds'] = self.df.loc[self.dfUnify.index, 'periodTimeSeconds']
-
-        if self.lastEvent:
-            logger.info("CALCULATING LAST EVENT - ADDING COLUMN lastEventType TO DATAFRAME")
-            self.df['lastEventType'] = self.calculateLastEvent()
-            self.dfUnify['lastEventType'] = self.df.loc[self.dfUnify.index, 'lastEventType']
-
-        if self.lastCoordinates:
-            logger.info("CALCULATING LAST COORDINATES - ADDING COLUMNS lastCoordinateX AND lastCoordinateY TO DATAFRAME")
-            self.df['lastCoordinateX'], self.df['lastCoordinateY'] = self.calculateLastCoordinates()
-            self.dfUnify['lastCoordinateX'] = self.df.loc[self.dfUnify.index, 'lastCoordinateX']
-            self.dfUnify['lastCoordinateY'] = self.df.loc[self.dfUnify.index, 'lastCoordinateY']
-
-        if self.timeElapsed:
-            logger.info("CALCULATING TIME ELAPSED - ADDING COLUMN timeElapsed TO DATAFRAME")
-            self.df['timeElapsed'] = self.calculateTimeElapsed()
-            self.dfUnify['timeElapsed'] = self.df.loc[self.dfUnify.index, 'timeElapsed']
-
-        if self.distanceFromLastEvent:
-            logger.info("CALCULATING DISTANCE FROM LAST EVENT - ADDING COLUMN distanceFromLastEvent TO DATAFRAME")
-            self.df['distanceFromLastEvent'] = self.calculateDistanceFromLastEvent()
-            self.dfUnify['distanceFromLastEvent'] = self.df.loc[self.dfUnify.index, 'distanceFromLastEvent']
-
-        if self.rebound:
-            logger.info("CALCULATING REBOUND - ADDING COLUMN rebound TO DATAFRAME")
-            self.df['rebound'] = self.calculateRebound()
-            self.dfUnify['rebound'] = self.df.loc[self.dfUnify.index, 'rebound']
-
-        if self.changeAngle:
-            logger.info("CALCULATING CHANGE ANGLE - ADDING COLUMN changeAngle TO DATAFRAME")
-            self.df['changeAngle'] = self.calculateChangeAngle()
-            self.dfUnify['changeAngle'] = self.df.loc[self.dfUnify.index, 'changeAngle']
-
-        if self.speed:
-            logger.info("CALCULATING SPEED - ADDING COLUMN speed TO DATAFRAME")
-            self.df['speed'] = self.calculateSpeed()
-            self.dfUnify['speed'] = self.df.loc[self.dfUnify.index, 'speed']
-
-        if self.computePowerPlayFeatures:
-            logger.info("COMPUTING POWER PLAY INFO - ADDING COLUMNS elapsedPowerPlay, homeSkaters and awaySkaters TO DATAFRAME")
-            elapsedPowerPlay, homeSkaters, awaySkaters = self.calculatePowerPlayFeatures()
-            self.df['elapsedPowerPlay'] = elapsedPowerPlay
-            self.df['homeSkaters'] = homeSkaters
-            self.df['awaySkaters'] = awaySkaters
-            self.dfUnify['elapsedPowerPlay'] = self.df.loc[self.dfUnify.index, 'elapsedPowerPlay']
-            self.dfUnify['homeSkaters'] = self.df.loc[self.dfUnify.index, 'homeSkaters']
-            self.dfUnify['awaySkaters'] = self.df.loc[self.dfUnify.index, 'awaySkaters']
-
-        self.dfUnify = self.dfUnify.reset_index(drop=True)
-
         self.nhl_api_version = nhl_api_version
         self.version = version
-        self.sqlite_file = Path(os.getenv("DATA_FOLDER")) / f'v{self.nhl_api_version}_api' / 'feature_engineering_output' / ('v'+str(self.version)) / f'info_{self.version}.db'
+        OUTPUT_ROOT = Path(os.getenv("DATA_FOLDER")) / f'v{self.nhl_api_version}_api' / 'feature_engineering_output'
+        self.sqlite_file = OUTPUT_ROOT / ('v'+str(self.version)) / f'info_{self.version}.db'
+        self.store = Feature_Store(OUTPUT_ROOT / 'feature_store')
+        self.rawDataHash = raw_data_hash(self.df)
+
+        resolvedFeatures = resolve_features(features)
+        self.features = [feature.name for feature in resolvedFeatures if feature.name in set(features)]
+        self.featureKeys = self._featureKeys(resolvedFeatures)
+
+        # the features found in the store are loaded, the other ones are computed, as the features they require (loaded or computed)
+        missing = {feature.name for feature in resolvedFeatures if not self.store.has(self.featureKeys[feature.name])}
+        needed, toVisit = set(), list(self.features)
+        while toVisit:
+            name = toVisit.pop()
+            if name not in needed:
+                needed.add(name)
+                toVisit += FEATURES[name].requires if name in missing else []
+        resolvedFeatures = [feature for feature in resolvedFeatures if feature.name in needed]
+        self.lagColumns = list(dict.fromkeys(column for feature in resolvedFeatures if feature.name in missing for column in feature.lags))
+        logger.info(f"""FEATURES REQUESTED : {self.features}
+                    LOADED FROM {self.store.root} : {[feature.name for feature in resolvedFeatures if feature.name not in missing]}
+                    COMPUTED : {[feature.name for feature in resolvedFeatures if feature.name in missing]}""")
+
+        self.dfUnify = self._printNaStatsBeforeUnifying()
+        logger.info("UNIFYING THE DATAFRAME ON ONE RINKSIDE")
+        self.dfUnify = unify_coordinates_referential(self.dfUnify, self.imputeRinkSide)
+        if self.imputeRinkSide:
+            self.unifiedCoordinates = self.dfUnify[['coordinateX', 'coordinateY']]
+
+        for feature in resolvedFeatures:
+            key = self.featureKeys[feature.name]
+            if feature.name in missing:
+                logger.info(f"CALCULATING {feature.name} - ADDING COLUMNS {', '.join(feature.outputs)} TO DATAFRAME")
+                values = getattr(self, feature.method)()
+                columns = pd.DataFrame(dict(zip(feature.outputs, values if len(feature.outputs) > 1 else [values])), index=self.df.index)
+                self.store.save(key, columns, feature.name, feature.version, self._featureParams(feature), self.rawDataHash)
+            else:
+                logger.info(f"LOADING {feature.name} FROM THE FEATURE STORE ({key[:12]}) - ADDING COLUMNS {', '.join(feature.outputs)} TO DATAFRAME")
+                columns = self.store.load(key, self.df.index)
+            for column in feature.outputs:
+                self.df[column] = columns[column]
+                if feature.name in self.features:
+                    self.dfUnify[column] = self.df.loc[self.dfUnify.index, column]
+
+        # the shared intermediates are only needed while computing the features
+        for attr in ['events', 'unifiedCoordinates', 'periodSeconds', 'eventSequence', 'previousEvent']:
+            self.__dict__.pop(attr, None)
+
+        self.dfUnify = self.dfUnify.reset_index(drop=True)
         self._save_processed_df()
 
     def _save_processed_df(self):
         '''
-        Save the processed dataframes in a csv file.
-        if same kind (here is the difficulty) of dataframe 
+        Save dfUnify in a csv file, in a directory named by the id of its content (see `_generate_unique_id()`) :
+        not saved again if the same raw data and features were already saved.
         '''
 
         self.uniq_id = self._generate_unique_id() 
-        ROOT_PATH = self.sqlite_file.parent / self.RAW_DATA_PATH.stem / self.uniq_id
+        ROOT_PATH = self.sqlite_file.parent / self._raw_data_name() / self.uniq_id
         ROOT_PATH.mkdir(parents=True, exist_ok=True)
         self.path_save_output = ROOT_PATH
         already_existing_file_path = self.verify_ft_eng_df_exists()
@@ -157,15 +226,12 @@ class NHLFeatureEngineering:
             logger.info(f"SKIPPING SAVING OF NEWLY FEATURE-ENGINEERED DATA : Found similar file at {self.path_save_output}, not saving again.")
         
         else:
-            logger.info(f"Saving the feature-engineered dataframes at {ROOT_PATH}")
+            logger.info(f"Saving the feature-engineered dataframe at {ROOT_PATH}")
             self.dfUnify.to_csv(ROOT_PATH / f'df_Unify.csv', index=False)
-            self.dfUnify.to_csv(ROOT_PATH / f'df.csv', index=False)
             self._update_sqlite_db()
 
     def verify_ft_eng_df_exists(self):
-        content_dir = list(self.path_save_output.iterdir())
-        return (self.path_save_output / 'df_Unify.csv') in content_dir \
-            and (self.path_save_output / 'df.csv') in content_dir
+        return (self.path_save_output / 'df_Unify.csv').exists()
 
     def _update_sqlite_db(self):
         '''
@@ -175,9 +241,9 @@ class NHLFeatureEngineering:
         
         db = Database(self.sqlite_file)
 
-        columns_table = {"id": int}
+        columns_table = {"id": str}
         for k in self.attr_for_reproducibility.keys():
-            if k=="GOAL_POSITION":
+            if k in ["GOAL_POSITION", "raw_data_hash"]:
                 columns_table[k] = str
             else: 
                 columns_table[k] = bool
@@ -187,7 +253,7 @@ class NHLFeatureEngineering:
 
         self.attr_for_reproducibility['id'] = self.path_save_output.name
         self.attr_for_reproducibility['GOAL_POSITION'] = '_'.join(map(str, self.GOAL_POSITION))
-        self.attr_for_reproducibility['src_csv_file'] = self.RAW_DATA_PATH.stem
+        self.attr_for_reproducibility['src_csv_file'] = self._raw_data_name()
         
         db[sqlite_table_to_update].insert(self.attr_for_reproducibility, pk="id", alter=True, replace=True)
         logger.info(f"""SUCCESSFULLY Updated the sqlite database with the newly processed dataframe at 
@@ -197,17 +263,50 @@ class NHLFeatureEngineering:
 
         return self.attr_for_reproducibility
 
+    def _featureParams(self, feature: Feature) -> dict:
+        '''
+        Values of the parameters of `feature` (attributes of this instance).
+        '''
+        return {param: getattr(self, param) for param in feature.params}
+
+    def _featureKeys(self, resolvedFeatures: Sequence[Feature]) -> dict:
+        '''
+        Key in the feature store of each feature of `resolvedFeatures` (a feature after the ones it requires, see `feature_store.feature_key()`).
+        '''
+        keys = {}
+        for feature in resolvedFeatures:
+            keys[feature.name] = feature_key(
+                self.rawDataHash, feature.name, feature.version, self._featureParams(feature),
+                [keys[required] for required in feature.requires],
+            )
+        return keys
+
     def _generate_unique_id(self) -> str:
         '''
-        Generate a unique id encoding important attributes that caracterizes differences
-        between two instances of NHLFeatureEngineering.
+        Generate a unique id of the content of dfUnify : hash of the raw data, imputeRinkSide and the keys of the features requested
+        (which encode their parameters and code version), two instances with different outputs never share an id.
+        '''
+        content = {
+            'raw_data_hash': self.rawDataHash,
+            'imputeRinkSide': self.imputeRinkSide,
+            'features': {name: self.featureKeys[name] for name in self.features},
+        }
+        self.attr_for_reproducibility = {'imputeRinkSide': self.imputeRinkSide, 'GOAL_POSITION': self.GOAL_POSITION}
+        # one boolean per registered feature, True if it was requested
+        self.attr_for_reproducibility.update({name: name in self.features for name in FEATURES})
+        self.attr_for_reproducibility['nhl_api_version'] = self.nhl_api_version
+        self.attr_for_reproducibility['raw_data_hash'] = self.rawDataHash
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _raw_data_name(self) -> str:
+        '''
+        Name of the raw data the features are computed on : stem of RAW_DATA_PATH,
+        followed by a hash of rawDataColumns/rawDataFilters if only a subset of the raw data was loaded.
         '''
-        attributes_dict = deepcopy(vars(self))
-        for key_to_pop in ['df', 'dfUnify', 'version', 'verbose', 'RAW_DATA_PATH','sqlite_file']:
-            attributes_dict.pop(key_to_pop, None)
-        self.attr_for_reproducibility = attributes_dict
-        attributes_dict['GOAL_POSITION'] = np.linalg.norm(attributes_dict['GOAL_POSITION']).astype(int)
-        return str(sum(attributes_dict.values()))
+        if self.rawDataColumns is None and not self.rawDataFilters:
+            return self.RAW_DATA_PATH.stem
+        subset = repr((self.rawDataColumns, self.rawDataFilters)).encode()
+        return f"{self.RAW_DATA_PATH.stem}__{hashlib.sha1(subset).hexdigest()[:8]}"
 
     def _printNaStatsBeforeUnifying(self):
 
@@ -235,180 +334,182 @@ class NHLFeatureEngineering:
             """)
         return self.df
 
-    def calculateEmptyNet(self):
+    @cached_property
+    def events(self) -> Event_Sequence:
         '''
-        Calculate if the net was empty for each shot.
+        Chronological order of the events, shared by the features (see `Event_Sequence`).
         '''
-        self.df['emptyNet'] = self.df['emptyNet'].fillna(0)
-        return (self.df['emptyNet'] == 1).astype(int)
+        return Event_Sequence(self.df)
+
+    @cached_property
+    def unifiedCoordinates(self) -> pd.DataFrame:
+        '''
+        coordinateX and coordinateY on one rinkSide (rinkSide imputed), aligned with self.df.
+        '''
+        unified = unify_coordinates_referential(self.df[UNIFY_COLUMNS], True)
+        return unified[['coordinateX', 'coordinateY']].set_axis(self.df.index)
+
+    @cached_property
+    def periodSeconds(self) -> pd.Series:
+        '''
+        periodTime (MM:SS) in seconds.
+        '''
+        # a few thousands distinct periodTime at most, each one is parsed once
+        codes, periodTimes = pd.factorize(self.df['periodTime'], use_na_sentinel=False)
+        seconds = np.array([int(x.split(':')[0]) * 60 + int(x.split(':')[1]) for x in periodTimes], dtype=np.int64)
+        return pd.Series(seconds[codes], index=self.df.index)
 
+    @cached_property
+    def eventSequence(self) -> pd.DataFrame:
+        '''
+        Columns the lag features look back at, in chronological order : eventType, coordinateX and coordinateY (unified),
+        rawCoordinateX and rawCoordinateY (as in the raw data) and periodSeconds, only the ones of `lagColumns`
+        (i.e. the coordinates are not unified if only lastEvent is computed).
+        '''
+        sources = {
+            'eventType': lambda: self.df['eventType'],
+            'coordinateX': lambda: self.unifiedCoordinates['coordinateX'],
+            'coordinateY': lambda: self.unifiedCoordinates['coordinateY'],
+            'rawCoordinateX': lambda: self.df['coordinateX'],
+            'rawCoordinateY': lambda: self.df['coordinateY'],
+            'periodSeconds': lambda: self.periodSeconds,
+        }
+        return self.events.sort(pd.DataFrame({column: sources[column]() for column in self.lagColumns}, index=self.df.index))
+
+    @cached_property
+    def previousEvent(self) -> pd.DataFrame:
+        '''
+        Columns of `eventSequence` for the previous event of the same game and period, shifted in one pass.
+        '''
+        return self.events.lag(self.eventSequence, 1)
+
+    def _distanceFromPreviousEvent(self, x: str, y: str) -> pd.Series:
+        '''
+        Distance between the coordinates `x`, `y` of `eventSequence` of each event and the ones of the previous event, in chronological order.
+        '''
+        distances = np.linalg.norm(
+            self.eventSequence[[x, y]].values - self.previousEvent[[x, y]].values,
+            axis=1
+        )
+        return pd.Series(distances, index=self.eventSequence.index)
+
+    @feature("distanceToGoal", outputs=["distanceToGoal"], params=["GOAL_POSITION"])
     def calculateDistanceToGoal(self):
         '''
         Calculate the distance to the goal for each shot.
         '''
-        unifiedCoordinatesDf = unify_coordinates_referential(self.df, True)
-        dists = np.linalg.norm(self.GOAL_POSITION - unifiedCoordinatesDf[['coordinateX', 'coordinateY']], axis=1)
-        dists = pd.Series(dists, index=unifiedCoordinatesDf.index)
-        # Fill with NA values the shots without coordinates in the dists Series
-        res = dists.reindex(self.df.index)
-        return res
+        dists = np.linalg.norm(self.GOAL_POSITION - self.unifiedCoordinates, axis=1)
+        return pd.Series(dists, index=self.df.index)
 
+    @feature("angleToGoal", outputs=["angleToGoal"], params=["GOAL_POSITION"])
     def calculateAngleToGoal(self):
         '''
         Calculate the angle to the goal for each shot.
         '''
-        unifiedCoordinatesDf = unify_coordinates_referential(self.df, True)
-        atanValues = np.degrees(np.arctan2(
-            self.GOAL_POSITION[1] - unifiedCoordinatesDf['coordinateY'],
-            self.GOAL_POSITION[0] - unifiedCoordinatesDf['coordinateX']
+        return np.degrees(np.arctan2(
+            self.GOAL_POSITION[1] - self.unifiedCoordinates['coordinateY'],
+            self.GOAL_POSITION[0] - self.unifiedCoordinates['coordinateX']
         ))
-        res = atanValues.reindex(self.df.index)
-        return res
 
+    @feature("isGoal", outputs=["isGoal"])
     def calculateIsGoal(self):
         '''
         Calculate if the shot was a goal.
         '''
         return (self.df['eventType'].isin(['GOAL', 'goal'])).astype(int)
 
+    @feature("emptyNet", outputs=["emptyNet"])
+    def calculateEmptyNet(self):
+        '''
+        Calculate if the net was empty for each shot.
+        '''
+        self.df['emptyNet'] = self.df['emptyNet'].fillna(0)
+        return (self.df['emptyNet'] == 1).astype(int)
+
+    @feature("periodTimeSeconds", outputs=["periodTimeSeconds"])
     def calculatePeriodTimeSeconds(self):
         '''
         Calculate the period time in seconds instead of MM:SS.
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        seconds = df_sorted['periodTime'].apply(lambda x: int(x.split(':')[0]) * 60 + int(x.split(':')[1]))
-        return seconds.reindex(self.df.index)
+        return self.periodSeconds.astype(PLAY_SCHEMA['periodTimeSeconds'])
 
+    @feature("lastEvent", outputs=["lastEventType"], lags=["eventType"])
     def calculateLastEvent(self):
         '''
-        Calculate the last event just before the current one.
+        Calculate the last event just before the current one (in the same period).
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        return df_sorted["eventType"].shift(1).reindex(self.df.index)
+        return self.events.scatter(self.previousEvent["eventType"])
 
+    @feature("lastCoordinates", outputs=["lastCoordinateX", "lastCoordinateY"], lags=["coordinateX", "coordinateY"])
     def calculateLastCoordinates(self):
         '''
-        Calculate the last coordinates just before the current one.
+        Calculate the last coordinates just before the current one (in the same period).
         '''
-        unifiedCoordinatesDf = unify_coordinates_referential(self.df, True)
-        df_sorted = unifiedCoordinatesDf.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        shiftedX = df_sorted["coordinateX"].shift(1)
-        shiftedY = df_sorted["coordinateY"].shift(1)
-        return shiftedX.reindex(self.df.index), shiftedY.reindex(self.df.index)
+        return self.events.scatter(self.previousEvent["coordinateX"]), self.events.scatter(self.previousEvent["coordinateY"])
 
+    @feature("timeElapsed", outputs=["timeElapsed"], lags=["periodSeconds"])
     def calculateTimeElapsed(self):
         '''
-        Calculate the time elapsed since the last event.
+        Calculate the time elapsed since the last event (in the same period).
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        seconds = df_sorted['periodTime'].apply(lambda x: int(x.split(':')[0]) * 60 + int(x.split(':')[1]))
-        return (seconds - seconds.shift(1)).reindex(self.df.index)
+        return self.events.scatter(self.eventSequence["periodSeconds"] - self.previousEvent["periodSeconds"])
 
+    @feature("distanceFromLastEvent", outputs=["distanceFromLastEvent"], lags=["coordinateX", "coordinateY"])
     def calculateDistanceFromLastEvent(self):
         '''
-        Calculate the distance from the last event.
+        Calculate the distance from the last event (in the same period).
         '''
-        unifiedCoordinatesDf = unify_coordinates_referential(self.df, True)
-        df_sorted = unifiedCoordinatesDf.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        shiftedX = df_sorted["coordinateX"].shift(1)
-        shiftedY = df_sorted["coordinateY"].shift(1)
-        distances = np.linalg.norm(
-            df_sorted[["coordinateX", "coordinateY"]].values - np.array([shiftedX, shiftedY]).T,
-            axis=1
-        )
-        distances_series = pd.Series(distances, index=df_sorted.index)
-        return distances_series.reindex(self.df.index)
+        return self.events.scatter(self._distanceFromPreviousEvent("coordinateX", "coordinateY"))
 
+    @feature("rebound", outputs=["rebound"], lags=["eventType"])
     def calculateRebound(self):
         '''
         Calculate if the shot was a rebound.
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        shiftedEvent = df_sorted["eventType"].shift(1)
-        return (shiftedEvent == 'SHOT').astype(int).reindex(self.df.index)
+        return self.events.scatter((self.previousEvent["eventType"] == 'SHOT').astype(int))
 
+    @feature("changeAngle", outputs=["changeAngle"], requires=["angleToGoal"], lags=["eventType"])
     def calculateChangeAngle(self):
         '''
         Calculate the change of angle before the shot.
         Only calculate if the last event was a shot, else return 0.
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        shiftedAngle = df_sorted["angleToGoal"].shift(1)
-        last_event_shot = (df_sorted["eventType"].shift(1) == "SHOT").astype(int)
+        sortedAngle = self.events.sort(self.df["angleToGoal"])
+        shiftedAngle = self.events.lag(sortedAngle, 1)
+        last_event_shot = (self.previousEvent["eventType"] == "SHOT").astype(int)
 
-        change_angle = np.abs(df_sorted["angleToGoal"] - shiftedAngle)
+        change_angle = np.abs(sortedAngle - shiftedAngle)
         change_angle = change_angle * last_event_shot
 
-        return change_angle.reindex(self.df.index)
+        return self.events.scatter(change_angle)
 
+    @feature("speed", outputs=["speed"], lags=["rawCoordinateX", "rawCoordinateY", "periodSeconds"])
     def calculateSpeed(self):
         '''
         Calculate the speed of the player before the shot.
         '''
-        df_sorted = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
+        distances_series = self._distanceFromPreviousEvent("rawCoordinateX", "rawCoordinateY")
 
-        shiftedX = df_sorted["coordinateX"].shift(1)
-        shiftedY = df_sorted["coordinateY"].shift(1)
-        distances = np.linalg.norm(
-            df_sorted[["coordinateX", "coordinateY"]].values - np.array([shiftedX, shiftedY]).T,
-            axis=1
-        )
-        distances_series = pd.Series(distances, index=df_sorted.index)
-
-        seconds = df_sorted['periodTime'].apply(lambda x: int(x.split(':')[0]) * 60 + int(x.split(':')[1]))
-        timeElapsed = seconds - seconds.shift(1)
+        timeElapsed = self.eventSequence["periodSeconds"] - self.previousEvent["periodSeconds"]
         timeElapsed = timeElapsed.replace(0, np.nan)
 
         speed = (distances_series / timeElapsed)
-        return speed.reindex(self.df.index)
-
-    def parse_period_time(self, time_str):
-        """Convert period time string to a timedelta object."""
-        minutes, seconds = map(int, time_str.split(':'))
-        return timedelta(minutes=minutes, seconds=seconds)
+        return self.events.scatter(speed)
 
+    @feature("computePowerPlayFeatures", outputs=["elapsedPowerPlay", "homeSkaters", "awaySkaters"])
     def calculatePowerPlayFeatures(self):
         '''
-        Calculate power play features: elapsedPowerPlay, homeSkaters, awaySkaters.
-        '''
-        df = self.df.sort_values(by=['gameId', 'period', 'periodTime']).copy()
-        df['periodTimeDelta'] = df['periodTime'].apply(self.parse_period_time)
-        df['elapsedPowerPlay'] = 0
-
-        current_game_id = None
-        penalties = {'home': [], 'away': []}
-        last_power_play_time = {'home': None, 'away': None}
-
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
-            if row['gameId'] != current_game_id:
-                current_game_id = row['gameId']
-                penalties = {'home': [], 'away': []}
-                last_power_play_time = {'home': None, 'away': None}
-                df.at[index, 'homeSkaters'] = df.at[index, 'awaySkaters'] = 5
-
-            current_time = row['periodTimeDelta'] + timedelta(minutes=20 * (row['period'] - 1))
-
-            # Update skater counts and remove expired penalties
-            for team in ['home', 'away']:
-                penalties[team] = [penalty for penalty in penalties[team] if penalty[0] > current_time]
-                df.at[index, f'{team}Skaters'] = 5 - len(penalties[team])
-                df.at[index, f'{team}Skaters'] = max(df.at[index, f'{team}Skaters'], 3)
-
-            # Handle penalty
-            if pd.notna(row['penaltyMinutes']):
-                penalized_team = 'home' if row['homeTeam'] == row['penalizedTeam'] else 'away'
-                penalty_duration = timedelta(minutes=int(row['penaltyMinutes']))
-                penalty_end_time = current_time + penalty_duration
-                penalties[penalized_team].append((penalty_end_time, penalty_duration))
-
-            # Determine if there's a power play
-            if df.at[index, 'homeSkaters'] != df.at[index, 'awaySkaters']:
-                if last_power_play_time['home'] is None and last_power_play_time['away'] is None:
-                    last_power_play_time['home'] = last_power_play_time['away'] = current_time
-                df.at[index, 'elapsedPowerPlay'] = (current_time - last_power_play_time['home']).total_seconds()
-            else:
-                last_power_play_time = {'home': None, 'away': None}
-                df.at[index, 'elapsedPowerPlay'] = 0
+        Calculate power play features: elapsedPowerPlay, homeSkaters, awaySkaters (see `power_play_state()`).
+        '''
+        sortedEvents = self.events.sort(self.df[['gameId', 'period', 'penaltyMinutes', 'homeTeam', 'penalizedTeam']])
+        gameSeconds = self.events.sort(self.periodSeconds).to_numpy(dtype=np.int64) \
+            + 20 * 60 * (sortedEvents['period'].to_numpy(dtype=np.int64) - 1)
+        homePenalized = sortedEvents['homeTeam'].to_numpy(dtype=object) == sortedEvents['penalizedTeam'].to_numpy(dtype=object)
 
-        df.drop(columns=['periodTimeDelta'], inplace=True)
-        return df["elapsedPowerPlay"].reindex(self.df.index), df["homeSkaters"].reindex(self.df.index), df["awaySkaters"].reindex(self.df.index)
\ No newline at end of file
+        states = power_play_state(
+            sortedEvents['gameId'].to_numpy(),
+            gameSeconds,
+            sortedEvents['penaltyMinutes'].to_numpy(dtype=float, na_value=np.nan),
+            homePenalized,
+        )
+        return tuple(self.events.scatter(pd.Series(state, index=sortedEvents.index)) for state in states)
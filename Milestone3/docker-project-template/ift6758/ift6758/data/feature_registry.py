@@ -0,0 +1,73 @@
+"""
+Registry of the features of `NHLFeatureEngineering` : each feature is a method of the class, registered with the `feature()` decorator
+declaring the columns it adds (outputs), the features whose columns it reads (requires), the columns of the chronological
+event sequence it looks back at (lags, see `NHLFeatureEngineering.eventSequence`), the attributes of `NHLFeatureEngineering`
+its values depend on (params) and the version of its code (see `feature_store.py`, to increment when the computation changes).
+
+    @feature("changeAngle", outputs=["changeAngle"], requires=["angleToGoal"], lags=["eventType"])
+    def calculateChangeAngle(self):
+        ...
+
+Asking for a set of features computes the minimal set of features (`resolve_features()`) : the ones asked and the ones they require,
+recursively, each once and after the features it requires, nothing else. The features only required by other ones are computed
+but not added to the output. The intermediates shared by several features (chronological order, unified coordinates,
+seconds of the period, previous event) are cached properties of `NHLFeatureEngineering`, computed once, by the first feature using them.
+"""
+
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+class Feature(NamedTuple):
+    name : str
+    method : str
+    outputs : Tuple[str, ...]
+    requires : Tuple[str, ...] = ()
+    lags : Tuple[str, ...] = ()
+    params : Tuple[str, ...] = ()
+    version : int = 1
+
+# in the order of registration, which is the order the features are computed in (when they do not require each other)
+FEATURES : Dict[str, Feature] = {}
+
+def feature(
+        name : str,
+        outputs : Sequence[str],
+        requires : Sequence[str] = (),
+        lags : Sequence[str] = (),
+        params : Sequence[str] = (),
+        version : int = 1,
+    ) -> Callable[[Callable], Callable]:
+    """Register the decorated method as the computation of the feature `name`,
+        returning the values of `outputs` (a Series, or a tuple of Series in the order of `outputs`)
+    """
+    def register(method : Callable) -> Callable:
+        if name in FEATURES:
+            raise RuntimeError(f"FEATURE {name} IS ALREADY REGISTERED (method {FEATURES[name].method})")
+        FEATURES[name] = Feature(name, method.__name__, tuple(outputs), tuple(requires), tuple(lags), tuple(params), version)
+        return method
+    return register
+
+def resolve_features(names : Iterable[str]) -> List[Feature]:
+    """Features to compute for the features `names` : these and the ones they require (recursively), each once,
+        a feature after the features it requires, otherwise in the order of registration
+    """
+    resolved : Dict[str, Feature] = {}
+    visiting = set()
+
+    def visit(name, required_by=None):
+        if name in resolved:
+            return
+        if name not in FEATURES:
+            origin = f" (required by {required_by})" if required_by is not None else ""
+            raise RuntimeError(f"UNKNOWN FEATURE {name}{origin}, THE FEATURES ARE {list(FEATURES)}")
+        if name in visiting:
+            raise RuntimeError(f"CIRCULAR DEPENDENCY BETWEEN THE FEATURES {sorted(visiting)}")
+        visiting.add(name)
+        for required in FEATURES[name].requires:
+            visit(required, name)
+        visiting.discard(name)
+        resolved[name] = FEATURES[name]
+
+    order = list(FEATURES)
+    for name in sorted(set(names), key=lambda name: order.index(name) if name in FEATURES else -1):
+        visit(name)
+    return list(resolved.values())
@@ -0,0 +1,131 @@
+"""
+Content-addressed store of the columns computed by `NHLFeatureEngineering` : the output columns of a feature are written once,
+in a Parquet file named by the key of the feature, and read back instead of being computed again by any later run with the same key.
+
+The key of a feature (`feature_key()`) is the sha256 of
+    - the content of the raw data the feature is computed on (`raw_data_hash()`, the loaded DataFrame, whatever the file or filters)
+    - the name of the feature and the version of its code (see the `version` of `feature_registry.feature()`, to increment
+        when the computation changes, the columns computed by the previous code are then not reused)
+    - the values of its parameters (i.e. GOAL_POSITION for distanceToGoal)
+    - the keys of the features it requires (a change of a required feature changes the key of the features computed from it)
+
+so two runs share the columns of the features they have in common : rerunning with one more feature only computes that feature.
+
+    DATA_FOLDER/v{nhl_api_version}_api/feature_engineering_output/feature_store/
+        features.sqlite              (table `feature_columns` : key, feature, version, params, raw_hash, columns, rows, path, created_at)
+        3f/3f9a...e1.parquet         (the output columns of the feature, in the order of the rows of the raw data)
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+from sqlite_utils import Database
+
+STORE_SQLITE = "features.sqlite"
+STORE_TABLE = "feature_columns"
+
+def _update_with_column(sha256, series : pd.Series) -> None:
+    """Feed the content of `series` to `sha256`, from the buffers of the numeric/categorical columns
+        (`pd.util.hash_pandas_object()` is ~10x slower on the nullable integers)
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        sha256.update(pd.util.hash_pandas_object(dtype.categories.to_series(), index=False).to_numpy().tobytes())
+        sha256.update(series.cat.codes.to_numpy().tobytes())
+    elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and hasattr(dtype, "numpy_dtype"):
+        # nullable Int/Float/boolean : mask, then the values (0 where missing)
+        mask = series.isna().to_numpy()
+        sha256.update(mask.tobytes())
+        sha256.update(series.to_numpy(dtype=dtype.numpy_dtype, na_value=0).tobytes())
+    elif dtype.kind in "biufcmM":
+        sha256.update(np.ascontiguousarray(series.to_numpy()).tobytes())
+    else:
+        sha256.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+
+def raw_data_hash(df : pd.DataFrame) -> str:
+    """sha256 of the content of `df` : names, dtypes and values of its columns (not its index)
+    """
+    sha256 = hashlib.sha256()
+    sha256.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    for column in df.columns:
+        _update_with_column(sha256, df[column])
+    return sha256.hexdigest()
+
+def feature_key(raw_hash : str, feature : str, version : int, params : dict, required_keys : Sequence[str] = ()) -> str:
+    """Key of the columns of `feature` (see the docstring of the module)
+    """
+    content = {
+        "raw_hash": raw_hash,
+        "feature": feature,
+        "version": version,
+        "params": params,
+        "requires": list(required_keys),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Feature_Store:
+
+    def __init__(self, root : Union[str, Path]) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db = Database(self.root / STORE_SQLITE)
+        self.db[STORE_TABLE].create(
+            {
+                "key": str,
+                "feature": str,
+                "version": int,
+                "params": str,
+                "raw_hash": str,
+                "columns": str,
+                "rows": int,
+                "path": str,
+                "created_at": float,
+            },
+            pk="key",
+            if_not_exists=True,
+        )
+
+    def path_of(self, key : str) -> Path:
+        return self.root / key[:2] / f"{key}.parquet"
+
+    def has(self, key : str) -> bool:
+        """True if the columns of `key` were stored (and their file is still there)
+        """
+        return self.db[STORE_TABLE].count_where("key = ?", [key]) > 0 and self.path_of(key).exists()
+
+    def load(self, key : str, index : pd.Index = None) -> pd.DataFrame:
+        """Columns stored under `key`, on `index` (the index of the raw data) if given
+        """
+        columns = pd.read_parquet(self.path_of(key))
+        return columns.set_axis(index, axis=0) if index is not None else columns
+
+    def save(self, key : str, columns : pd.DataFrame, feature : str, version : int, params : dict, raw_hash : str) -> Path:
+        """Store the output `columns` of `feature` under `key` (written in a temporary file first, a crash never leaves half a file behind)
+        """
+        path = self.path_of(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        columns.reset_index(drop=True).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.db[STORE_TABLE].upsert(
+            {
+                "key": key,
+                "feature": feature,
+                "version": version,
+                "params": json.dumps(params, sort_keys=True, default=str),
+                "raw_hash": raw_hash,
+                "columns": json.dumps(list(columns.columns)),
+                "rows": len(columns),
+                "path": str(path.relative_to(self.root)),
+                "created_at": time.time(),
+            },
+            pk="key",
+        )
+        return path
@@ -0,0 +1,168 @@
+"""
+Throughput benchmark of the fetchers against a local `NHL_Replay_Server` (see replay_server.py), no GET request reaches the NHL servers.
+
+The game ids are discovered as in `regular_playoff_p_by_p_data_per_season()` (schedule endpoint ---> `Schedule_Index`),
+then for every fetch mode the same games are downloaded in a temporary directory, and are reported :
+games/s, p50/p99 latency of the GET requests (see `Fetch_Metrics`), peak memory allocated by python (tracemalloc) and errors.
+
+Fetch modes :
+    - sequential : `Game_endpoints_Fetcher.fetch(save_local=...)`, one game at a time (json decoded then re-encoded)
+    - stream     : `Game_endpoints_Fetcher.fetch_to_disk(...)`, one game at a time (bytes streamed to disk)
+    - async      : `fetch_games_concurrently(...)`, at most `concurrency` GET requests in flight
+    - v2         : `Game_endpoints_Fetcher_v2.fetch(save_local=...)`, one game at a time
+
+Example:
+    python -m ift6758.data.fetch_benchmark --nb_games 300 --latency 0.02 --jitter 0.01 --throttle_rate 0.01 -c 32
+"""
+
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterable, List
+
+import pandas as pd
+from loguru import logger
+
+from .nhl_rest_api_fetcher import (
+    Base_Fetcher,
+    Game_endpoints_Fetcher,
+    fetch_games_concurrently,
+    fetch_schedule_game_ids,
+    raw_game_file_name,
+)
+from .nhl_rest_api_fetcher_V2 import Game_endpoints_Fetcher_v2
+from .replay_server import NHL_Replay_Server
+from .schedule_index import Schedule_Index
+
+FETCH_MODES = ("sequential", "stream", "async", "v2")
+
+def _run_fetch_mode(mode : str, game_ids : List[int], output_dir : Path, concurrency : int, compression : str = None) -> None:
+    if mode == "async":
+        asyncio.run(fetch_games_concurrently(game_ids, output_dir, concurrency, compression))
+        return
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for id in game_ids:
+        path_save_local = output_dir / raw_game_file_name(id, compression)
+        if mode == "sequential":
+            Game_endpoints_Fetcher(f"game/{id}/feed/live").fetch(save_local=path_save_local)
+        elif mode == "stream":
+            Game_endpoints_Fetcher(f"game/{id}/feed/live").fetch_to_disk(path_save_local)
+        elif mode == "v2":
+            Game_endpoints_Fetcher_v2(f"gamecenter/{id}/play-by-play").fetch(save_local=path_save_local)
+        else:
+            raise RuntimeError(f"UNKNOWN FETCH MODE {mode}, SUPPORTED MODES ARE {FETCH_MODES}")
+
+def run_benchmark(
+        base_url : str,
+        modes : Iterable[str] = FETCH_MODES,
+        season : int = 2016,
+        nb_games : int = 200,
+        concurrency : int = 16,
+        compression : str = None,
+        trace_memory : bool = True,
+    ) -> pd.DataFrame:
+    """Benchmark every fetch mode of `modes` on the first `nb_games` games of the schedule of `season`
+        served at `base_url` (a `NHL_Replay_Server`), one row per mode.
+
+        tracemalloc slows down the allocations (so the modes decoding/encoding json much more than the others),
+        with `trace_memory` False the peak memory is not measured but games/s is not biased.
+    """
+    Base_Fetcher.redirect_to(base_url)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        game_ids = fetch_schedule_game_ids(season, Schedule_Index(Path(tmp_dir) / "schedule_index.sqlite"))[:nb_games]
+
+        for mode in modes:
+            # a fresh rate limiter per mode, so that the 429 of a mode do not slow down the next one
+            Base_Fetcher.configure_rate_limiter()
+            metrics = Base_Fetcher.get_metrics()
+            metrics.reset()
+
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            _run_fetch_mode(mode, game_ids, Path(tmp_dir) / mode, concurrency, compression)
+            elapsed = time.perf_counter() - start
+            peak_memory = float("nan")
+            if trace_memory:
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            summary = metrics.summary()
+            rows.append({
+                "mode": mode,
+                "games": len(game_ids),
+                "elapsed_s": elapsed,
+                "games_per_s": len(game_ids) / elapsed,
+                "latency_p50_ms": summary["latency_p50_ms"],
+                "latency_p99_ms": summary["latency_p99_ms"],
+                "MB_per_s": summary["bytes_per_s"] / 1e6,
+                "peak_memory_MB": peak_memory / 1e6,
+                "requests": summary["requests"],
+                "errors": summary["errors"],
+                "throttled": summary["throttled"],
+                "final_rate_limit": Base_Fetcher.get_rate_limiter().rate,
+            })
+            logger.info(f"Benchmark of fetch mode {mode} : {rows[-1]}")
+
+    Base_Fetcher.redirect_to(None)
+    return pd.DataFrame(rows).set_index("mode")
+
+
+def cli_args():
+    '''
+    CLI Interface, to specify the replay server (or its parameters) and the fetch modes to benchmark
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Throughput benchmark of the fetchers against a local NHL replay server')
+    parser.add_argument('--server_url', type=str, default=None, help='url of a replay server already running (python -m ift6758.data.replay_server), otherwise one is started in this process')
+    parser.add_argument('--modes', nargs='+', choices=FETCH_MODES, default=list(FETCH_MODES), help='fetch modes to benchmark')
+    parser.add_argument('--nb_games', type=int, default=200, help='number of games downloaded by every mode')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='concurrency of the async mode')
+    parser.add_argument('--compression', choices=['gz', 'zst'], default=None, help='save the games compressed')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency of the replay server (s)')
+    parser.add_argument('--jitter', type=float, default=0.01, help='jitter of the latency of the replay server (s)')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='probability of a 503 from the replay server')
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help='probability of a 429 from the replay server')
+    parser.add_argument('--rate', type=float, default=1000.0, help='initial rate limit of the fetchers (req/s)')
+    parser.add_argument('--max_rate', type=float, default=1000.0, help='maximal rate limit of the fetchers (req/s)')
+    parser.add_argument('--backoff_factor', type=float, default=0.05, help='backoff factor of the retries (s)')
+    parser.add_argument('--no_trace_memory', action='store_true', help='do not measure the peak memory (tracemalloc slows down the modes decoding json)')
+    parser.add_argument('--output', type=Path, default=None, help='if specified, csv file where the results are written')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    args = cli_args()
+    Base_Fetcher.configure_session(backoff_factor=args.backoff_factor)
+    Base_Fetcher.configure_rate_limiter(rate=args.rate, max_rate=args.max_rate)
+
+    server = None
+    if args.server_url is None:
+        server = NHL_Replay_Server(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            retry_after=0,
+        ).start()
+
+    results = run_benchmark(
+        args.server_url or server.url,
+        modes=args.modes,
+        nb_games=args.nb_games,
+        concurrency=args.concurrency,
+        compression=args.compression,
+        trace_memory=not args.no_trace_memory,
+    )
+
+    if server is not None:
+        server.stop()
+
+    print(results.to_string(float_format=lambda x: f"{x:.2f}"))
+    if args.output is not None:
+        results.to_csv(args.output)
@@ -0,0 +1,162 @@
+"""
+Persistent record (sqlite file, with the sqlite_utils library) of what has been fetched from the NHL REST API,
+used by the `--sync` mode of `nhl_rest_api_fetcher.py` (see `sync_seasons()`) to only download
+the games that are missing, corrupted (size/checksum differs from the manifest) or not over yet.
+
+A game is recorded only once its file is completely written, so a file left by an interrupted run
+is never mistaken for a complete one : the next sync simply downloads it again.
+
+Tables :
+    - `games`   : gamePk, season, path, status ('ok' or 'failed'), size, sha256, game_state, fetched_at, error
+    - `seasons` : season, game_ids (json list of the gamePk of the schedule), schedule_fetched_at
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+from sqlite_utils import Database
+
+from .http_cache import FINAL_GAME_STATES
+
+def sha256_of_file(path : Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Fetch_Manifest:
+
+    def __init__(self, sqlite_path_file : Union[str, Path]) -> None:
+        self.sqlite_path_file = Path(sqlite_path_file)
+        self.sqlite_path_file.parent.mkdir(parents=True, exist_ok=True)
+        self.db = Database(self.sqlite_path_file)
+
+        self.db["games"].create(
+            {
+                "gamePk": int,
+                "season": int,
+                "path": str,
+                "status": str,
+                "size": int,
+                "sha256": str,
+                "game_state": str,
+                "fetched_at": float,
+                "error": str,
+            },
+            pk="gamePk",
+            if_not_exists=True,
+        )
+        self.db["seasons"].create(
+            {
+                "season": int,
+                "game_ids": str,
+                "schedule_fetched_at": float,
+            },
+            pk="season",
+            if_not_exists=True,
+        )
+
+    # ------------------------------------------------------------------ seasons
+
+    def record_schedule(self, season : int, game_ids : List[int]) -> None:
+        self.db["seasons"].upsert(
+            {"season": season, "game_ids": json.dumps(list(game_ids)), "schedule_fetched_at": time.time()},
+            pk="season",
+        )
+
+    def scheduled_games(self, season : int) -> Optional[List[int]]:
+        """gamePk of the schedule of `season` as recorded at the last sync, None if never recorded
+        """
+        rows = list(self.db["seasons"].rows_where("season = ?", [season]))
+        return json.loads(rows[0]["game_ids"]) if rows else None
+
+    def is_season_over(self, season : int) -> bool:
+        """True if every game of the recorded schedule of `season` is fetched and over
+            (then its schedule can not change anymore and does not need to be fetched again)
+        """
+        game_ids = self.scheduled_games(season)
+        if not game_ids:
+            return False
+        nb_final_games = self.db.execute(
+            f"""
+            SELECT COUNT(*) FROM games
+            WHERE season = ? AND status = 'ok' AND game_state IN ({', '.join('?' * len(FINAL_GAME_STATES))})
+            """,
+            [season, *FINAL_GAME_STATES],
+        ).fetchone()[0]
+        return nb_final_games == len(game_ids)
+
+    # ------------------------------------------------------------------ games
+
+    def record_game(
+            self,
+            game_id : int,
+            season : int,
+            path : Union[str, Path],
+            game_state : Optional[str],
+        ) -> None:
+        """Record a game whose file was completely written at `path`
+        """
+        self.db["games"].upsert(
+            {
+                "gamePk": game_id,
+                "season": season,
+                "path": str(path),
+                "status": "ok",
+                "size": Path(path).stat().st_size,
+                "sha256": sha256_of_file(path),
+                "game_state": game_state,
+                "fetched_at": time.time(),
+                "error": None,
+            },
+            pk="gamePk",
+        )
+
+    def record_failure(self, game_id : int, season : int, path : Union[str, Path], error : Exception) -> None:
+        self.db["games"].upsert(
+            {
+                "gamePk": game_id,
+                "season": season,
+                "path": str(path),
+                "status": "failed",
+                "fetched_at": time.time(),
+                "error": repr(error),
+            },
+            pk="gamePk",
+        )
+
+    def games_to_sync(
+            self,
+            game_ids : Iterable[int],
+            paths : Iterable[Union[str, Path]],
+            verify_checksums : bool = False,
+        ) -> List[int]:
+        """Among `game_ids` (expected to be saved at `paths`), the ones to (re)download :
+            never fetched, failed, file missing/moved, size (and sha256 if `verify_checksums`) different
+            from the manifest, or game not over at the time it was fetched.
+
+            Without `verify_checksums`, only one stat per game is done (no-op sync of a season in a fraction of second).
+        """
+        game_ids, paths = list(game_ids), list(map(Path, paths))
+        manifest = {row["gamePk"]: row for row in self.db["games"].rows}
+
+        to_sync = []
+        for game_id, path in zip(game_ids, paths):
+            entry = manifest.get(game_id, None)
+            if (
+                entry is None
+                or entry["status"] != "ok"
+                or entry["path"] != str(path)
+                or entry["game_state"] not in FINAL_GAME_STATES
+                or not path.exists()
+                or path.stat().st_size != entry["size"]
+                or (verify_checksums and sha256_of_file(path) != entry["sha256"])
+            ):
+                to_sync.append(game_id)
+
+        return to_sync
@@ -0,0 +1,202 @@
+"""
+Pipelined counterpart of `regular_playoff_p_by_p_data_per_season()` followed by `JsonParser.load_all_seasons()` :
+instead of two full passes (download everything, then re-read every file from disk to parse it),
+the games are parsed as soon as they are downloaded.
+
+    fetch workers (asyncio, `concurrency` GET requests in flight)
+        ---> bounded queue of raw payloads (`queue_size`)
+            ---> parser workers (`parse_workers` threads running `JsonParser`)
+
+When the parsers are behind, the queue is full and the fetch workers wait (back-pressure), so at most
+`concurrency + queue_size + parse_workers` payloads are in memory whatever the number of games.
+The network-bound and the CPU-bound stages overlap : a season is fetched and parsed in ~max(fetch, parse) instead of their sum.
+The raw files are still saved in DATA_FOLDER/{year} (a game already on disk is not downloaded again, only parsed).
+
+Example:
+    python -m ift6758.data.fetch_parse_pipeline -p_csv raw_data_2016_2020.csv --years 2016 2017 -c 16 --parse_workers 2
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+from loguru import logger
+
+from . import json_backend
+from .json_scrapper import JsonParser
+from .parquet_dataset import read_dataset, write_dataset
+from .play_schema import apply_schema
+from .nhl_rest_api_fetcher import Game_endpoints_Fetcher, fetch_schedule_game_ids, raw_game_file_name, report_fetch_metrics
+
+def parse_raw_game(payload : bytes, shotGoalOnly : bool) -> pd.DataFrame:
+    """Rows of one game from the raw bytes of its game/{id}/feed/live response
+    """
+    return JsonParser().parse_json_file(shotGoalOnly, data=json_backend.loads(payload))
+
+async def fetch_and_parse_games(
+        game_ids : List[int],
+        output_dir : Path,
+        shotGoalOnly : bool,
+        concurrency : int = 16,
+        parse_workers : int = 2,
+        queue_size : int = 64,
+        compression : str = None,
+        executor : Executor = None,
+    ) -> pd.DataFrame:
+    """Download (into `output_dir`, see `raw_game_file_name()`) and parse every game of `game_ids`, the two stages overlapping.
+
+    Args:
+        game_ids (List[int]): games to fetch and parse
+        output_dir (Path): where the raw files are saved (games already there are only parsed)
+        shotGoalOnly (bool): same as in `JsonParser.parse_json_file()`
+        concurrency (int, optional): fetch workers (GET requests in flight). Defaults to 16.
+        parse_workers (int, optional): parser workers. Defaults to 2.
+        queue_size (int, optional): maximal number of payloads downloaded and waiting to be parsed. Defaults to 64.
+        compression (str, optional): "gz" or "zst" to save the raw files compressed. Defaults to None.
+        executor (Executor, optional): where the parsing runs. Defaults to a ThreadPoolExecutor of `parse_workers` threads.
+
+    Returns:
+        pd.DataFrame: rows of every game, in the order of `game_ids` (a game that can not be fetched or parsed is logged and skipped)
+    """
+    import aiohttp
+    from tqdm import tqdm
+
+    if concurrency < 1 or parse_workers < 1 or queue_size < 1:
+        raise RuntimeError(f"CONCURRENCY, PARSE_WORKERS AND QUEUE_SIZE MUST BE >= 1, YOU SPECIFIED {concurrency}, {parse_workers}, {queue_size}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    games_to_fetch = iter(game_ids) # shared by the fetch workers, they all run in the event loop thread
+    frames : Dict[int, pd.DataFrame] = {}
+    failed : List[int] = []
+
+    async def fetch_worker(session, pbar):
+        for id in games_to_fetch:
+            # like a parse failure, a game that can not be fetched is skipped instead of aborting the whole season
+            try:
+                payload = await Game_endpoints_Fetcher(f"game/{id}/feed/live").fetch_async(
+                    session, output_format="binary", save_local=output_dir / raw_game_file_name(id, compression),
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, OSError) as e:
+                logger.error(f"FAILED TO FETCH game/{id}/feed/live, GAME SKIPPED : {e!r}")
+                failed.append(id)
+                pbar.update(1)
+                continue
+            await queue.put((id, payload)) # waits while the parsers are behind
+
+    async def parse_worker(executor, pbar):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            id, payload = item
+            # a worker must outlive a malformed game : otherwise the queue fills up and the fetch workers wait forever
+            try:
+                frames[id] = await loop.run_in_executor(executor, parse_raw_game, payload, shotGoalOnly)
+            except Exception as e:
+                logger.error(f"FAILED TO PARSE game/{id}/feed/live, GAME SKIPPED : {e!r}")
+                failed.append(id)
+            pbar.set_description(f"Fetched and parsed game/{id}/feed/live")
+            pbar.update(1)
+
+    own_executor = executor is None
+    executor = executor if executor is not None else ThreadPoolExecutor(parse_workers)
+    try:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            with tqdm(total=len(game_ids)) as pbar:
+                parsers = [asyncio.create_task(parse_worker(executor, pbar)) for _ in range(parse_workers)]
+                try:
+                    await asyncio.gather(*[fetch_worker(session, pbar) for _ in range(concurrency)])
+                    for _ in parsers:
+                        await queue.put(None)
+                    await asyncio.gather(*parsers)
+                finally:
+                    for parser in parsers:
+                        parser.cancel()
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    if failed:
+        logger.warning(f"{len(failed)} GAMES COULD NOT BE FETCHED OR PARSED AND ARE NOT IN THE DataFrame : {sorted(failed)}")
+    return apply_schema(pd.concat([frames[id] for id in game_ids if id in frames], ignore_index=True)) if frames else pd.DataFrame()
+
+def fetch_and_parse_seasons(
+        path_csv_output : Path,
+        years : List[int],
+        shotGoalOnly : bool,
+        concurrency : int = 16,
+        parse_workers : int = 2,
+        queue_size : int = 64,
+        compression : str = None,
+    ) -> JsonParser:
+    """Same result as `regular_playoff_p_by_p_data_per_season(years)` then `JsonParser.load_all_seasons(path_csv_output, years, shotGoalOnly)`,
+        but in one pipelined pass (see `fetch_and_parse_games()`). If the csv file already exists, it is loaded and nothing is fetched.
+    """
+    ROOT_DATA = Path(os.getenv("DATA_FOLDER"))
+    OUTPUT_PATH = ROOT_DATA / path_csv_output
+
+    if os.path.exists(OUTPUT_PATH):
+        df = read_dataset(OUTPUT_PATH)
+        logger.info(f"SKIPPING FETCHING AND SCRAPPING >>> DataFrame loaded from {OUTPUT_PATH}")
+        return JsonParser(df=df, path=OUTPUT_PATH)
+
+    frames = []
+    for year in years:
+        logger.info(f"Fetching and parsing season {year}")
+        frames.append(asyncio.run(
+            fetch_and_parse_games(
+                fetch_schedule_game_ids(year), ROOT_DATA / str(year), shotGoalOnly,
+                concurrency, parse_workers, queue_size, compression,
+            )
+        ))
+        report_fetch_metrics()
+
+    parser = JsonParser(df=apply_schema(pd.concat(frames, ignore_index=True)))
+    write_dataset(parser.df, OUTPUT_PATH)
+    logger.info(f"DataFrame saved to {OUTPUT_PATH}")
+    parser.output_path = OUTPUT_PATH
+    return parser
+
+
+def cli_args():
+    '''
+    CLI Interface, same arguments as json_scrapper.py and nhl_rest_api_fetcher.py, plus the sizes of the pipeline
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Fetch the games of the NHL REST API and parse them in one pipelined pass, to a .csv file')
+    parser.add_argument('-p_csv', '--path_to_csv', type=str, required=True, help='Path to the csv file (or .parquet directory). WILL BE CONCATENATED WITH the .env\'s DATA_FOLDER var.')
+    parser.add_argument('-y','--years', required=True, nargs='+', type=int, help='years of seasons to iterate on')
+    parser.add_argument('--shotGoalOnly', action='store_true', help='Filter only "GOAL" and "SHOT" events')
+    parser.add_argument('-c','--concurrency', type=int, default=16, help='number of concurrent GET requests')
+    parser.add_argument('--parse_workers', type=int, default=2, help='number of parser workers')
+    parser.add_argument('--queue_size', type=int, default=64, help='maximal number of downloaded games waiting to be parsed')
+    parser.add_argument('--compression', choices=['gz', 'zst'], default=None, help='if specified, save the raw games compressed')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    from utils.utils import init_logger, verify_dotenv_file
+
+    verify_dotenv_file(Path(__file__).parent.parent)
+    logger = init_logger("fetch_parse_pipeline.log")
+    args = cli_args()
+
+    fetch_and_parse_seasons(
+        args.path_to_csv,
+        args.years,
+        args.shotGoalOnly,
+        args.concurrency,
+        args.parse_workers,
+        args.queue_size,
+        args.compression,
+    )
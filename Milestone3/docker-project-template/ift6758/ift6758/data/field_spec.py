@@ -0,0 +1,92 @@
+"""
+Declarative extraction of the columns of the parsers (`JsonParser`, `JsonParser_v2`) from the json of the NHL API.
+
+A column is a `Field` : its name, the path of its value in the json (keys separated by dots), the value when the path does not exist
+and a cast applied to the values found (not to None). A list of fields is compiled once, at import, into a flat python function
+(`compile_fields()`) reading every value with chained subscripts, i.e. for
+
+    Field("period", "periodDescriptor.number", cast=int)
+
+the compiled function does
+
+    try:
+        value = source["periodDescriptor"]["number"]
+    except (KeyError, IndexError, TypeError):
+        value = None
+    else:
+        if value is not None:
+            value = int(value)
+    row["period"] = value
+
+instead of walking the dicts again, level by level, for every value (see `misc.safe_getitem_nested_dict()`).
+Adding a column to a parser is adding a line to its list of fields.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Sequence
+
+_MISSING = (KeyError, IndexError, TypeError)
+
+class Field(NamedTuple):
+    column : str
+    path : str
+    default : Any = None
+    cast : Callable[[Any], Any] = None
+
+def _value_lines(field : Field, i : int, namespace : Dict[str, Any], indent : str = "    ") -> List[str]:
+    """Lines of code setting `value` to the value of `field` in `source`, the default and the cast are looked up in `namespace`
+    """
+    subscripts = "".join(f"[{key!r}]" for key in field.path.split("."))
+    namespace[f"_default_{i}"] = field.default
+    lines = [
+        "try:",
+        f"    value = source{subscripts}",
+        "except _MISSING:",
+        f"    value = _default_{i}",
+    ]
+    if field.cast is not None:
+        namespace[f"_cast_{i}"] = field.cast
+        lines += [
+            "else:",
+            "    if value is not None:",
+            f"        value = _cast_{i}(value)",
+        ]
+    return [indent + line for line in lines]
+
+def _compile(name : str, lines : List[str], namespace : Dict[str, Any]) -> Callable:
+    namespace["_MISSING"] = _MISSING
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+def compile_fields(fields : Sequence[Field]) -> Callable[[dict, dict], dict]:
+    """Compile `fields` into a function `extract(source, row=None) -> row` setting row[field.column] for every field, in order
+        (the keys already in `row` keep their position, the new ones are added after them)
+    """
+    namespace = {}
+    lines = ["def extract(source, row=None):", "    if row is None:", "        row = {}"]
+    for i, field in enumerate(fields):
+        lines += _value_lines(field, i, namespace)
+        lines.append(f"    row[{field.column!r}] = value")
+    lines.append("    return row")
+    return _compile("extract", lines, namespace)
+
+def compile_columns(fields : Sequence[Field]) -> Callable[[Iterable[dict]], Dict[str, list]]:
+    """Columnar counterpart of `compile_fields()` : compile `fields` into a function `extract(sources) -> {column: values}`
+        reading the fields of every source in one pass (for the parsers building a DataFrame from whole lists of plays)
+    """
+    namespace = {}
+    lines = ["def extract(sources):"]
+    lines += [f"    column_{i} = []" for i in range(len(fields))]
+    lines += [f"    append_{i} = column_{i}.append" for i in range(len(fields))]
+    lines.append("    for source in sources:")
+    for i, field in enumerate(fields):
+        lines += _value_lines(field, i, namespace, indent="        ")
+        lines.append(f"        append_{i}(value)")
+    lines.append("    return {" + ", ".join(f"{field.column!r}: column_{i}" for i, field in enumerate(fields)) + "}")
+    return _compile("extract", lines, namespace)
+
+def compile_getter(path : str, default : Any = None, cast : Callable[[Any], Any] = None) -> Callable[[dict], Any]:
+    """Compile one path into a function `get(source) -> value` (same semantic as a field of `compile_fields()`)
+    """
+    namespace = {}
+    lines = ["def get(source):"] + _value_lines(Field(None, path, default, cast), 0, namespace) + ["    return value"]
+    return _compile("get", lines, namespace)
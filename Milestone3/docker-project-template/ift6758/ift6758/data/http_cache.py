@@ -0,0 +1,144 @@
+"""
+Persistent cache of the HTTP metadata (ETag / Last-Modified) of the responses saved locally by the fetchers
+(i.e. `save_local` in `Base_Fetcher.fetch()`).
+
+Thanks to it, `Base_Fetcher.fetch(..., cache=HTTP_Cache(...))` does not blindly trust (or blindly re-download)
+a file already existing locally, it applies a freshness policy chosen w.r.t the state of the game in the file :
+    - "immutable"  : the local file is returned without any GET request (i.e. game is over)
+    - "revalidate" : a conditional GET request is made (If-None-Match / If-Modified-Since),
+                     if the server answers 304 (no body) the local file is returned
+    - int          : number of seconds during which the local file is returned without any GET request,
+                     after that, same as "revalidate"
+
+The metadata is stored in a sqlite file (one row per url) with the sqlite_utils library, as the other caches of the project.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from sqlite_utils import Database
+
+# Keys are the states of the game as written in the json files
+#   v1 API : gameData.status.abstractGameState
+#   v2 API : gameState
+FINAL_GAME_STATES = ("Final", "FINAL", "OFF")
+
+DEFAULT_FRESHNESS_POLICIES = {
+    **{state: "immutable" for state in FINAL_GAME_STATES},
+    "Live": "revalidate",
+    "Preview": "revalidate",
+    "LIVE": "revalidate",
+    "CRIT": "revalidate",
+    "PRE": "revalidate",
+    "FUT": "revalidate",
+}
+
+class HTTP_Cache:
+    '''
+    One row per url in the table `TABLE_NAME` of the sqlite file :
+        url, path (where the body was saved locally), etag, last_modified, game_state,
+        fetched_at (last time the body was downloaded), validated_at (last time the body was known to be up-to-date)
+    '''
+
+    TABLE_NAME = "http_metadata"
+
+    def __init__(
+            self,
+            sqlite_path_file : Union[str, Path],
+            freshness_policies : Dict[str, Union[str, int]] = None,
+            default_policy : Union[str, int] = "revalidate",
+        ) -> None:
+        """
+        Args:
+            sqlite_path_file (Union[str, Path]): sqlite file where the metadata is persisted (created if needed)
+            freshness_policies (Dict[str, Union[str, int]], optional): game state ---> policy. Defaults to DEFAULT_FRESHNESS_POLICIES.
+            default_policy (Union[str, int], optional): policy for game states not in `freshness_policies` (or unknown). Defaults to "revalidate".
+        """
+        self.sqlite_path_file = Path(sqlite_path_file)
+        self.sqlite_path_file.parent.mkdir(parents=True, exist_ok=True)
+        self.freshness_policies = DEFAULT_FRESHNESS_POLICIES if freshness_policies is None else freshness_policies
+        self.default_policy = default_policy
+
+        for policy in [*self.freshness_policies.values(), self.default_policy]:
+            if policy not in ("immutable", "revalidate") and not isinstance(policy, int):
+                raise RuntimeError(
+                    f"""
+                    FRESHNESS POLICY MUST BE "immutable", "revalidate" OR A NUMBER OF SECONDS
+                    YOU SPECIFIED {policy}
+                    """
+                )
+
+        # Fetchers may be used from several threads, so one connection shared under a lock
+        self._lock = threading.Lock()
+        self.db = Database(sqlite3.connect(self.sqlite_path_file, check_same_thread=False))
+        self.db[self.TABLE_NAME].create(
+            {
+                "url": str,
+                "path": str,
+                "etag": str,
+                "last_modified": str,
+                "game_state": str,
+                "fetched_at": float,
+                "validated_at": float,
+            },
+            pk="url",
+            if_not_exists=True,
+        )
+
+    def lookup(self, url : str, save_local : Union[str, Path]) -> Optional[dict]:
+        """Return the metadata of `url`, None if unknown or if the body is not (anymore) at `save_local`
+        """
+        with self._lock:
+            rows = list(self.db[self.TABLE_NAME].rows_where("url = ?", [url]))
+
+        if not rows or rows[0]["path"] != str(save_local) or not Path(save_local).exists():
+            return None
+        return rows[0]
+
+    def is_fresh(self, entry : dict) -> bool:
+        """True if the local body described by `entry` can be used without any GET request
+        """
+        policy = self.freshness_policies.get(entry["game_state"], self.default_policy)
+        if policy == "immutable":
+            return True
+        if policy == "revalidate":
+            return False
+        return time.time() - entry["validated_at"] < policy
+
+    @staticmethod
+    def conditional_headers(entry : dict) -> Dict[str, str]:
+        """Headers to add to the GET request so that the server answers 304 if the body did not change
+        """
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url : str, save_local : Union[str, Path], headers, game_state : Optional[str]) -> None:
+        """Record the metadata of a body that was just downloaded and saved at `save_local`
+        """
+        now = time.time()
+        with self._lock:
+            self.db[self.TABLE_NAME].upsert(
+                {
+                    "url": url,
+                    "path": str(save_local),
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified"),
+                    "game_state": game_state,
+                    "fetched_at": now,
+                    "validated_at": now,
+                },
+                pk="url",
+            )
+
+    def mark_validated(self, url : str) -> None:
+        """Record that the server answered 304 for `url` (i.e. the local body is up-to-date)
+        """
+        with self._lock:
+            self.db[self.TABLE_NAME].update(url, {"validated_at": time.time()})
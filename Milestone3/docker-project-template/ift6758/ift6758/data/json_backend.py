@@ -0,0 +1,121 @@
+"""
+Pluggable json decoder shared by the fetchers (`Base_Fetcher`, so `GameClient`) and the parsers (`JsonParser`, `JsonParser_v2`, through `read_raw_json()`).
+
+Decoding the raw games is a large part of the parsing time (~1MB of json per game), so the fastest decoder installed is used :
+    orjson ---> simdjson (pysimdjson) ---> ujson ---> json (standard library, always available)
+
+The backend can be forced with the NHL_JSON_BACKEND environment variable (e.g. NHL_JSON_BACKEND=json) or with `set_backend()`.
+Every backend returns plain python objects (dict, list, str, int, float, bool, None), the encoding of the json stays with the standard library.
+
+Compare the backends installed on a recorded game with :
+    python -m ift6758.data.json_backend --json_file $DATA_FOLDER/v2_api/2022030411.json
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Union
+
+JSON_BACKENDS = ("orjson", "simdjson", "ujson", "json")
+ENV_JSON_BACKEND = "NHL_JSON_BACKEND"
+
+def _import_decoder(name : str) -> Callable[[Union[bytes, str]], Any]:
+    """`loads` function of the backend `name`, ImportError if the package is not installed
+    """
+    if name == "orjson":
+        import orjson
+        return orjson.loads
+    if name == "simdjson":
+        import simdjson
+        return simdjson.loads
+    if name == "ujson":
+        import ujson
+        return ujson.loads
+    if name == "json":
+        return json.loads
+    raise RuntimeError(f"UNKNOWN JSON BACKEND {name}, SUPPORTED BACKENDS ARE {JSON_BACKENDS}")
+
+def available_backends() -> List[str]:
+    """Backends installed, fastest first
+    """
+    backends = []
+    for name in JSON_BACKENDS:
+        try:
+            _import_decoder(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+_backend_name : str = None
+_decoder : Callable[[Union[bytes, str]], Any] = None
+
+def set_backend(name : str = None) -> str:
+    """Select the backend used by `loads()` and `load_file()`
+
+    Args:
+        name (str, optional): one of `JSON_BACKENDS`. Defaults to the NHL_JSON_BACKEND environment variable, or the fastest backend installed.
+
+    Returns:
+        str: name of the backend selected
+    """
+    global _backend_name, _decoder
+    name = name or os.getenv(ENV_JSON_BACKEND) or available_backends()[0]
+    _decoder = _import_decoder(name)
+    _backend_name = name
+    return name
+
+def get_backend() -> str:
+    if _decoder is None:
+        set_backend()
+    return _backend_name
+
+def loads(content : Union[bytes, bytearray, str]) -> Any:
+    """Decode a json document (bytes are decoded as utf-8 without an intermediate str with orjson and simdjson)
+    """
+    if _decoder is None:
+        set_backend()
+    return _decoder(content)
+
+def load_file(path : Union[str, Path]) -> Any:
+    """Decode a (not compressed) json file, read as bytes
+    """
+    with open(path, "rb") as file:
+        return loads(file.read())
+
+def benchmark_backends(json_file : Union[str, Path], repeat : int = 20) -> Dict[str, float]:
+    """Best time (ms) to decode `json_file` with every backend installed (the file is read once, only the decoding is timed)
+        Raises RuntimeError if a backend does not decode the file to the same python object as the standard library.
+    """
+    import timeit
+
+    content = Path(json_file).read_bytes()
+    reference = json.loads(content)
+    timings = {}
+    for name in available_backends():
+        decoder = _import_decoder(name)
+        if decoder(content) != reference:
+            raise RuntimeError(f"JSON BACKEND {name} DOES NOT DECODE {json_file} AS THE STANDARD LIBRARY")
+        timings[name] = min(timeit.repeat(lambda: decoder(content), number=1, repeat=repeat)) * 1e3
+    return timings
+
+
+def cli_args():
+    '''
+    CLI Interface, to specify the json file decoded by the micro-benchmark
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the json decoders installed on a recorded game')
+    parser.add_argument('-jf', '--json_file', type=Path, required=True, help='json file decoded (e.g. a game recorded from the NHL REST API)')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='number of decodings per backend (the fastest one is reported)')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    args = cli_args()
+    timings = benchmark_backends(args.json_file, args.repeat)
+    baseline = timings["json"]
+    print(f"Decoding {args.json_file} ({args.json_file.stat().st_size / 1e6:.2f} MB), best of {args.repeat}")
+    for name, elapsed in timings.items():
+        print(f"    {name:<10} {elapsed:8.2f} ms    x{baseline / elapsed:.2f}")
@@ -2,10 +2,70 @@ from pathlib import Path
 import sys
 import numpy as np
 import pandas as pd
-import json
 from tqdm import tqdm
 import datetime
 import os
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable
+from loguru import logger
+
+from .dataset_manifest import Dataset_Manifest
+from .field_spec import Field, compile_fields
+from .misc import safe_int_casting
+from .parquet_dataset import read_dataset, update_dataset, write_dataset
+from .play_schema import apply_schema
+from .raw_archive import ARCHIVE_SUFFIX, Season_Archive, chunk_raw_json_sources, is_raw_archive, iter_raw_json, read_raw_json
+from .schedule_index import Schedule_Index
+
+def _parse_date(date_str):
+    return datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d") if date_str else None
+
+# Columns of the rows of `JsonParser`, in this order (see field_spec.py) : the ones of the game (from data["gameData"]),
+# the ones of every play, the ones of the plays of some event types, then the players involved in these plays
+GAME_FIELDS = [
+    Field("gameId", "game.pk", cast=int),
+    Field("season", "game.season", cast=lambda season: int(season[:4])),
+    Field("gameType", "game.type"),
+    Field("gameDate", "datetime.dateTime", cast=_parse_date),
+    Field("homeTeam", "teams.home.abbreviation"),
+    Field("awayTeam", "teams.away.abbreviation"),
+]
+PLAY_FIELDS = [
+    Field("period", "about.period", cast=int),
+    Field("periodTime", "about.periodTime"),
+    Field("byTeam", "team.triCode"),
+    Field("eventType", "result.eventTypeId"),
+    Field("coordinateX", "coordinates.x"),
+    Field("coordinateY", "coordinates.y"),
+]
+EVENT_FIELDS = {
+    "GOAL": [
+        Field("shotType", "result.secondaryType"),
+        Field("strength", "result.strength.code"),
+        Field("emptyNet", "result.emptyNet", default=False),
+    ],
+    "SHOT": [
+        Field("shotType", "result.secondaryType"),
+    ],
+    "PENALTY": [
+        Field("penaltySeverity", "result.penaltySeverity"),
+        Field("penaltyMinutes", "result.penaltyMinutes"),
+        Field("penalizedTeam", "team.triCode"),
+    ],
+}
+# column ---> playerType in play["players"], the columns {column} (fullName) and {column}Id (id) are added
+EVENT_PLAYERS = {
+    "GOAL": [("shooter", "Scorer"), ("goalie", "Goalie")],
+    "SHOT": [("shooter", "Shooter"), ("goalie", "Goalie")],
+    "BLOCKED_SHOT": [("shooter", "Shooter")],
+    "MISSED_SHOT": [("shooter", "Shooter")],
+}
+
+_extract_game_fields = compile_fields(GAME_FIELDS)
+_extract_play_fields = compile_fields(PLAY_FIELDS)
+_EVENT_FIELDS_EXTRACTORS = {event_type: compile_fields(fields) for event_type, fields in EVENT_FIELDS.items()}
 
 class JsonParser:
     """
@@ -17,27 +77,35 @@ class JsonParser:
     def __init__(
             self, 
             path : str = None, 
-            df : pd.DataFrame =None) -> None:
-        """Either initialize with a path or with an existing DataFrame.
+            df : pd.DataFrame =None,
+            shotGoalOnly : bool = False,
+            data : dict = None) -> None:
+        """Either initialize with a path, with an already decoded json or with an existing DataFrame.
 
         Args:
             path (str, optional): path_to_a_DataFrame. Defaults to None.
             df (pd.DataFrame, optional): pandas Dataframe. Defaults to None.
+            shotGoalOnly (bool, optional): keep only "GOAL" and "SHOT" events. Defaults to False.
+            data (dict, optional): content of a json file (i.e. read from a .nhlpack archive). Defaults to None.
         """        
         self.path = path
         if df is not None:
             self.df = df
-        elif path:
-            self.df = self.parse_json_file(args.shotGoalOnly)
+        elif path or data is not None:
+            self.df = self.parse_json_file(shotGoalOnly, data)
         else:
             self.df = pd.DataFrame()
 
-    def parse_json_file(self, shotGoalOnly):
-        with open(self.path, "r") as f:
-            data = json.load(f)
+    def parse_json_file(self, shotGoalOnly, data=None, plays=None):
+        """`plays` : subset of data["liveData"]["plays"]["allPlays"] to parse
+            (i.e. only the new plays of a live game, see `Live_Game_Tracker`), all the plays of the game if None
+        """
+        if data is None:
+            # .json, .json.gz or .json.zst
+            data = read_raw_json(self.path)
 
         gameData = data["gameData"]
-        liveData = data["liveData"]["plays"]["allPlays"]
+        liveData = data["liveData"]["plays"]["allPlays"] if plays is None else plays
         rinkSide = data["liveData"]["linescore"]["periods"]
         linescore = data["liveData"]["linescore"]
 
@@ -69,102 +137,40 @@ class JsonParser:
                 row_data = self.extract_play_data(play, game_info, rink_side_dict, winning_team)
                 rows.append(row_data)
 
-        df = pd.DataFrame(rows)
+        df = apply_schema(pd.DataFrame(rows))
         return df
 
     def extract_game_info(self, gameData):
-
-        game_info = {
-            "gameId": int(gameData.get("game", {}).get("pk", None)),
-            "season": int(gameData.get("game", {}).get("season", None)[:4]),
-            "gameType": gameData.get("game", {}).get("type", None),
-            "gameDate": self.parse_date(gameData.get("datetime", {}).get("dateTime", "")),
-            "homeTeam": gameData.get("teams", {}).get("home", {}).get("abbreviation", None),
-            "awayTeam": gameData.get("teams", {}).get("away", {}).get("abbreviation", None),
-        }
-        return game_info
+        return _extract_game_fields(gameData)
 
     def parse_date(self, date_str):
-        return datetime.datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d") if date_str else None
+        return _parse_date(date_str)
 
     def extract_play_data(self, play, game_info, rink_side_dict, win_team):
-        period = int(play.get("about", {}).get("period", None))
-        byTeam = play.get("team", {}).get("triCode", None)
-        homeTeam = game_info["homeTeam"]
-
-        row_data = game_info.copy()
-        row_data.update({
-            "period": period,
-            "periodTime": play.get("about", {}).get("periodTime", None),
-            "byTeam": byTeam,
-            "eventType": play.get("result", {}).get("eventTypeId", None),
-        })
-        
-        coordinates = play.get("coordinates", {})
-        coordinateX = coordinates.get("x", None)
-        coordinateY = coordinates.get("y", None)
-
-        row_data["coordinateX"] = coordinateX
-        row_data["coordinateY"] = coordinateY
+        row_data = _extract_play_fields(play, game_info.copy())
         row_data['winTeam'] = win_team
 
         self.populate_event_specific_data(play, row_data)
 
         # Add rink side information
+        period = row_data["period"]
         if period == 5:
             row_data['rinkSide'] = 'Shootout'
         else:
-            row_data['rinkSide'] = rink_side_dict.get(period, {}).get('home' if byTeam == homeTeam else 'away', None)
+            row_data['rinkSide'] = rink_side_dict.get(period, {}).get('home' if row_data["byTeam"] == game_info["homeTeam"] else 'away', None)
 
         return row_data
 
     def populate_event_specific_data(self, play, row_data):
         event_type = row_data["eventType"]
-        event_populate_functions = {
-            "GOAL": self.populate_goal_data,
-            "SHOT": self.populate_shot_data,
-            "PENALTY": self.populate_penalty_data,
-            "BLOCKED_SHOT": self.populate_blocked_shot_data,
-            "MISSED_SHOT": self.populate_missed_shot_data,
-        }
-        if event_type in event_populate_functions:
-            event_populate_functions[event_type](play, row_data)
-
-    def populate_goal_data(self, play, row_data):
-        row_data["shotType"] = play.get("result", {}).get("secondaryType", None)
-        row_data["strength"] = play.get("result", {}).get("strength", {}).get("code", None)
-        row_data["emptyNet"] = play.get("result", {}).get("emptyNet", False)
-        shooter_name, shooter_id = self.get_player_info(play, "Scorer")
-        goalie_name, goalie_id = self.get_player_info(play, "Goalie")
-        row_data["shooter"] = shooter_name
-        row_data["goalie"] = goalie_name
-        row_data["shooterId"] = int(shooter_id)
-        row_data["goalieId"] = goalie_id
-
-    def populate_shot_data(self, play, row_data):
-        row_data["shotType"] = play.get("result", {}).get("secondaryType", None)
-        shooter_name, shooter_id = self.get_player_info(play, "Shooter")
-        goalie_name, goalie_id = self.get_player_info(play, "Goalie")
-        row_data["shooter"] = shooter_name
-        row_data["goalie"] = goalie_name
-        row_data["shooterId"] = int(shooter_id)
-        row_data["goalieId"] = goalie_id
-
-    def populate_penalty_data(self, play, row_data):
-        row_data["penaltySeverity"] = play.get("result", {}).get("penaltySeverity", None)
-        row_data["penaltyMinutes"] = play.get("result", {}).get("penaltyMinutes", None)
-        penalized_team = play.get("team", {}).get("triCode", None)
-        row_data["penalizedTeam"] = penalized_team
-
-    def populate_blocked_shot_data(self, play, row_data):
-        shooter_name, shooter_id = self.get_player_info(play, "Shooter")
-        row_data["shooter"] = shooter_name
-        row_data["shooterId"] = int(shooter_id)
-
-    def populate_missed_shot_data(self, play, row_data):
-        shooter_name, shooter_id = self.get_player_info(play, "Shooter")
-        row_data["shooter"] = shooter_name
-        row_data["shooterId"] = int(shooter_id)
+        if event_type in _EVENT_FIELDS_EXTRACTORS:
+            _EVENT_FIELDS_EXTRACTORS[event_type](play, row_data)
+        if event_type in EVENT_PLAYERS:
+            players = [(column, *self.get_player_info(play, player_type)) for column, player_type in EVENT_PLAYERS[event_type]]
+            for column, player_name, _ in players:
+                row_data[column] = player_name
+            for column, _, player_id in players:
+                row_data[f"{column}Id"] = safe_int_casting(player_id)
 
     def get_player_info(self, play, player_type):
         for player in play.get("players", []):
@@ -177,46 +183,147 @@ class JsonParser:
     def __add__(self, other):
         if not isinstance(other, JsonParser):
             raise ValueError("Can only add JsonParser objects.")
-        combined_df = pd.concat([self.df, other.df], ignore_index=True)
+        combined_df = apply_schema(pd.concat([self.df, other.df], ignore_index=True))
         return JsonParser(df=combined_df)
 
+    @staticmethod
+    def concat(parsers : Iterable["JsonParser"]) -> "JsonParser":
+        """Same result as `parser_1 + parser_2 + ... + parser_n`, but the DataFrame is materialized only once :
+            the per-game DataFrames are collected then concatenated in one go, linear in the number of rows
+            (`+` copies the whole accumulated DataFrame at every game, quadratic over a season).
+            Peak memory is ~2x the final DataFrame (the per-game DataFrames + the result).
+            The categories of the per-game DataFrames are merged (see `play_schema.apply_schema()`).
+        """
+        frames = []
+        for parser in parsers:
+            if not isinstance(parser, JsonParser):
+                raise ValueError("Can only concat JsonParser objects.")
+            frames.append(parser.df)
+        return JsonParser(df=apply_schema(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame())
+
     @staticmethod
     def load_all_seasons(
         path_csv_output : Path,
         seasons_to_consider : list[int],
-        shotGoalOnly: bool):
+        shotGoalOnly: bool,
+        game_types : list[str] = None,
+        workers : int = 1,
+        incremental : bool = False):
+        """Parse every game of `seasons_to_consider` found in DATA_FOLDER, or only the games of type in `game_types`
+            ("R", "P", ...) according to the local `Schedule_Index` (the schedule of a season not indexed yet is requested once)
+
+            if `path_csv_output` ends with .parquet, the DataFrame is saved as a Parquet dataset partitioned by season and gameType
+            (see `parquet_dataset.py`) instead of a csv file
+
+            if workers > 1, the games are parsed by a pool of `workers` processes, by chunks of games
+            (each worker reads its games itself and sends back one DataFrame per chunk), the rows are in the same order as with workers=1
+
+            if incremental, the games that went into the dataset are recorded (see `dataset_manifest.py`) and, when the dataset exists,
+            only the games new or changed since the last run are parsed : their rows are appended to the dataset or replace the previous ones,
+            and the rows of the games whose file was deleted are removed (see `parquet_dataset.update_dataset()`).
+            The games of the seasons not in `seasons_to_consider` are kept. The first incremental run on a dataset
+            (or a run with other `shotGoalOnly`, `game_types`) rebuilds it entirely.
+        """
 
 
         ROOT_DATA = Path(os.getenv("DATA_FOLDER"))
         OUTPUT_PATH = ROOT_DATA / path_csv_output
         
-        if os.path.exists(OUTPUT_PATH):
-            df = pd.read_csv(OUTPUT_PATH, parse_dates=["gameDate"])
+        if os.path.exists(OUTPUT_PATH) and not incremental:
+            df = read_dataset(OUTPUT_PATH)
             logger.info(f"SKIPPING SCRAPPING >>> DataFrame loaded from {OUTPUT_PATH}")
             return JsonParser(df=df, path=OUTPUT_PATH)
 
 
-        all_seasons = sorted(list(filter(
+        # A season is either a directory of json files or a .nhlpack archive (see raw_archive.py), the archive is preferred
+        all_seasons = sorted(set(filter(
             lambda s : s in seasons_to_consider,
-            os.listdir(ROOT_DATA)
+            map(lambda entry : entry.removesuffix(ARCHIVE_SUFFIX), os.listdir(ROOT_DATA))
         )))
 
-        base_parser = JsonParser()
-        with tqdm(total=len(all_seasons)) as pbar1:
-            for season in all_seasons:
+        # (season, paths, game_ids) : the arguments of `iter_raw_json()` yielding the games of the season
+        sources = []
+        schedule_index = Schedule_Index() if game_types is not None else None
+        for season in all_seasons:
+            if (ROOT_DATA / f"{season}{ARCHIVE_SUFFIX}").exists():
+                all_games = [ROOT_DATA / f"{season}{ARCHIVE_SUFFIX}"]
+            else:
+                all_games = [ROOT_DATA / season / game for game in os.listdir(ROOT_DATA / season)]
+            game_ids = None
+            if game_types is not None:
+                if not schedule_index.is_season_indexed(int(season), game_types):
+                    schedule_index.refresh(int(season), game_types)
+                game_ids = schedule_index.game_ids(int(season), game_types=game_types)
+            sources.append((season, all_games, game_ids))
+
+        if incremental:
+            manifest = Dataset_Manifest(OUTPUT_PATH)
+            options = {"shotGoalOnly": shotGoalOnly, "game_types": game_types}
+            rebuild = not manifest.matches(options)
+            if rebuild:
+                manifest.reset(options)
+            fingerprints, games_of_season = {}, {}
+            for season, all_games, game_ids in sources:
+                games_of_season[season] = manifest.scan(all_games, game_ids)
+                fingerprints.update(games_of_season[season])
+            games_to_parse, games_to_drop = manifest.changes(fingerprints)
+            logger.info(
+                f"INCREMENTAL SCRAPPING >>> {len(games_to_parse)} new or changed games, {len(games_to_drop) - len(games_to_parse)} removed, "
+                f"{len(fingerprints) - len(games_to_parse)} unchanged"
+            )
+            games_to_parse = set(games_to_parse)
+            sources = [
+                (season, all_games, [id for id in games_of_season[season] if id in games_to_parse])
+                for season, all_games, _ in sources
+            ]
+
+        parsers = []
+        with (ProcessPoolExecutor(workers) if workers > 1 else contextlib.nullcontext()) as executor, \
+             tqdm(total=len(sources)) as pbar1:
+            for season, all_games, game_ids in sources:
                 pbar1.set_description(f"Processing json files of season {season}")
-                base_path = ROOT_DATA / season
-                all_games = os.listdir(base_path)
-                with tqdm(total=len(all_games)) as pbar2:
-                    for game in all_games:
-                        pbar2.set_description(f"Parsing json file {game}")
-                        parser = JsonParser(str(base_path / game))
-                        base_parser = base_parser + parser
-                        pbar2.update(1)
+                if all_games and is_raw_archive(all_games[0]):
+                    with Season_Archive(all_games[0]) as archive:
+                        nb_games = len(archive)
+                else:
+                    nb_games = len(all_games)
+                if game_ids is not None:
+                    nb_games = min(nb_games, len(game_ids))
+                with tqdm(total=nb_games) as pbar2:
+                    if executor is None:
+                        for game, data in iter_raw_json(all_games, game_ids):
+                            pbar2.set_description(f"Parsing json file {game}")
+                            parsers.append(JsonParser(shotGoalOnly=shotGoalOnly, data=data))
+                            pbar2.update(1)
+                    else:
+                        pbar2.set_description(f"Parsing json files of season {season} with {workers} processes")
+                        chunks = chunk_raw_json_sources(all_games, game_ids)
+                        # map() yields the chunks in order, whatever the order in which the workers finish them
+                        for (paths, ids), df in zip(chunks, executor.map(
+                            _parse_games_chunk, [c[0] for c in chunks], [c[1] for c in chunks], repeat(shotGoalOnly),
+                        )):
+                            parsers.append(JsonParser(df=df))
+                            pbar2.update(len(paths) if ids is None else len(ids))
                 pbar1.update(1)
 
-        base_parser.df.to_csv(OUTPUT_PATH, index=False)
+        base_parser = JsonParser.concat(parsers)
+
+        if incremental and not rebuild:
+            if games_to_drop:
+                update_dataset(base_parser.df, OUTPUT_PATH, games_to_drop)
+                logger.info(f"DataFrame updated at {OUTPUT_PATH}")
+            manifest.record(fingerprints, games_to_drop)
+            return JsonParser(df=read_dataset(OUTPUT_PATH), path=OUTPUT_PATH)
+
+        if base_parser.df.empty:
+            # never saved : a later run would load it instead of parsing the games
+            raise RuntimeError(
+                f"NO GAME OF THE SEASONS {seasons_to_consider} (GAME TYPES {game_types}) FOUND IN {ROOT_DATA}, NOTHING SAVED TO {OUTPUT_PATH}"
+            )
+        write_dataset(base_parser.df, OUTPUT_PATH)
         logger.info(f"DataFrame saved to {OUTPUT_PATH}")
+        if incremental:
+            manifest.record(fingerprints)
         base_parser.output_path = OUTPUT_PATH
         return base_parser
     
@@ -244,6 +351,15 @@ class JsonParser:
         experiment.end()
 
 
+def _parse_games_chunk(paths : list[Path], game_ids : list[int], shotGoalOnly : bool) -> pd.DataFrame:
+    """Worker of `JsonParser.load_all_seasons(workers=N)` : parse the games of a chunk (see `chunk_raw_json_sources()`)
+        and return them as one DataFrame (columnar, so much cheaper to send back to the main process than the rows as dicts)
+    """
+    return JsonParser.concat(
+        JsonParser(shotGoalOnly=shotGoalOnly, data=data) for _, data in iter_raw_json(paths, game_ids)
+    ).df
+
+
 def cli_args():
     '''
     CLI Interface, to specify for now:
@@ -263,9 +379,12 @@ def cli_args():
         python Milestone1/json_scrapper.py -p_csv very_big_file.csv --years $(seq -s ' ' 2016 2020)
         '''
     )
-    parser.add_argument('-p_csv', '--path_to_csv', type=str, required=True, help='Path to the csv file. WILL BE CONCATENATED WITH the .env\'s DATA_FOLDER var. PUT THE COMMIT ID IN THE NAME !!!!!!!!!!!!!!!!!!!!')
+    parser.add_argument('-p_csv', '--path_to_csv', type=str, required=True, help='Path to the csv file (or .parquet directory, partitioned by season and gameType). WILL BE CONCATENATED WITH the .env\'s DATA_FOLDER var. PUT THE COMMIT ID IN THE NAME !!!!!!!!!!!!!!!!!!!!')
     parser.add_argument('-y','--years', required=True, nargs='+', type=str, help='years of seasons to iterate on')
     parser.add_argument('--shotGoalOnly', action='store_true', help='Filter only "GOAL" and "SHOT" events')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of processes parsing the json files')
+    parser.add_argument('--game_types', nargs='+', type=str, default=None, help='if specified, only parse the games of these types (i.e. R P), looked up in the local schedule index (see schedule_index.py)')
+    parser.add_argument('--incremental', action='store_true', help='if the csv file exists, only parse the games new or changed since it was written and update it (see dataset_manifest.py), instead of doing nothing')
     parser.add_argument('--comet_dl',default=True, action='store_true', help='Comet : at exp. "json-scrapper-output" push as an artifact the csv file ')
     args = parser.parse_args()
     return args
@@ -285,7 +404,10 @@ if __name__ == "__main__":
     parser_obj = JsonParser.load_all_seasons(
         args.path_to_csv,
         args.years,
-        args.shotGoalOnly
+        args.shotGoalOnly,
+        args.game_types,
+        args.workers,
+        args.incremental,
     )
 
     if args.comet_dl:
@@ -3,12 +3,109 @@ import sys
 import numpy as np
 import omegaconf
 import pandas as pd
-import json
 from tqdm import tqdm
 import datetime
 import os
-
-from .misc import safe_getitem_nested_dict, safe_int_casting
+import contextlib
+import functools
+import io
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, BinaryIO, Iterable, Iterator, Tuple, Union
+
+from .field_spec import Field, compile_columns, compile_fields, compile_getter
+from .dataset_manifest import Dataset_Manifest
+from .parquet_dataset import read_dataset, update_dataset, write_dataset
+from .play_schema import PLAY_SCHEMA, apply_schema, cast_series
+from .raw_archive import chunk_raw_json_sources, iter_raw_json, iter_raw_json_streams, open_raw_json, read_raw_json
+
+SHOT_GOAL_EVENT_TYPES = ["goal", "shot-on-goal", "missed-shot", "blocked-shot"]
+
+# game-level keys read by `JsonParser_v2`, the NHL API writes all of them before the (long) list of plays
+GAME_KEYS = (
+    "id", "season", "gameType", "gameDate", "period",
+    "homeTeam.id", "homeTeam.abbrev", "homeTeam.score",
+    "awayTeam.id", "awayTeam.abbrev", "awayTeam.score",
+)
+PLAYS_BATCH_SIZE = 256
+
+def _parse_date(date_str):
+    return datetime.datetime.strptime(date_str, "%Y-%m-%d") if date_str else None
+
+# Columns of the rows of `JsonParser_v2` read from the json, in this order (see field_spec.py) :
+# the ones of the game, then the ones of every play (followed by winTeam, rinkSide and emptyNet, deduced by the parser)
+GAME_FIELDS = [
+    Field("gameId", "id", cast=int),
+    Field("season", "season", cast=int),
+    Field("gameType", "gameType", cast=int),
+    Field("gameDate", "gameDate", cast=_parse_date),
+    Field("homeTeam", "homeTeam.abbrev"),
+    Field("awayTeam", "awayTeam.abbrev"),
+]
+PLAY_FIELDS = [
+    Field("period", "periodDescriptor.number", cast=int),
+    Field("periodTime", "timeInPeriod"),
+    Field("byTeam", "details.eventOwnerTeamId"), # id of the team, replaced by its abbreviation
+    Field("eventType", "typeDescKey"),
+    Field("coordinateX", "details.xCoord"),
+    Field("coordinateY", "details.yCoord"),
+]
+
+_extract_game_fields = compile_fields(GAME_FIELDS)
+_extract_play_fields = compile_fields(PLAY_FIELDS)
+_extract_play_columns = compile_columns(PLAY_FIELDS + [Field("situationCode", "situationCode")])
+_get_zone_code = compile_getter("details.zoneCode")
+_get_situation_code = compile_getter("situationCode")
+_get_home_score = compile_getter("homeTeam.score", -1)
+_get_away_score = compile_getter("awayTeam.score", -1)
+_get_home_abbrev = compile_getter("homeTeam.abbrev", np.nan)
+_get_away_abbrev = compile_getter("awayTeam.abbrev", np.nan)
+
+def stream_game_plays(file : BinaryIO) -> Tuple[dict, Iterator[dict]]:
+    """Incremental decoding of a gamecenter/{id}/play-by-play document with ijson :
+        the game-level keys of `GAME_KEYS` are decoded up to the start of `plays` (the other keys, i.e. rosterSpots, are skipped),
+        then the plays are decoded one at a time, as the iterator returned is consumed.
+        Only one play is in memory at a time, whatever the size of the document.
+
+    Returns:
+        Tuple[dict, Iterator[dict]]: game-level keys (nested as in the document) and iterator of the plays
+    """
+    import ijson
+    from ijson.common import ObjectBuilder
+
+    events = ijson.parse(file, use_float=True)
+    game = {}
+    for prefix, event, value in events:
+        if prefix == "plays" and event == "start_array":
+            break
+        if prefix in GAME_KEYS and event not in ("start_map", "end_map", "start_array", "end_array", "map_key"):
+            *parents, key = prefix.split(".")
+            node = game
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            node[key] = value
+
+    def plays():
+        builder = None
+        for prefix, event, value in events:
+            if prefix == "plays" and event == "end_array":
+                return
+            if builder is None:
+                builder = ObjectBuilder()
+            builder.event(event, value)
+            if prefix == "plays.item" and event == "end_map":
+                yield builder.value
+                builder = None
+
+    return game, plays()
+
+@functools.lru_cache(maxsize=1024)
+def _game_column(column : str, value : Any) -> pd.api.extensions.ExtensionArray:
+    """Value of a column of the game cast to its dtype of PLAY_SCHEMA (exactly as by `apply_schema()`), as an array of one element
+        to broadcast over the plays. Cached : the teams, season, gameType... are the same for many games,
+        and the batches of `JsonParser_v2.iter_batches()` share the values of their game.
+    """
+    return cast_series(pd.Series([value]), PLAY_SCHEMA[column]).array
 
 class JsonParser_v2:
     """
@@ -21,60 +118,202 @@ class JsonParser_v2:
             self, 
             path : str = None, 
             df : pd.DataFrame =None,
-            shotGoalOnly : bool = True) -> None:
-        """Either initialize with a path or with an existing DataFrame.
+            shotGoalOnly : bool = True,
+            data : dict = None) -> None:
+        """Either initialize with a path, with an already decoded json or with an existing DataFrame.
 
         Args:
             path (str, optional): path_to_a_DataFrame. Defaults to None.
             df (pd.DataFrame, optional): pandas Dataframe. Defaults to None.
+            data (dict, optional): content of a json file (i.e. read from a .nhlpack archive). Defaults to None.
         """        
         self.path = path
         self.shotGoalOnly = shotGoalOnly
         if df is not None:
             self.df = df
-        elif path:
-            self.df = self.parse_json_file(self.shotGoalOnly)
+        elif path or data is not None:
+            self.df = self.parse_json_file(self.shotGoalOnly, data)
         else:
             self.df = pd.DataFrame()
 
-    def parse_json_file(self, shotGoalOnly):
-        with open(self.path, "r") as f:
-            data = json.load(f)
+    def parse_json_file(self, shotGoalOnly, data=None):
+        if data is None:
+            # .json, .json.gz or .json.zst
+            data = read_raw_json(self.path)
 
-        winning_team = None
-        # if 'teams' in linescore:
-        home_goals = safe_getitem_nested_dict(data, ['homeTeam', 'score'], -1)
-        away_goals = safe_getitem_nested_dict(data, ['awayTeam', 'score'], -1)
-        if home_goals > away_goals:
-            winning_team = safe_getitem_nested_dict(data, ['homeTeam', 'abbrev'], np.nan)
-        elif away_goals > home_goals:
-            winning_team = safe_getitem_nested_dict(data, ['awayTeam', 'abbrev'], np.nan)
-        else:
-            winning_team = np.nan
+        winning_team = self.deduce_winning_team(data)
 
         rink_side_dict = self.create_rink_side_info(data)
 
+        game_info, team_id_to_team_info = self.extract_game_context(data)
+
+        plays = data["plays"]
+        if shotGoalOnly:
+            plays = [play for play in plays if play["typeDescKey"] in SHOT_GOAL_EVENT_TYPES]
+
+        return self.normalize_plays(plays, game_info, rink_side_dict, winning_team, team_id_to_team_info)
+
+    def normalize_plays(self, plays, game_info, rink_side_dict, win_team, team_id_to_team_info) -> pd.DataFrame:
+        """Vectorized counterpart of `extract_play_data()` on a list of plays of the same game : the same rows, as a DataFrame.
+            The fields of the plays are read in one pass into columns (see `field_spec.compile_columns()`),
+            byTeam, rinkSide and emptyNet are deduced with array operations over the whole list and the columns of the game
+            are cast once then broadcast (instead of a copy of `game_info` per play), every column being built with its dtype
+            of `play_schema.PLAY_SCHEMA` (no cast of the whole DataFrame afterwards).
+        """
+        if not plays:
+            return pd.DataFrame()
+        nb_plays = len(plays)
+        columns = _extract_play_columns(plays)
+
+        abbrev_of_team = {team_id: abbrev for team_id, (abbrev, _) in team_id_to_team_info.items()}
+        unknown_teams = set(columns["byTeam"]).difference(abbrev_of_team)
+        if unknown_teams:
+            # same error as `extract_play_data()` (i.e. a play without eventOwnerTeamId)
+            raise KeyError(next(team_id for team_id in columns["byTeam"] if team_id in unknown_teams))
+        team_ids = np.asarray(columns["byTeam"])
+        byTeam = np.empty(nb_plays, dtype=object)
+        for team_id, abbrev in abbrev_of_team.items():
+            byTeam[team_ids == team_id] = abbrev
+        is_event_by_home_team = byTeam == game_info["homeTeam"]
+
+        # rink sides by period (row 0 : period unknown) and side (column 0 : away team, column 1 : home team)
+        period = pd.array(columns["period"], dtype=PLAY_SCHEMA["period"])
+        nb_periods = max(rink_side_dict, default=0)
+        sides = np.array(
+            [[None, None]] + [
+                [rink_side_dict.get(num_period, {}).get('away', None), rink_side_dict.get(num_period, {}).get('home', None)]
+                for num_period in range(1, nb_periods + 1)
+            ],
+            dtype=object,
+        )
+        period_index = period.to_numpy(dtype=np.int64, na_value=0)
+        period_index[(period_index < 0) | (period_index > nb_periods)] = 0
+        rinkSide = sides[period_index, is_event_by_home_team.astype(np.int64)]
+        rinkSide[(period == 5).to_numpy(dtype=bool, na_value=False)] = 'Shootout'
+
+        # first (home team) or last (away team) digit of the situationCode as an int, 0 if the play has none
+        situationCode = columns.pop("situationCode")
+        if any(code is not None for code in situationCode):
+            codes = np.array([code if code is not None else "0" for code in situationCode], dtype=str)
+            digits = codes.view("U1").reshape(nb_plays, -1)
+            last = np.char.str_len(codes) - 1
+            emptyNet = np.where(is_event_by_home_team, digits[:, 0], digits[np.arange(nb_plays), last]).astype(np.int8)
+        else:
+            emptyNet = np.zeros(nb_plays, dtype=np.int8)
+
+        broadcast = np.zeros(nb_plays, dtype=np.intp)
+        df = pd.DataFrame(
+            {
+                **{column: _game_column(column, value).take(broadcast) for column, value in game_info.items()},
+                "period": period,
+                "periodTime": columns["periodTime"],
+                "byTeam": pd.Categorical(byTeam),
+                "eventType": pd.Categorical(columns["eventType"]),
+                "coordinateX": np.array(columns["coordinateX"], dtype=PLAY_SCHEMA["coordinateX"]),
+                "coordinateY": np.array(columns["coordinateY"], dtype=PLAY_SCHEMA["coordinateY"]),
+                "winTeam": _game_column("winTeam", win_team).take(broadcast),
+                "rinkSide": pd.Categorical(rinkSide, dtype=PLAY_SCHEMA["rinkSide"]),
+                "emptyNet": pd.array(emptyNet, dtype=PLAY_SCHEMA["emptyNet"]),
+            },
+            index=pd.RangeIndex(nb_plays),
+        )
+        return apply_schema(df)
+
+    def iter_rows(self, shotGoalOnly, source : Union[str, Path, bytes, BinaryIO] = None) -> Iterator[dict]:
+        """Streaming counterpart of `parse_json_file()` : yield the rows one at a time, as the plays are decoded (see `stream_game_plays()`),
+            the document is never entirely decoded nor read in memory (peak memory bounded whatever the size of the document).
+            The rows are the same as the ones of `parse_json_file()`. The objects of the plays are built in python from the events of ijson,
+            so the CPU time is ~2-3x the one of `parse_json_file()` on a game : use it when the memory (or the latency of the first rows) matters.
+
+        Args:
+            shotGoalOnly (bool): same as in `parse_json_file()`
+            source (Union[str, Path, bytes, BinaryIO], optional): raw json file (.json, .json.gz, .json.zst, decompressed on the fly),
+                its bytes (i.e. a response body) or a binary file object. Defaults to `self.path`.
+        """
+        for play, game_context in self._iter_plays(shotGoalOnly, source):
+            yield self.extract_play_data(play, *game_context)
+
+    def _iter_plays(self, shotGoalOnly, source : Union[str, Path, bytes, BinaryIO] = None) -> Iterator[Tuple[dict, tuple]]:
+        """Yield the plays kept as they are decoded (see `iter_rows()`), with the arguments of `extract_play_data()` / `normalize_plays()`
+            about their game : (game_info, rink_side_dict, winning_team, team_id_to_team_info)
+        """
+        source = self.path if source is None else source
+        if isinstance(source, (bytes, bytearray)):
+            context = io.BytesIO(source)
+        elif hasattr(source, "read"):
+            context = contextlib.nullcontext(source)
+        else:
+            context = open_raw_json(source)
+
+        with context as file:
+            game, plays = stream_game_plays(file)
+            winning_team = self.deduce_winning_team(game)
+            game_info, team_id_to_team_info = self.extract_game_context(game)
+
+            # the rink sides are deduced from the first plays (see `create_rink_side_info()`), those are kept until then
+            pending_plays, rink_side_dict = [], None
+            for play in plays:
+                if rink_side_dict is None:
+                    pending_plays.append(play)
+                    if pending_plays[0].get('homeTeamDefendingSide', None) is None \
+                            and _get_zone_code(play) not in ['O', 'D']:
+                        continue
+                    rink_side_dict = self.create_rink_side_info({**game, "plays": pending_plays})
+                    game_context = (game_info, rink_side_dict, winning_team, team_id_to_team_info)
+                    to_parse, pending_plays = pending_plays, []
+                else:
+                    to_parse = [play]
+
+                for play_to_parse in to_parse:
+                    if shotGoalOnly and play_to_parse["typeDescKey"] not in SHOT_GOAL_EVENT_TYPES:
+                        continue
+                    yield play_to_parse, game_context
+
+            if pending_plays:
+                # no play to deduce the rink sides from : same error as `parse_json_file()`
+                self.create_rink_side_info({**game, "plays": pending_plays})
+
+    def iter_batches(self, shotGoalOnly, source : Union[str, Path, bytes, BinaryIO] = None, batch_size : int = PLAYS_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """Same rows as `iter_rows()`, by DataFrames of at most `batch_size` rows (for the pipelined ingestions),
+            every batch of plays being normalized at once by `normalize_plays()`
+        """
+        batch = []
+        for play, game_context in self._iter_plays(shotGoalOnly, source):
+            batch.append(play)
+            if len(batch) == batch_size:
+                yield self.normalize_plays(batch, *game_context)
+                batch = []
+        if batch:
+            yield self.normalize_plays(batch, *game_context)
+
+    def parse_json_stream(self, shotGoalOnly, source : Union[str, Path, bytes, BinaryIO] = None, batch_size : int = PLAYS_BATCH_SIZE) -> pd.DataFrame:
+        """Same DataFrame as `parse_json_file()`, built from `iter_batches()` : only the rows kept and one batch of plays are in memory,
+            never the decoded document
+        """
+        batches = list(self.iter_batches(shotGoalOnly, source, batch_size))
+        if not batches:
+            return pd.DataFrame()
+        # a column entirely null in a batch is of dtype object, the dtypes are inferred again on the whole column
+        # (and the categories of the batches are merged)
+        return apply_schema(pd.concat(batches, ignore_index=True).infer_objects())
+
+    def deduce_winning_team(self, data):
+        home_goals = _get_home_score(data)
+        away_goals = _get_away_score(data)
+        if home_goals > away_goals:
+            return _get_home_abbrev(data)
+        elif away_goals > home_goals:
+            return _get_away_abbrev(data)
+        return np.nan
+
+    def extract_game_context(self, data):
         game_info = self.extract_game_info(data)
 
         team_id_to_team_info = {
             data['homeTeam']['id']: (data['homeTeam']['abbrev'], 'home'),
             data['awayTeam']['id']: (data['awayTeam']['abbrev'], 'away'),
         }
-
-        rows = []
-        for play in data["plays"]:
-            if shotGoalOnly:
-                if play["typeDescKey"] in ["goal", "shot-on-goal", "missed-shot", "blocked-shot"]:
-                    row_data = self.extract_play_data(play, game_info, rink_side_dict, winning_team, team_id_to_team_info)
-                else : 
-                    continue
-            else : 
-                row_data = self.extract_play_data(play, game_info, rink_side_dict, winning_team, team_id_to_team_info)
-
-            rows.append(row_data)
-
-        df = pd.DataFrame(rows)
-        return df
+        return game_info, team_id_to_team_info
     
     def create_rink_side_info(self, data):
 
@@ -92,7 +331,7 @@ class JsonParser_v2:
             """
             i=0
             actual_play = data["plays"][i]
-            while safe_getitem_nested_dict(actual_play, ['details', 'zoneCode'], None) not in ['O', 'D']:
+            while _get_zone_code(actual_play) not in ['O', 'D']:
                 
                 actual_play = data["plays"][i]
                 i+=1
@@ -130,89 +369,134 @@ class JsonParser_v2:
 
 
     def extract_game_info(self, gameData):
-
-        game_info = {
-            "gameId": safe_int_casting(safe_getitem_nested_dict(gameData, ["id"])),
-            "season": safe_int_casting(safe_getitem_nested_dict(gameData, ["season"])),
-            "gameType": safe_int_casting(safe_getitem_nested_dict(gameData, ["gameType"])),
-            "gameDate": self.parse_date(safe_getitem_nested_dict(gameData, ["gameDate"])),
-            "homeTeam": safe_getitem_nested_dict(gameData, ["homeTeam", "abbrev"]),
-            "awayTeam": safe_getitem_nested_dict(gameData, ["awayTeam", "abbrev"]),
-        }
-        return game_info
+        return _extract_game_fields(gameData)
 
     def parse_date(self, date_str):
-        return datetime.datetime.strptime(date_str, "%Y-%m-%d") if date_str else None
+        return _parse_date(date_str)
 
     def extract_play_data(self, play, game_info, rink_side_dict, win_team, team_id_to_team_info):
-        period = safe_int_casting(safe_getitem_nested_dict(play, ["periodDescriptor", "number"]))
-        byTeam = team_id_to_team_info[safe_getitem_nested_dict(play, ["details", "eventOwnerTeamId"])][0]
-        homeTeam = game_info["homeTeam"]
-
-        row_data = game_info.copy()
-        row_data.update({
-            "period": period,
-            "periodTime": safe_getitem_nested_dict(play, ["timeInPeriod"]),
-            "byTeam": byTeam,
-            "eventType": safe_getitem_nested_dict(play, ["typeDescKey"]),
-        })
-        
-        coordinateX = safe_getitem_nested_dict(play, ["details", "xCoord"])
-        coordinateY = safe_getitem_nested_dict(play, ["details", "yCoord"])
+        row_data = _extract_play_fields(play, game_info.copy())
+        row_data["byTeam"] = byTeam = team_id_to_team_info[row_data["byTeam"]][0]
+        is_event_by_home_team = byTeam == game_info["homeTeam"]
 
-        row_data["coordinateX"] = coordinateX
-        row_data["coordinateY"] = coordinateY
         row_data['winTeam'] = win_team
 
         # Add rink side information
+        period = row_data["period"]
         if period == 5:
             row_data['rinkSide'] = 'Shootout'
         else:
-            row_data['rinkSide'] = safe_getitem_nested_dict(rink_side_dict, [period, 'home' if byTeam == homeTeam else 'away'])
+            row_data['rinkSide'] = rink_side_dict.get(period, {}).get('home' if is_event_by_home_team else 'away', None)
 
-        row_data['emptyNet'] = self.deduce_empty_net(play, is_event_by_home_team=(byTeam == homeTeam))
+        row_data['emptyNet'] = self.deduce_empty_net(play, is_event_by_home_team)
 
         return row_data
     
     def deduce_empty_net(self, play, is_event_by_home_team):
-        situationCode = safe_getitem_nested_dict(play, ["situationCode"])
+        situationCode = _get_situation_code(play)
         if situationCode is None:
             return 0
-        return situationCode[0] if is_event_by_home_team else situationCode[-1]
+        return int(situationCode[0] if is_event_by_home_team else situationCode[-1])
 
     def __add__(self, other):
         if not isinstance(other, JsonParser_v2):
             raise ValueError("Can only add JsonParser_v2 objects.")
-        combined_df = pd.concat([self.df, other.df], ignore_index=True)
+        combined_df = apply_schema(pd.concat([self.df, other.df], ignore_index=True))
         return JsonParser_v2(df=combined_df)
 
+    @staticmethod
+    def concat(parsers : Iterable["JsonParser_v2"]) -> "JsonParser_v2":
+        """Same result as `parser_1 + parser_2 + ... + parser_n`, but the DataFrame is materialized only once
+            (linear in the number of rows instead of quadratic, see `JsonParser.concat()`)
+        """
+        frames = []
+        for parser in parsers:
+            if not isinstance(parser, JsonParser_v2):
+                raise ValueError("Can only concat JsonParser_v2 objects.")
+            frames.append(parser.df)
+        return JsonParser_v2(df=apply_schema(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame())
+
     @staticmethod
     def load_all_seasons(
         path_csv_output : Path,
         json_files_to_consider : list[Path],
-        shotGoalOnly: bool):
+        shotGoalOnly: bool,
+        workers : int = 1,
+        stream : bool = False,
+        incremental : bool = False):
+        """if workers > 1, the games are parsed by a pool of `workers` processes, by chunks of games
+            (same rows in the same order as with workers=1, see `JsonParser.load_all_seasons()`)
+
+            if stream, every game is parsed while it is read and decoded (see `JsonParser_v2.iter_rows()`) :
+            same rows, with a peak memory bounded by the rows kept instead of the whole decoded document
+
+            if incremental, only the games of `json_files_to_consider` new or changed since the last run are parsed
+            and the existing dataset is updated (see `JsonParser.load_all_seasons()`)
+        """
 
         ROOT_DATA = Path(os.getenv("DATA_FOLDER"))
         OUTPUT_PATH = ROOT_DATA / path_csv_output
         
-        if os.path.exists(OUTPUT_PATH):
-            df = pd.read_csv(OUTPUT_PATH, parse_dates=["gameDate"])
+        if os.path.exists(OUTPUT_PATH) and not incremental:
+            df = read_dataset(OUTPUT_PATH)
             print(f"SKIPPING SCRAPPING >>> DataFrame loaded from {OUTPUT_PATH}")
             res = JsonParser_v2(df=df)
             res.output_path = OUTPUT_PATH
             return res
 
         # import pdb; pdb.set_trace()
-        base_parser = JsonParser_v2()
-        with tqdm(total=len(json_files_to_consider)) as pbar1:
-            for json_file in json_files_to_consider:
-                pbar1.set_description(f"Processing json file - {json_file.name} ")
-                parser = JsonParser_v2(json_file, shotGoalOnly=shotGoalOnly)
-                base_parser = base_parser + parser
-                pbar1.update(1)
-
-        base_parser.df.to_csv(OUTPUT_PATH, index=False)
+        # json_files_to_consider can mix .json/.json.gz/.json.zst files and .nhlpack archives (every game of the archive is parsed)
+        game_ids = None
+        if incremental:
+            manifest = Dataset_Manifest(OUTPUT_PATH)
+            options = {"shotGoalOnly": shotGoalOnly}
+            rebuild = not manifest.matches(options)
+            if rebuild:
+                manifest.reset(options)
+            fingerprints = manifest.scan(json_files_to_consider)
+            game_ids, games_to_drop = manifest.changes(fingerprints)
+            print(
+                f"INCREMENTAL SCRAPPING >>> {len(game_ids)} new or changed games, {len(games_to_drop) - len(game_ids)} removed, "
+                f"{len(fingerprints) - len(game_ids)} unchanged"
+            )
+
+        parsers = []
+        with tqdm(total=len(json_files_to_consider) if game_ids is None else len(game_ids)) as pbar1:
+            if workers <= 1 and stream:
+                for json_file_name, file in iter_raw_json_streams(json_files_to_consider, game_ids):
+                    pbar1.set_description(f"Processing json file (streaming) - {json_file_name} ")
+                    parsers.append(JsonParser_v2(df=JsonParser_v2().parse_json_stream(shotGoalOnly, file)))
+                    pbar1.update(1)
+            elif workers <= 1:
+                for json_file_name, data in iter_raw_json(json_files_to_consider, game_ids):
+                    pbar1.set_description(f"Processing json file - {json_file_name} ")
+                    parsers.append(JsonParser_v2(data=data, shotGoalOnly=shotGoalOnly))
+                    pbar1.update(1)
+            else:
+                pbar1.set_description(f"Processing json files with {workers} processes")
+                chunks = chunk_raw_json_sources(json_files_to_consider, game_ids)
+                with ProcessPoolExecutor(workers) as executor:
+                    for (paths, ids), df in zip(chunks, executor.map(
+                        _parse_games_chunk, [c[0] for c in chunks], [c[1] for c in chunks], repeat(shotGoalOnly), repeat(stream),
+                    )):
+                        parsers.append(JsonParser_v2(df=df))
+                        pbar1.update(len(paths) if ids is None else len(ids))
+
+        base_parser = JsonParser_v2.concat(parsers)
+
+        if incremental and not rebuild:
+            if games_to_drop:
+                update_dataset(base_parser.df, OUTPUT_PATH, games_to_drop)
+                print(f"DataFrame updated at {OUTPUT_PATH}")
+            manifest.record(fingerprints, games_to_drop)
+            res = JsonParser_v2(df=read_dataset(OUTPUT_PATH))
+            res.output_path = OUTPUT_PATH
+            return res
+
+        write_dataset(base_parser.df, OUTPUT_PATH)
         print(f"DataFrame saved to {OUTPUT_PATH}")
+        if incremental:
+            manifest.record(fingerprints)
         base_parser.output_path = OUTPUT_PATH
         return base_parser
 
@@ -241,6 +525,18 @@ class JsonParser_v2:
 
 
 
+def _parse_games_chunk(paths : list[Path], game_ids : list[int], shotGoalOnly : bool, stream : bool = False) -> pd.DataFrame:
+    """Worker of `JsonParser_v2.load_all_seasons(workers=N)`, see `json_scrapper._parse_games_chunk()`
+    """
+    if stream:
+        return JsonParser_v2.concat(
+            JsonParser_v2(df=JsonParser_v2().parse_json_stream(shotGoalOnly, file)) for _, file in iter_raw_json_streams(paths, game_ids)
+        ).df
+    return JsonParser_v2.concat(
+        JsonParser_v2(data=data, shotGoalOnly=shotGoalOnly) for _, data in iter_raw_json(paths, game_ids)
+    ).df
+
+
 def cli_args():
     '''
     CLI Interface, to specify for now:
@@ -260,10 +556,13 @@ def cli_args():
         python Milestone1/json_scrapper.py -p_csv very_big_file.csv --years $(seq -s ' ' 2016 2020)
         '''
     )
-    parser.add_argument('-p_csv', '--path_to_csv', type=str, required=True, help='Path to the csv file. WILL BE CONCATENATED WITH the .env\'s DATA_FOLDER var. PUT THE COMMIT ID IN THE NAME !!!!!!!!!!!!!!!!!!!!')
-    parser.add_argument('-jf','--json_files', required=True, type=lambda sp_sep_str : tuple(map(Path, sp_sep_str.split())), help='json files to parse to create the csv file (space-separated list of ABSOLUTE paths)')
+    parser.add_argument('-p_csv', '--path_to_csv', type=str, required=True, help='Path to the csv file (or .parquet directory, partitioned by season and gameType). WILL BE CONCATENATED WITH the .env\'s DATA_FOLDER var. PUT THE COMMIT ID IN THE NAME !!!!!!!!!!!!!!!!!!!!')
+    parser.add_argument('-jf','--json_files', required=True, type=lambda sp_sep_str : tuple(map(Path, sp_sep_str.split())), help='json files (.json, .json.gz, .json.zst) or .nhlpack archives to parse to create the csv file (space-separated list of ABSOLUTE paths)')
     parser.add_argument('--shotGoalOnly', action='store_true', help='Filter only "GOAL" and "SHOT" events')
     parser.add_argument('--comet_dl', action='store_true', help='Comet : at exp. "json-scrapper-output" push as an artifact the csv file ')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of processes parsing the json files')
+    parser.add_argument('--stream', action='store_true', help='parse the json files while they are decoded (bounded memory, see JsonParser_v2.iter_rows)')
+    parser.add_argument('--incremental', action='store_true', help='if the csv file exists, only parse the json files new or changed since it was written and update it (see dataset_manifest.py)')
     args = parser.parse_args()
     return args
 
@@ -276,7 +575,10 @@ if __name__ == "__main__":
     parser_obj = JsonParser_v2.load_all_seasons(
         args.path_to_csv,
         args.json_files,
-        args.shotGoalOnly
+        args.shotGoalOnly,
+        args.workers,
+        args.stream,
+        args.incremental,
     )
 
     if args.comet_dl:
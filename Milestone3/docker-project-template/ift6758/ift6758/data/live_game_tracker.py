@@ -0,0 +1,193 @@
+"""
+Incremental polling of a live game with the `game/{id}/feed/live/diffPatch?startTimecode=...` endpoint (v1 NHL REST API).
+
+Instead of downloading the whole feed (hundreds of KB) at every refresh, `Live_Game_Tracker` :
+    1. fetches the full feed once (game/{id}/feed/live), and keeps it in memory (and on disk if `save_local`)
+    2. then, at every `poll()`, asks only for the JSON patches (RFC 6902) since the timecode of the document it holds
+        (metaData.timeStamp), applies them in place, and returns only the plays appended to liveData.plays.allPlays
+
+So the bandwidth and the parsing cost of a refresh scale with the number of new events, not with the length of the game.
+If a patch can not be applied (i.e. the server answered with a diff computed against another document),
+the tracker falls back to a full fetch of the feed.
+
+Example:
+    tracker = Live_Game_Tracker("2022020001")
+    while True:
+        new_plays = tracker.poll()
+        new_rows = tracker.poll_dataframe(shotGoalOnly=True) # or directly the rows of JsonParser
+"""
+
+import copy
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+from loguru import logger
+
+from .nhl_rest_api_fetcher import Game_endpoints_Fetcher
+from .raw_archive import write_raw_json
+
+
+class JSON_Patch_Error(Exception):
+    pass
+
+def _parse_json_pointer(pointer : str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JSON_Patch_Error(f"INVALID JSON POINTER {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _resolve_parent(document, tokens : List[str]):
+    """Return (container, last token) of the location pointed by `tokens`
+    """
+    container = document
+    for token in tokens[:-1]:
+        try:
+            container = container[int(token)] if isinstance(container, list) else container[token]
+        except (KeyError, IndexError, ValueError) as e:
+            raise JSON_Patch_Error(f"PATH /{'/'.join(tokens)} DOES NOT EXIST IN THE DOCUMENT") from e
+    return container, tokens[-1]
+
+def _get(document, tokens : List[str]):
+    if not tokens:
+        return document
+    container, token = _resolve_parent(document, tokens)
+    try:
+        return container[int(token)] if isinstance(container, list) else container[token]
+    except (KeyError, IndexError, ValueError) as e:
+        raise JSON_Patch_Error(f"PATH /{'/'.join(tokens)} DOES NOT EXIST IN THE DOCUMENT") from e
+
+def _add(document, tokens : List[str], value):
+    container, token = _resolve_parent(document, tokens)
+    if isinstance(container, list):
+        index = len(container) if token == "-" else int(token)
+        if index > len(container):
+            raise JSON_Patch_Error(f"INDEX {index} OUT OF RANGE FOR /{'/'.join(tokens)}")
+        container.insert(index, value)
+    else:
+        container[token] = value
+
+def _remove(document, tokens : List[str]):
+    container, token = _resolve_parent(document, tokens)
+    try:
+        return container.pop(int(token)) if isinstance(container, list) else container.pop(token)
+    except (KeyError, IndexError, ValueError) as e:
+        raise JSON_Patch_Error(f"PATH /{'/'.join(tokens)} DOES NOT EXIST IN THE DOCUMENT") from e
+
+def apply_json_patch(document : dict, operations : List[dict]) -> dict:
+    """Apply RFC 6902 operations (add, remove, replace, move, copy, test) IN PLACE on `document`
+        (no copy of the document, the cost only depends on the number of operations)
+
+    Raises:
+        JSON_Patch_Error: if an operation can not be applied
+
+    Returns:
+        dict: the patched document (a new object only if the whole document is replaced)
+    """
+    for operation in operations:
+        op, tokens = operation["op"], _parse_json_pointer(operation["path"])
+
+        if op in ("add", "replace") and not tokens:
+            document = operation["value"]
+        elif op == "add":
+            _add(document, tokens, operation["value"])
+        elif op == "remove":
+            _remove(document, tokens)
+        elif op == "replace":
+            container, token = _resolve_parent(document, tokens)
+            _get(document, tokens) # raise if the location does not exist
+            if isinstance(container, list):
+                container[int(token)] = operation["value"]
+            else:
+                container[token] = operation["value"]
+        elif op == "move":
+            _add(document, tokens, _remove(document, _parse_json_pointer(operation["from"])))
+        elif op == "copy":
+            _add(document, tokens, copy.deepcopy(_get(document, _parse_json_pointer(operation["from"]))))
+        elif op == "test":
+            if _get(document, tokens) != operation["value"]:
+                raise JSON_Patch_Error(f"TEST OPERATION FAILED AT {operation['path']}")
+        else:
+            raise JSON_Patch_Error(f"UNKNOWN JSON PATCH OPERATION {op}")
+
+    return document
+
+
+class Live_Game_Tracker:
+
+    def __init__(self, game_id : str, save_local : Union[str, Path] = None) -> None:
+        """
+        Args:
+            game_id (str): id of the game to track
+            save_local (Union[str, Path], optional): if specified, the up-to-date feed is written there after every poll with new events. Defaults to None.
+        """
+        self.game_id = str(game_id)
+        self.save_local = save_local
+        self.document = None
+        self.nb_plays_seen = 0
+
+    @property
+    def timecode(self) -> str:
+        return self.document["metaData"]["timeStamp"]
+
+    @property
+    def all_plays(self) -> List[dict]:
+        return self.document["liveData"]["plays"]["allPlays"]
+
+    def _fetch_full_feed(self) -> None:
+        logger.info(f"Fetching full feed of game {self.game_id}")
+        self.document = Game_endpoints_Fetcher(f"game/{self.game_id}/feed/live").fetch(output_format="json")
+
+    def _fetch_and_apply_diff_patch(self) -> bool:
+        """Return True if the document changed
+        """
+        diff_patches = Game_endpoints_Fetcher(
+            f"game/{self.game_id}/feed/live/diffPatch",
+            query_parameters={"startTimecode": self.timecode},
+        ).fetch(output_format="json")
+
+        if not diff_patches:
+            return False
+
+        # The endpoint answers a list of {"diff": [operations]} (one per timecode), accept also a flat list of operations
+        operations = []
+        for diff_patch in diff_patches:
+            operations.extend(diff_patch["diff"] if "diff" in diff_patch else [diff_patch])
+
+        try:
+            self.document = apply_json_patch(self.document, operations)
+        except (JSON_Patch_Error, KeyError, TypeError) as e:
+            logger.warning(f"Could not apply diffPatch of game {self.game_id} ({e!r}), falling back to a full fetch")
+            self._fetch_full_feed()
+            self.nb_plays_seen = min(self.nb_plays_seen, len(self.all_plays))
+        return True
+
+    def poll(self) -> List[dict]:
+        """Bring the document up-to-date and return the plays appended since the last poll
+            (all the plays of the game at the first poll)
+        """
+        if self.document is None:
+            self._fetch_full_feed()
+            changed = True
+        else:
+            changed = self._fetch_and_apply_diff_patch()
+
+        new_plays = self.all_plays[self.nb_plays_seen:]
+        self.nb_plays_seen = len(self.all_plays)
+
+        if changed and self.save_local is not None:
+            write_raw_json(self.save_local, self.document)
+
+        logger.info(f"Game {self.game_id} at timecode {self.timecode} : {len(new_plays)} new plays")
+        return new_plays
+
+    def poll_dataframe(self, shotGoalOnly : bool = False) -> pd.DataFrame:
+        """Same as `poll()` but the new plays are returned parsed by `JsonParser` (only them are parsed)
+        """
+        from .json_scrapper import JsonParser
+
+        new_plays = self.poll()
+        if not new_plays:
+            return pd.DataFrame()
+        return JsonParser().parse_json_file(shotGoalOnly, data=self.document, plays=new_plays)
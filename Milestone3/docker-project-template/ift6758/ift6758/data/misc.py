@@ -39,7 +39,7 @@ def unify_coordinates_referential(
     if impute_rinkSide_by_mean:
         # Filter for specific event types and compute mean coordinateX
         mean_coordinateX_df = df[df['eventType'].isin(['SHOT', 'GOAL', 'MISSED_SHOT', 'BLOCKED_SHOT'])]\
-                               .groupby(['gameId', 'byTeam', 'period'])['coordinateX']\
+                               .groupby(['gameId', 'byTeam', 'period'], observed=True)['coordinateX']\
                                .mean().reset_index()\
                                .rename(columns={'coordinateX': 'mean_coordinateX'})
  
@@ -16,6 +16,13 @@ Mainly, the Base Class allows to factor out
     the common attributes (such as part of urls that stays the same) 
     and methods (such as the one that actually make the GET request).
 
+All the fetchers (whatever their subclass) share the same HTTP session (see `Base_Fetcher.get_session()`):
+    a keep-alive connection pool, safe to use from several threads, that retries with a jittered exponential backoff
+    on connection errors and on 429/5xx status codes.
+    They also share an adaptive token-bucket rate limiter (see `Base_Fetcher.get_rate_limiter()` and `rate_limiter.py`),
+    that slows down when the server answers 429 and speeds up again afterwards, and counters of the GET requests
+    (see `Base_Fetcher.get_metrics()`) : requests/s, bytes/s, latency percentiles, error rate.
+
 Especially, we delegate the verification of the endpoint path to the subclasses.
     Each subclass must a variable ALLOWED_ENDPOINT_PATH that is a regex that
     will be used to verify the endpoint path provided by the user.
@@ -26,14 +33,20 @@ if the following Milestones would require it.
 For now, the script just needs an external config system (Hydra or CLI Interface) to be more flexible regarding Execution Parameters...
 """
 
+import asyncio
 import json
 import os
+import random
+import threading
+import time
 import urllib
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Literal, Tuple, Union
+from typing import ClassVar, Dict, Literal, Tuple, Union
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pregex.core.quantifiers import Optional
 from pregex.core.groups import Capture
 from pregex.core.operators import Either
@@ -41,6 +54,30 @@ from pregex.core.classes import AnyDigit
 from pregex.core.assertions import MatchAtEnd, MatchAtStart
 from loguru import logger
 
+from .http_cache import HTTP_Cache
+from .rate_limiter import Adaptive_Rate_Limiter, Fetch_Metrics
+from . import json_backend
+from .raw_archive import codec_of_path, encode_json, read_compressed_file, stream_to_file, write_compressed_file
+
+class _Rate_Limited_Retry(Retry):
+    '''
+    urllib3.Retry of the shared session, retried attempts also go through the rate limiter of the fetchers
+    (and are counted in their metrics), a 429 (or a Retry-After header) slows the rate limiter down.
+    '''
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        status = response.status if response is not None else None
+        if status is None or status >= 400: # not a redirect
+            Base_Fetcher.get_metrics().record(None, status=status, error=True)
+        if response is not None and (status == 429 or response.headers.get("Retry-After")):
+            retry_after = response.headers.get("Retry-After")
+            Base_Fetcher.get_rate_limiter().on_throttled(self.parse_retry_after(retry_after) if retry_after else None)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        Base_Fetcher.get_rate_limiter().acquire()
+
 @dataclass
 class Base_Fetcher:
     '''
@@ -59,19 +96,177 @@ class Base_Fetcher:
         init=False, default=("json", "binary", "text", "raw")
     )
 
+    # HTTP session shared by every instance of every subclass, parameters can be changed with `configure_session()`
+    MAX_RETRIES: ClassVar[int] = 5
+    BACKOFF_FACTOR: ClassVar[float] = 0.5
+    BACKOFF_JITTER: ClassVar[float] = 0.5
+    BACKOFF_MAX: ClassVar[float] = 60.0
+    RETRY_ON_STATUS: ClassVar[Tuple[int]] = (429, 500, 502, 503, 504)
+    POOL_MAXSIZE: ClassVar[int] = 32
+    TIMEOUT: ClassVar[Tuple[float, float]] = (5.0, 30.0) # (connect, read) in seconds
+    DOWNLOAD_CHUNK_SIZE: ClassVar[int] = 1 << 16 # bytes read at once when streaming a response to disk (output_format "raw")
+
+    # Rate limiter shared by every fetcher (threads and coroutines), can be changed with `configure_rate_limiter()`
+    RATE_LIMIT: ClassVar[float] = 10.0 # initial rate, requests per second
+    MIN_RATE_LIMIT: ClassVar[float] = 0.5
+    MAX_RATE_LIMIT: ClassVar[float] = 50.0
+
+    _session: ClassVar[requests.Session] = None
+    _session_lock: ClassVar[threading.Lock] = threading.Lock()
+    _rate_limiter: ClassVar[Adaptive_Rate_Limiter] = None
+    _metrics: ClassVar[Fetch_Metrics] = None
+    # (scheme, netloc) replacing the ones of every fetcher, see `redirect_to()`
+    _base_url_override: ClassVar[Tuple[str, str]] = None
+
+    @staticmethod
+    def get_session() -> requests.Session:
+        """Lazily build (once per process) the requests.Session shared by all the fetchers.
+
+            The mounted HTTPAdapter keeps up to POOL_MAXSIZE keep-alive connections per host
+            (no new TCP+TLS handshake per game) and its urllib3 connection pool is thread-safe.
+            Failed GET requests (connection errors, RETRY_ON_STATUS codes) are retried MAX_RETRIES times,
+            waiting BACKOFF_FACTOR * 2**attempt (+ uniform jitter in [0, BACKOFF_JITTER]) seconds, or Retry-After if sent by the server.
+
+        Returns:
+            requests.Session: session to use to make the GET requests
+        """
+        if Base_Fetcher._session is None:
+            with Base_Fetcher._session_lock:
+                if Base_Fetcher._session is None:
+                    retries = _Rate_Limited_Retry(
+                        total=Base_Fetcher.MAX_RETRIES,
+                        backoff_factor=Base_Fetcher.BACKOFF_FACTOR,
+                        backoff_jitter=Base_Fetcher.BACKOFF_JITTER,
+                        backoff_max=Base_Fetcher.BACKOFF_MAX,
+                        status_forcelist=Base_Fetcher.RETRY_ON_STATUS,
+                        allowed_methods=frozenset({"GET"}),
+                        respect_retry_after_header=True,
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=Base_Fetcher.POOL_MAXSIZE,
+                        max_retries=retries,
+                    )
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    Base_Fetcher._session = session
+
+        return Base_Fetcher._session
+
+    @staticmethod
+    def configure_session(
+        max_retries: int = None,
+        backoff_factor: float = None,
+        backoff_jitter: float = None,
+        pool_maxsize: int = None,
+        timeout: Tuple[float, float] = None,
+    ) -> None:
+        """Change the parameters of the shared session (None keeps the current value).
+            The current session is closed and a new one will be built at the next GET request.
+        """
+        with Base_Fetcher._session_lock:
+            for attribute, value in [
+                ("MAX_RETRIES", max_retries),
+                ("BACKOFF_FACTOR", backoff_factor),
+                ("BACKOFF_JITTER", backoff_jitter),
+                ("POOL_MAXSIZE", pool_maxsize),
+                ("TIMEOUT", timeout),
+            ]:
+                if value is not None:
+                    setattr(Base_Fetcher, attribute, value)
+
+            if Base_Fetcher._session is not None:
+                Base_Fetcher._session.close()
+                Base_Fetcher._session = None
+
+    @staticmethod
+    def get_rate_limiter() -> Adaptive_Rate_Limiter:
+        """Lazily build (once per process) the rate limiter shared by all the fetchers,
+            every GET request (and every retry) waits for a token, see `rate_limiter.py`
+        """
+        if Base_Fetcher._rate_limiter is None:
+            with Base_Fetcher._session_lock:
+                if Base_Fetcher._rate_limiter is None:
+                    Base_Fetcher._rate_limiter = Adaptive_Rate_Limiter(
+                        rate=Base_Fetcher.RATE_LIMIT,
+                        min_rate=Base_Fetcher.MIN_RATE_LIMIT,
+                        max_rate=Base_Fetcher.MAX_RATE_LIMIT,
+                    )
+        return Base_Fetcher._rate_limiter
+
+    @staticmethod
+    def get_metrics() -> Fetch_Metrics:
+        """Counters of every GET request made by the fetchers of the process (see `Fetch_Metrics.summary()`)
+        """
+        if Base_Fetcher._metrics is None:
+            with Base_Fetcher._session_lock:
+                if Base_Fetcher._metrics is None:
+                    Base_Fetcher._metrics = Fetch_Metrics()
+        return Base_Fetcher._metrics
+
+    @staticmethod
+    def configure_rate_limiter(
+        rate: float = None,
+        min_rate: float = None,
+        max_rate: float = None,
+    ) -> None:
+        """Change the parameters of the shared rate limiter (None keeps the current value),
+            a new one will be built at the next GET request.
+        """
+        with Base_Fetcher._session_lock:
+            for attribute, value in [
+                ("RATE_LIMIT", rate),
+                ("MIN_RATE_LIMIT", min_rate),
+                ("MAX_RATE_LIMIT", max_rate),
+            ]:
+                if value is not None:
+                    setattr(Base_Fetcher, attribute, value)
+            Base_Fetcher._rate_limiter = None
+
+    @staticmethod
+    def redirect_to(base_url: str = None) -> None:
+        """Send the GET requests of every fetcher (v1 and v2) to `base_url` instead of the NHL servers,
+            i.e. a local `NHL_Replay_Server` (see `replay_server.py`). None to send them to the NHL servers again.
+        """
+        if base_url is None:
+            Base_Fetcher._base_url_override = None
+            return
+        url = urllib.parse.urlsplit(base_url)
+        Base_Fetcher._base_url_override = (url.scheme, url.netloc)
+
+    @staticmethod
+    def _backoff_delay(attempt: int, retry_after: str = None) -> float:
+        """Seconds to wait before retrying, same policy as the urllib3.Retry of `get_session()`
+            (used by `fetch_async()`, since aiohttp does not retry by itself)
+        """
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        delay = min(Base_Fetcher.BACKOFF_MAX, Base_Fetcher.BACKOFF_FACTOR * (2 ** attempt))
+        return delay + random.uniform(0, Base_Fetcher.BACKOFF_JITTER)
+
     def fetch(
         self, 
         output_format: Literal["json", "binary", "text", "raw"] = "json",
         save_local: str = None,
+        cache: HTTP_Cache = None,
     ) -> Union[dict, bytes, str, urllib3.response.HTTPResponse]:
         """Function that makes the GET request to an NHL REST API endpoint path
             and return the response in the format specified by the user (in our case will mainly be json).
 
             if save_local is not None, the response will be saved locally at the path specified by the user.
                 and if save_local is not None and the file already exists, the GET request will be skipped.
+
+            if cache is also provided, a file already existing locally is used w.r.t the freshness policy of the state
+                of its game (see `HTTP_Cache`) : returned as is, or revalidated with a conditional GET request (304 ---> no body downloaded).
+
+            if output_format is "raw", the body is not read in memory : the returned urllib3.response.HTTPResponse is still to be read,
+                or if save_local is not None, it is streamed to disk as it is received (see `fetch_to_disk()`).
+                Nothing to stream when the local file is used (fresh in `cache` or 304 Not Modified) : None is returned.
         Args:
             output_format (str, optional): output format of the GET Request. Defaults to "json".
             save_local (str, optional): path to save json file, if already. Defaults to None.
+            cache (HTTP_Cache, optional): ETag/Last-Modified cache of the locally saved responses. Defaults to None.
 
         Raises:
             RuntimeError: if output_format is one of ["json", "binary", "text", "raw"]
@@ -94,11 +289,39 @@ class Base_Fetcher:
         #     )
         #     return self._read_content_from_local(save_local, output_format)
 
-        url_to_fetch = urllib.parse.urlunparse(
-            (self.scheme, self.netloc, generate_url_path(self.path, use_posix=True), None, self.query, None)
+        url_to_fetch = self._build_url()
+
+        conditional_headers = {}
+        if cache is not None and save_local is not None:
+            cache_entry = cache.lookup(url_to_fetch, save_local)
+            if cache_entry is not None:
+                if cache.is_fresh(cache_entry):
+                    logger.info(
+                        f'File locally existing {save_local} is fresh (game state {cache_entry["game_state"]}). Skipping download {url_to_fetch}'
+                    )
+                    return self._read_content_from_local(save_local, output_format)
+                conditional_headers = cache.conditional_headers(cache_entry)
+
+        rate_limiter, metrics = self.get_rate_limiter(), self.get_metrics()
+        rate_limiter.acquire()
+        start = time.perf_counter()
+        stream = output_format == "raw"
+        # failed attempts are recorded (and retried) by the _Rate_Limited_Retry of the session
+        response = self.get_session().get(url=url_to_fetch, headers=conditional_headers, timeout=Base_Fetcher.TIMEOUT, stream=stream)
+        metrics.record(
+            time.perf_counter() - start,
+            int(response.headers.get("Content-Length", 0)) if stream else len(response.content),
+            response.status_code,
         )
+        response.raise_for_status()
+        rate_limiter.on_success()
 
-        response = requests.get(url=url_to_fetch)
+        if response.status_code == 304:
+            logger.info(
+                f"GET Request at {response.url} , 304 Not Modified. Reading {save_local}"
+            )
+            cache.mark_validated(url_to_fetch)
+            return self._read_content_from_local(save_local, output_format)
 
         logger.info(
             f"GET Request happened successfully at {response.url} , {response.status_code}"
@@ -107,7 +330,7 @@ class Base_Fetcher:
         self.response = None
 
         if output_format == "json":
-            self.response = response.json()
+            self.response = json_backend.loads(response.content)
         if output_format == "binary":
             self.response = response.content
         if output_format == "text":
@@ -118,30 +341,177 @@ class Base_Fetcher:
         if save_local is not None:
             self._save_local(save_local)
 
+            if cache is not None:
+                # a streamed body was never decoded, the state of the game is read back from the file written
+                content = self.response if output_format != "raw" else self._read_content_from_local(save_local, "json")
+                cache.store(url_to_fetch, save_local, response.headers, self._game_state(content))
+
         return self.response
 
+    def fetch_to_disk(self, save_local: str, cache: HTTP_Cache = None) -> Tuple[int, str]:
+        """Streaming counterpart of `fetch(save_local=...)`, meant for bulk archiving :
+            the body is written to `save_local` chunk by chunk as it is received (compressed on the fly if it ends with .gz or .zst),
+            it is never parsed nor held entirely in memory (no json decoding then re-encoding as with output_format "json").
+
+        Args:
+            save_local (str): path to save the body
+            cache (HTTP_Cache, optional): same as in `fetch()`. Defaults to None.
+
+        Returns:
+            Tuple[int, str]: size and sha256 of the file written, computed while writing it
+                ((None, None) if not downloaded, i.e. fresh in `cache` or 304 Not Modified)
+        """
+        self.download_size, self.download_sha256 = None, None
+        self.fetch(output_format="raw", save_local=save_local, cache=cache)
+        return self.download_size, self.download_sha256
+
+    def _game_state(self, content) -> str:
+        """State of the game described by a json response (used by `HTTP_Cache` to choose a freshness policy),
+            None when the endpoint is not about one game, subclasses override it.
+        """
+        return None
+
+    async def fetch_async(
+        self,
+        session,
+        output_format: Literal["json", "binary", "text"] = "json",
+        save_local: str = None,
+        overwrite: bool = False,
+    ) -> Union[dict, bytes, str]:
+        """Asyncio counterpart of `fetch()`, the GET request is made through an `aiohttp.ClientSession`
+            shared by all the coroutines (so that many games can be downloaded concurrently).
+
+            Retries follow the same policy as the shared session of `get_session()`.
+            Same semantics as the original `fetch()` regarding `save_local`:
+                if the file already exists, the GET request is skipped and the local content is returned,
+                otherwise the response is written to disk as soon as it is received.
+            Disk I/O is delegated to a thread so that it does not block the event loop.
+
+        Args:
+            session (aiohttp.ClientSession): session (and so connection pool) shared by the coroutines
+            output_format (str, optional): output format of the GET Request. Defaults to "json".
+            save_local (str, optional): path to save json file. Defaults to None.
+            overwrite (bool, optional): download even if `save_local` already exists (i.e. game not over or corrupted). Defaults to False.
+
+        Raises:
+            RuntimeError: if output_format is not one of ["json", "binary", "text"] ("raw" can not outlive the session)
+
+        Returns:
+            Union[dict, bytes, str]: in our case will mainly be json --> so returning a dict
+        """
+        if output_format not in self.output_format or output_format == "raw":
+            raise RuntimeError(
+                f"""
+                        OUTPUT SUPPORTED IN ASYNC GET REQUESTS ARE : {tuple(f for f in self.output_format if f != "raw")}
+                        YOU SPECIFIED {output_format}
+                               """
+            )
+
+        if save_local is not None and not overwrite and Path(save_local).exists():
+            logger.info(
+                f'File already locally existing {save_local}. Skipping download {generate_url_path(self.path, use_posix=True)}{self.query if self.query else ""} '
+            )
+            return await asyncio.to_thread(self._read_content_from_local, save_local, output_format)
+
+        import aiohttp
+
+        url_to_fetch = self._build_url()
+        timeout = aiohttp.ClientTimeout(sock_connect=Base_Fetcher.TIMEOUT[0], sock_read=Base_Fetcher.TIMEOUT[1])
+        rate_limiter, metrics = self.get_rate_limiter(), self.get_metrics()
+
+        for attempt in range(Base_Fetcher.MAX_RETRIES + 1):
+            retry_after = None
+            await rate_limiter.acquire_async()
+            start = time.perf_counter()
+            try:
+                async with session.get(url_to_fetch, timeout=timeout) as response:
+                    retry_after = response.headers.get("Retry-After", "")
+                    if response.status == 429 or retry_after:
+                        rate_limiter.on_throttled(float(retry_after) if retry_after.isdigit() else None)
+
+                    if response.status in Base_Fetcher.RETRY_ON_STATUS and attempt < Base_Fetcher.MAX_RETRIES:
+                        metrics.record(time.perf_counter() - start, status=response.status)
+                        reason = f"status {response.status}"
+                    else:
+                        if response.status >= 400:
+                            metrics.record(time.perf_counter() - start, status=response.status)
+                        response.raise_for_status()
+                        logger.info(
+                            f"GET Request happened successfully at {response.url} , {response.status}"
+                        )
+
+                        body = await response.read()
+                        metrics.record(time.perf_counter() - start, len(body), response.status)
+                        rate_limiter.on_success()
+
+                        if output_format == "json":
+                            self.response = json_backend.loads(body)
+                        if output_format == "binary":
+                            self.response = body
+                        if output_format == "text":
+                            self.response = body.decode(response.get_encoding())
+                        break
+
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                metrics.record(time.perf_counter() - start, error=True)
+                if attempt == Base_Fetcher.MAX_RETRIES:
+                    raise
+                reason = repr(e)
+
+            delay = self._backoff_delay(attempt, retry_after)
+            logger.warning(f"GET Request at {url_to_fetch} failed ({reason}), retry {attempt + 1}/{Base_Fetcher.MAX_RETRIES} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        if save_local is not None:
+            await asyncio.to_thread(self._save_local, save_local)
+
+        return self.response
+
+    def _build_url(self) -> str:
+        """Assemble the url to GET from the attributes of the fetcher
+
+        Returns:
+            str: scheme://netloc/path?query
+        """
+        scheme, netloc = Base_Fetcher._base_url_override or (self.scheme, self.netloc)
+        return urllib.parse.urlunparse(
+            (scheme, netloc, generate_url_path(self.path, use_posix=True), None, self.query, None)
+        )
+
     def _read_content_from_local(self, save_local: str, output_format: str):
 
         """In case the json file already exists locally, function is called by `fectch()` to read the content of the file
+            (if the file ends with .gz or .zst, it is decompressed, see `raw_archive.py`)
 
         Raises:
             NotImplementedError: if the user provides an output_format that we don't to read from locally
 
         Returns:
-            _type_: dict, bytes, str
+            _type_: dict, bytes, str (None for "raw" : the content is the file itself, nothing to stream)
         """
-        
+
+        if output_format == "raw":
+            return None
+
+        if codec_of_path(save_local) is not None:
+            content = read_compressed_file(save_local)
+            if output_format == "json":
+                return json_backend.loads(content)
+            if output_format == "binary":
+                return content
+            if output_format == "text":
+                return content.decode("utf-8")
+
         if output_format == "json":
-            with open(save_local, "r") as file:
-                return json.load(file)
+            return json_backend.load_file(save_local)
 
         if output_format == "binary":
             with open(save_local, "rb") as file:
-                return file.read(save_local)
+                return file.read()
 
         if output_format == "text":
             with open(save_local, "r") as file:
-                return file.read(save_local)
+                return file.read()
 
         if isinstance(self.response, urllib3.response.HTTPResponse):
             raise NotImplementedError(
@@ -150,14 +520,27 @@ class Base_Fetcher:
 
     def _save_local(self, path : str):
         """Save locally the response of the GET request
+            if `path` ends with .gz or .zst, the response is saved compressed (json without indentation, see `raw_archive.py`)
+            a urllib3.response.HTTPResponse (output_format "raw") is streamed to disk, its size and sha256 are kept
+            in `download_size` and `download_sha256`
 
         Args:
             path (str): path to save locally te file
 
-        Raises:
-            NotImplementedError: dont know how to serialize locally a urllib3.response.HTTPResponse object
         """      
+        path = Path(path)
         path.parent.mkdir(parents=True, exist_ok=True)   
+
+        if codec_of_path(path) is not None and isinstance(self.response, (dict, bytes, str)):
+            if isinstance(self.response, dict):
+                payload = encode_json(self.response)
+            elif isinstance(self.response, str):
+                payload = self.response.encode("utf-8")
+            else:
+                payload = self.response
+            write_compressed_file(path, payload)
+            return
+
         if isinstance(self.response, dict):
             with open(path, "w") as file:
                 json.dump(self.response, file, indent=4)
@@ -166,13 +549,13 @@ class Base_Fetcher:
             with open(path, "wb") as file:
                 file.write(self.response)
 
-        if isinstance(self.response, bytes):
+        if isinstance(self.response, str):
             with open(path, "w") as file:
                 file.write(self.response)
 
         if isinstance(self.response, urllib3.response.HTTPResponse):
-            raise NotImplementedError(
-                "DONT KNOW HOT TO SERIALIZE A urllib3.response.HTTPResponse PYTHON OBJECT"
+            self.download_size, self.download_sha256 = stream_to_file(
+                self.response.stream(Base_Fetcher.DOWNLOAD_CHUNK_SIZE, decode_content=True), path
             )
 
 
@@ -267,6 +650,13 @@ class Game_endpoints_Fetcher(Base_Fetcher):
 
         self.path = generate_url_path(self.root_path, path, use_posix=True)
 
+    def _game_state(self, content) -> str:
+        """abstractGameState ('Preview', 'Live', 'Final') of the game, None if not a game/{id}/... json response
+        """
+        if not isinstance(content, dict):
+            return None
+        return content.get("gameData", {}).get("status", {}).get("abstractGameState", None)
+
     def _verify_endpoint_path(self, endpoint_path: str) -> None:
         """Verify if self.ALLOWED_ENDPOINT_PATH matches the endpoint path provided by the user
         
@@ -384,13 +774,19 @@ class Schedule_endpoints_Fetcher(Base_Fetcher):
             )
 
 
-def regular_playoff_p_by_p_data_per_season(years: list[int]):
+def regular_playoff_p_by_p_data_per_season(years: list[int], concurrency: int = None, compression: str = None, metrics_output: Path = None):
     '''
     For now, Main Entrypoint of the script.
     Will instantiate the Schedule_endpoints_Fetcher and Game_endpoints_Fetcher classes
     in order to fetch the data from the NHL REST API and save them locally.
 
+    if concurrency is None, games are streamed to disk one at a time with `Base_Fetcher.fetch_to_disk()`,
+        otherwise they are fetched with `Base_Fetcher.fetch_async()` with at most `concurrency` requests in flight.
+
+    if compression is "gz" or "zst", games are saved as {id}.json.gz / {id}.json.zst instead of {id}.json (see `raw_archive.py`)
 
+    GET requests are throttled by the shared adaptive rate limiter, their metrics are printed at the end of every season
+        (and written as json at `metrics_output` if specified, see `report_fetch_metrics()`)
     '''
     from tqdm import tqdm, trange
 
@@ -402,30 +798,181 @@ def regular_playoff_p_by_p_data_per_season(years: list[int]):
         for year in years:
             pbar1.set_description(f"Fetching data for season {year}")
             
-            response = Schedule_endpoints_Fetcher(
-                path="schedule",
-                query_parameters={"season": f"{year}{year+1}", "gameType": "R,P"},
-            ).fetch()
+            game_ids = fetch_schedule_game_ids(year)
 
-            game_ids = []
-            for date_data in response["dates"]:
-                for game in date_data["games"]:
-                    game_ids.append(game["gamePk"])
+            if concurrency is not None:
+                asyncio.run(
+                    fetch_games_concurrently(game_ids, Path(os.getenv('DATA_FOLDER')) / str(year), concurrency, compression)
+                )
+                report_fetch_metrics(metrics_output)
+                pbar1.update(1)
+                continue
 
             with tqdm(total=len(game_ids)) as pbar2:
                 for id in game_ids:
-                    path_save_local = Path(os.getenv('DATA_FOLDER')) / str(year) / f"{id}.json"
+                    path_save_local = Path(os.getenv('DATA_FOLDER')) / str(year) / raw_game_file_name(id, compression)
                     path_save_local.parent.mkdir(parents=True, exist_ok=True)
                     pbar2.set_description(
                         f"Fetching game/{id}/feed/live saved at {path_save_local}"
                     )
                     pbar2.update(1)
-                    Game_endpoints_Fetcher(f"game/{id}/feed/live").fetch(
-                        save_local=path_save_local
-                    )
+                    Game_endpoints_Fetcher(f"game/{id}/feed/live").fetch_to_disk(path_save_local)
 
+            report_fetch_metrics(metrics_output)
             pbar1.update(1)
 
+def sync_seasons(years: list[int], concurrency: int = None, compression: str = None, verify_checksums: bool = False, metrics_output: Path = None):
+    '''
+    Incremental counterpart of `regular_playoff_p_by_p_data_per_season()`, backed by a `Fetch_Manifest`
+    (sqlite file `fetch_manifest.sqlite` in DATA_FOLDER) recording every game fetched.
+
+    Only the games missing, failed, corrupted (size, or sha256 if verify_checksums, differs from the manifest)
+    or not over when last fetched are downloaded. The schedule of a season is not requested again once all its games are over.
+    A game is recorded in the manifest only after its file is completely written, so an interrupted sync just resumes.
+    '''
+    from tqdm import tqdm
+    from .fetch_manifest import Fetch_Manifest
+
+    manifest = Fetch_Manifest(Path(os.getenv('DATA_FOLDER')) / 'fetch_manifest.sqlite')
+
+    for year in years:
+        output_dir = Path(os.getenv('DATA_FOLDER')) / str(year)
+
+        game_ids = manifest.scheduled_games(year)
+        if game_ids is None or not manifest.is_season_over(year):
+            game_ids = fetch_schedule_game_ids(year)
+            manifest.record_schedule(year, game_ids)
+
+        games_to_sync = manifest.games_to_sync(
+            game_ids,
+            [output_dir / raw_game_file_name(id, compression) for id in game_ids],
+            verify_checksums,
+        )
+        logger.info(f"Season {year} : {len(game_ids) - len(games_to_sync)} games up-to-date, syncing the {len(games_to_sync)} others")
+        if not games_to_sync:
+            continue
+
+        if concurrency is not None:
+            asyncio.run(
+                fetch_games_concurrently(
+                    games_to_sync, output_dir, concurrency, compression,
+                    overwrite=True, manifest=manifest, season=year,
+                )
+            )
+            continue
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with tqdm(total=len(games_to_sync)) as pbar2:
+            for id in games_to_sync:
+                path_save_local = output_dir / raw_game_file_name(id, compression)
+                pbar2.set_description(f"Syncing game/{id}/feed/live saved at {path_save_local}")
+                pbar2.update(1)
+                fetcher = Game_endpoints_Fetcher(f"game/{id}/feed/live")
+                try:
+                    content = fetcher.fetch(save_local=path_save_local)
+                except (requests.RequestException, ValueError) as e:
+                    logger.error(f"FAILED TO SYNC game/{id}/feed/live : {e!r}")
+                    manifest.record_failure(id, year, path_save_local, e)
+                    continue
+                manifest.record_game(id, year, path_save_local, fetcher._game_state(content))
+
+    report_fetch_metrics(metrics_output)
+
+def report_fetch_metrics(metrics_output: Path = None) -> dict:
+    '''
+    Print (and log) the metrics of every GET request made so far by the fetchers (see `Fetch_Metrics`)
+    and the current rate of the shared rate limiter, also written as json at `metrics_output` if specified
+    '''
+    metrics, rate_limiter = Base_Fetcher.get_metrics(), Base_Fetcher.get_rate_limiter()
+    message = f"{metrics} | rate limit {rate_limiter.rate:.2f} req/s"
+    logger.info(message)
+    print(message)
+
+    if metrics_output is not None:
+        metrics.export(metrics_output, rate_limit=rate_limiter.rate)
+    return metrics.summary()
+
+def fetch_schedule_game_ids(year: int, schedule_index = None) -> list[int]:
+    '''
+    gamePk of every regular season and playoff game of the season `year`-`year+1`,
+    looked up in the local `Schedule_Index` (DATA_FOLDER/schedule_index.sqlite by default) after refreshing it :
+    the schedule endpoint is only requested for the games of the season that were not over at the last refresh.
+    '''
+    from .schedule_index import Schedule_Index
+
+    schedule_index = schedule_index if schedule_index is not None else Schedule_Index()
+    schedule_index.refresh(year)
+    return schedule_index.game_ids(year, game_types=("R", "P"))
+
+def raw_game_file_name(game_id: int, compression: str = None) -> str:
+    '''
+    Name of the file of a game saved locally : {id}.json, or {id}.json.gz / {id}.json.zst if compressed
+    '''
+    return f"{game_id}.json" if compression is None else f"{game_id}.json.{compression}"
+
+async def fetch_games_concurrently(
+        game_ids: list[int],
+        output_dir: Path,
+        concurrency: int,
+        compression: str = None,
+        overwrite: bool = False,
+        manifest = None,
+        season: int = None,
+    ) -> None:
+    '''
+    Download the game/{id}/feed/live endpoint of every game in `game_ids` into `output_dir`/{id}.json (see `raw_game_file_name()`),
+    keeping at most `concurrency` GET requests in flight over a single aiohttp connection pool.
+
+    Games already present in `output_dir` are skipped (same semantics as `save_local` in `Base_Fetcher.fetch()`) unless `overwrite`,
+    the others are written to disk as soon as their download completes.
+
+    If a `Fetch_Manifest` is given, every game is recorded in it (for `season`) once written,
+    and a game that fails is recorded as failed instead of stopping the others.
+    '''
+    import aiohttp
+    from tqdm import tqdm
+
+    if concurrency < 1:
+        raise RuntimeError(f"CONCURRENCY MUST BE >= 1, YOU SPECIFIED {concurrency}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    games_to_fetch = [id for id in game_ids if overwrite or not (output_dir / raw_game_file_name(id, compression)).exists()]
+    logger.info(
+        f"{len(game_ids) - len(games_to_fetch)} games already locally existing in {output_dir}, fetching the {len(games_to_fetch)} others"
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one_game(session, id):
+        path_save_local = output_dir / raw_game_file_name(id, compression)
+        fetcher = Game_endpoints_Fetcher(f"game/{id}/feed/live")
+        async with semaphore:
+            try:
+                # without manifest the game state is not needed, so the body is written as received, without parsing it
+                content = await fetcher.fetch_async(
+                    session,
+                    output_format="json" if manifest is not None else "binary",
+                    save_local=path_save_local,
+                    overwrite=overwrite,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if manifest is None:
+                    raise
+                logger.error(f"FAILED TO FETCH game/{id}/feed/live : {e!r}")
+                manifest.record_failure(id, season, path_save_local, e)
+                return id
+        if manifest is not None:
+            manifest.record_game(id, season, path_save_local, fetcher._game_state(content))
+        return id
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        with tqdm(total=len(games_to_fetch)) as pbar2:
+            for finished_game in asyncio.as_completed([fetch_one_game(session, id) for id in games_to_fetch]):
+                id = await finished_game
+                pbar2.set_description(f"Fetched game/{id}/feed/live saved in {output_dir}")
+                pbar2.update(1)
+
 def cli_args():
     '''
     CLI Interface, to specify for now :
@@ -434,6 +981,13 @@ def cli_args():
     import argparse
     parser = argparse.ArgumentParser(description='Script to fetch data from the NHL REST API')
     parser.add_argument('-y','--years', required=True, nargs='+', type=int, help='years of seasons to iterate on')
+    parser.add_argument('--compression', choices=['gz', 'zst'], default=None, help='if specified, save the games compressed ({id}.json.gz or {id}.json.zst)')
+    parser.add_argument('--sync', action='store_true', help='only fetch games missing, corrupted or not over (see fetch_manifest.py)')
+    parser.add_argument('--verify_checksums', action='store_true', help='with --sync, verify the sha256 of every game already fetched (slower)')
+    parser.add_argument('-c','--concurrency', type=int, default=None, help='if specified, fetch the games with asyncio, with at most this number of concurrent GET requests')
+    parser.add_argument('--rate', type=float, default=None, help=f'initial rate limit in requests/s, adapted w.r.t the 429 of the server (default {Base_Fetcher.RATE_LIMIT})')
+    parser.add_argument('--max_rate', type=float, default=None, help=f'the rate limit never goes above (default {Base_Fetcher.MAX_RATE_LIMIT})')
+    parser.add_argument('--metrics_output', type=Path, default=None, help='if specified, json file where the metrics of the GET requests are written')
     args = parser.parse_args()
     return args
 
@@ -473,5 +1027,9 @@ if __name__ == "__main__":
     verify_dotenv_file(Path(__file__).parent.parent)
     logger = init_logger("nhl_rest_api_fetcher.log")
     args = cli_args()
+    Base_Fetcher.configure_rate_limiter(rate=args.rate, max_rate=args.max_rate)
 
-    regular_playoff_p_by_p_data_per_season(years=args.years)
\ No newline at end of file
+    if args.sync:
+        sync_seasons(years=args.years, concurrency=args.concurrency, compression=args.compression, verify_checksums=args.verify_checksums, metrics_output=args.metrics_output)
+    else:
+        regular_playoff_p_by_p_data_per_season(years=args.years, concurrency=args.concurrency, compression=args.compression, metrics_output=args.metrics_output)
\ No newline at end of file
@@ -102,6 +102,13 @@ class Game_endpoints_Fetcher_v2(Base_Fetcher):
 
         self.path = generate_url_path(self.root_path, path, use_posix=True)
 
+    def _game_state(self, content):
+        """gameState ('FUT', 'PRE', 'LIVE', 'CRIT', 'FINAL', 'OFF') of the play-by-play json response
+        """
+        if not isinstance(content, dict):
+            return None
+        return content.get("gameState", None)
+
     def _verify_endpoint_path(self, endpoint_path: str) -> None:
         """Verify if self.ALLOWED_ENDPOINT_PATH matches the endpoint path provided by the user
         
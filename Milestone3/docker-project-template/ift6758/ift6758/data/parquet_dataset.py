@@ -0,0 +1,259 @@
+"""
+Columnar storage of the DataFrames of `JsonParser.load_all_seasons()` (one row per play) : a Parquet dataset partitioned
+by season and gameType (hive layout, one directory per partition) instead of one monolithic csv file.
+
+    raw_data_2016_2020.parquet/
+        season=2016/gameType=P/<uuid>-0.parquet
+        season=2016/gameType=R/<uuid>-0.parquet
+        ...
+
+Compared to `pd.read_csv()` the dtypes are kept as written (see `play_schema.py`, no parsing at load time),
+and a read only decodes the columns asked for (column pruning) in the partitions matching the filters (partition pruning),
+i.e. only the shots of the 2020 playoffs :
+
+    read_dataset(
+        path,
+        columns=["gameId", "eventType", "coordinateX", "coordinateY"],
+        filters=[("season", "=", 2020), ("gameType", "=", "P"), ("eventType", "in", ["SHOT", "GOAL"])],
+    )
+
+`filters` follow the syntax of pyarrow : a list of (column, op, value) AND-ed together, or a list of such lists OR-ed together,
+with op one of =, ==, !=, <, <=, >, >=, in, not in. They are applied to csv files too (after reading them), so that
+`NHLFeatureEngineering` and `init_data_for_isgoal_classification_experiment()` accept both formats.
+
+Convert an existing csv file with :
+    python -m ift6758.data.parquet_dataset --input $DATA_FOLDER/json_scrapper_output/raw_data_2016_2020_b15700b.csv
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Any, List, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .play_schema import apply_schema
+
+PARQUET_SUFFIX = ".parquet"
+PARTITION_COLUMNS = ("season", "gameType")
+
+Filter = Tuple[str, str, Any]
+Filters = Union[Sequence[Filter], Sequence[Sequence[Filter]]]
+
+def is_parquet_dataset(path : Union[str, Path]) -> bool:
+    return Path(path).suffix == PARQUET_SUFFIX
+
+def _as_dnf(filters : Filters) -> List[List[Filter]]:
+    """Filters as a list of AND-ed groups, OR-ed together (disjunctive normal form)
+    """
+    if not filters:
+        return []
+    if isinstance(filters[0][0], str):
+        return [[tuple(f) for f in filters]]
+    return [[tuple(f) for f in group] for group in filters]
+
+def filter_columns(filters : Filters) -> List[str]:
+    """Columns referenced by `filters`
+    """
+    return list(dict.fromkeys(column for group in _as_dnf(filters) for column, _, _ in group))
+
+def filters_mask(df : pd.DataFrame, filters : Filters) -> pd.Series:
+    """Boolean mask of the rows of `df` matching `filters` (same semantic as the filters of pyarrow)
+    """
+    mask = pd.Series(not filters, index=df.index)
+    for group in _as_dnf(filters):
+        group_mask = pd.Series(True, index=df.index)
+        for column, op, value in group:
+            series = df[column]
+            if op in ("=", "=="):
+                group_mask &= series == value
+            elif op == "!=":
+                group_mask &= series != value
+            elif op == "<":
+                group_mask &= series < value
+            elif op == "<=":
+                group_mask &= series <= value
+            elif op == ">":
+                group_mask &= series > value
+            elif op == ">=":
+                group_mask &= series >= value
+            elif op == "in":
+                group_mask &= series.isin(value)
+            elif op == "not in":
+                group_mask &= ~series.isin(value)
+            else:
+                raise RuntimeError(f"UNKNOWN FILTER OPERATOR {op}, SUPPORTED OPERATORS ARE =, ==, !=, <, <=, >, >=, in, not in")
+        mask |= group_mask
+    return mask
+
+def write_parquet_dataset(
+        df : pd.DataFrame,
+        path : Union[str, Path],
+        partition_cols : Sequence[str] = PARTITION_COLUMNS,
+    ) -> Path:
+    """Write `df` as a Parquet dataset partitioned by `partition_cols` (the ones present in `df`),
+        replacing the dataset at `path` if any (written in a temporary directory first, so that a crash never leaves half a dataset behind)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    df = apply_schema(df)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    pq.write_to_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        tmp_path,
+        partition_cols=[column for column in partition_cols if column in df.columns],
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def _read_parquet_dataset(path : Path, columns : List[str] = None, filters : Filters = None) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    df = dataset.to_table(
+        columns=columns,
+        filter=pq.filters_to_expression(_as_dnf(filters)) if filters else None,
+    ).to_pandas()
+
+    # the partition columns are appended after the columns of the files, and their type is inferred from the directory names (int32, string),
+    # their dtype is given back by `apply_schema()`
+    if columns is None:
+        import json
+        pandas_metadata = dataset.schema.pandas_metadata or json.loads((dataset.schema.metadata or {}).get(b"pandas", b"{}"))
+        order = [c["name"] for c in pandas_metadata.get("columns", []) if c["name"] in df.columns]
+        columns = order + [c for c in df.columns if c not in order]
+    return apply_schema(df[columns])
+
+def read_dataset(
+        path : Union[str, Path],
+        columns : Sequence[str] = None,
+        filters : Filters = None,
+    ) -> pd.DataFrame:
+    """Read a dataset written by `JsonParser.load_all_seasons()`, a Parquet dataset (see `write_parquet_dataset()`) or a csv file
+
+    Args:
+        path (Union[str, Path]): `.parquet` directory or `.csv` file
+        columns (Sequence[str], optional): columns to read (in this order). Defaults to None (all the columns).
+        filters (Filters, optional): rows to read (see the docstring of the module). Defaults to None (all the rows).
+            With a Parquet dataset, the partitions not matching the filters on season and gameType are not read at all.
+
+    Returns:
+        pd.DataFrame: rows matching `filters`, with a RangeIndex and the dtypes of `play_schema.PLAY_SCHEMA`
+    """
+    path = Path(path)
+    columns = list(columns) if columns is not None else None
+    if is_parquet_dataset(path):
+        return _read_parquet_dataset(path, columns, filters)
+
+    usecols = None if columns is None else list(dict.fromkeys(columns + filter_columns(filters)))
+    df = pd.read_csv(path, usecols=usecols)
+    if filters:
+        df = df[filters_mask(df, filters)].reset_index(drop=True)
+    return apply_schema(df if columns is None else df[columns])
+
+def write_dataset(df : pd.DataFrame, path : Union[str, Path]) -> Path:
+    """Counterpart of `read_dataset()` : a Parquet dataset if `path` ends with .parquet (see `write_parquet_dataset()`), a csv file otherwise
+    """
+    if is_parquet_dataset(path):
+        return write_parquet_dataset(df, path)
+    df.to_csv(path, index=False)
+    return Path(path)
+
+def _update_parquet_dataset(path : Path, rows : pd.DataFrame, drop_game_ids : List[int]) -> Path:
+    """See `update_dataset()`, only the partitions of `rows` and of the games of `drop_game_ids` are read and written again
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def rewrite_dataset():
+        df = read_dataset(path)
+        return write_parquet_dataset(pd.concat([df[~df.gameId.isin(drop_game_ids)], rows], ignore_index=True), path)
+
+    # partitioned as written by `load_all_seasons()`, `rows` has no column at all if only games are removed
+    partition_cols = list(PARTITION_COLUMNS)
+    file_schema = pq.read_schema(next(path.rglob(f"*{PARQUET_SUFFIX}")))
+    if not set(rows.columns) <= set(file_schema.names + partition_cols):
+        # new columns, the files of the other partitions would not have them
+        return rewrite_dataset()
+
+    partitions = set(rows[partition_cols].drop_duplicates().itertuples(index=False, name=None)) if len(rows) else set()
+    if drop_game_ids:
+        dropped = read_dataset(path, partition_cols, [("gameId", "in", drop_game_ids)])
+        partitions |= set(dropped.drop_duplicates().itertuples(index=False, name=None))
+    if not partitions:
+        return path
+
+    df = read_dataset(path, filters=[[(column, "=", value) for column, value in zip(partition_cols, partition)] for partition in partitions])
+    df = apply_schema(pd.concat([df[~df.gameId.isin(drop_game_ids)], rows], ignore_index=True))
+    # same schema as the files of the other partitions (i.e. a column entirely null in these partitions keeps its type)
+    table = pa.Table.from_pandas(df.reindex(columns=file_schema.names + partition_cols), preserve_index=False)
+    try:
+        files_table = table.select(file_schema.names).cast(file_schema)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return rewrite_dataset()
+    for column in partition_cols:
+        files_table = files_table.append_column(table.schema.field(column), table.column(column))
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    pq.write_to_dataset(files_table, tmp_path, partition_cols=partition_cols)
+    for partition in partitions:
+        partition_path = Path(*[f"{column}={value}" for column, value in zip(partition_cols, partition)])
+        shutil.rmtree(path / partition_path, ignore_errors=True)
+        if (tmp_path / partition_path).exists():
+            (path / partition_path).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path / partition_path, path / partition_path)
+        elif (path / partition_path).parent != path and not any((path / partition_path).parent.iterdir()):
+            (path / partition_path).parent.rmdir()
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+def update_dataset(df : pd.DataFrame, path : Union[str, Path], drop_game_ids : Sequence[int] = ()) -> Path:
+    """Remove from the dataset at `path` the rows of the games `drop_game_ids` and append the rows of `df`
+        (the dataset is written from `df` if it does not exist), see the incremental mode of `JsonParser.load_all_seasons()`
+
+        - Parquet dataset : only the partitions of the games of `df` and `drop_game_ids` are rewritten (i.e. adding one night of games
+            rewrites the partition of the current season, the other seasons are not touched)
+        - csv file : the rows are appended at the end of the file if none of the games of `drop_game_ids` is in it
+            (only the gameId column is read to check it), otherwise the whole file is written again
+    """
+    path = Path(path)
+    if not path.exists():
+        return write_dataset(df, path)
+    drop_game_ids = [int(game_id) for game_id in drop_game_ids]
+    df = apply_schema(df)
+    if is_parquet_dataset(path):
+        return _update_parquet_dataset(path, df, drop_game_ids)
+
+    columns = pd.read_csv(path, nrows=0).columns
+    in_dataset = bool(drop_game_ids) and len(read_dataset(path, ["gameId"], [("gameId", "in", drop_game_ids)])) > 0
+    if not in_dataset and set(df.columns) <= set(columns):
+        df.reindex(columns=columns).to_csv(path, mode="a", header=False, index=False)
+        return path
+    previous = read_dataset(path)
+    return write_dataset(apply_schema(pd.concat([previous[~previous.gameId.isin(drop_game_ids)], df], ignore_index=True)), path)
+
+
+def cli_args():
+    '''
+    CLI Interface, to specify the csv file to convert and the output dataset
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert a csv file of json_scrapper.py to a Parquet dataset partitioned by season and gameType')
+    parser.add_argument('-i', '--input', type=Path, required=True, help='csv file to convert')
+    parser.add_argument('-o', '--output', type=Path, default=None, help='.parquet directory written. Defaults to the csv file with the suffix .parquet')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    args = cli_args()
+    output = args.output if args.output is not None else args.input.with_suffix(PARQUET_SUFFIX)
+    write_dataset(read_dataset(args.input), output)
+    print(f"{args.input} ---> {output}")
@@ -0,0 +1,77 @@
+"""
+Declared dtypes of the DataFrames of `JsonParser` / `JsonParser_v2` (one row per play), applied at parse time and after every read
+(`parquet_dataset.read_dataset()`), so that every stage downstream gets compact and typed columns instead of `object` / `float64` :
+
+    - categoricals for the teams, players, event/shot types, strength and rink side (a few codes per row instead of python strings)
+    - nullable Int32 for the ids (no more float ids because of the NaN of the plays without shooter/goalie)
+    - nullable Int8 for emptyNet (a boolean for the v1 API, a digit of the situationCode for the v2 API, the same column whatever the API)
+    - float32 for the coordinates, int16 for the seconds of the period
+
+A Parquet dataset keeps these dtypes as written, a csv file gets them back when read through `read_dataset()`.
+Columns not declared here (i.e. periodTime, the features of `NHLFeatureEngineering`) are left as they are.
+"""
+
+from typing import Dict, Union
+
+import pandas as pd
+
+RINK_SIDES = pd.CategoricalDtype(["left", "right", "Shootout"])
+
+PLAY_SCHEMA : Dict[str, Union[str, pd.CategoricalDtype]] = {
+    "gameId": "Int32",
+    "season": "Int32",
+    "gameType": "category",
+    "gameDate": "datetime64[ns]",
+    "homeTeam": "category",
+    "awayTeam": "category",
+    "period": "Int8",
+    "periodTimeSeconds": "Int16",
+    "byTeam": "category",
+    "eventType": "category",
+    "coordinateX": "float32",
+    "coordinateY": "float32",
+    "winTeam": "category",
+    "rinkSide": RINK_SIDES,
+    "shotType": "category",
+    "shooter": "category",
+    "goalie": "category",
+    "shooterId": "Int32",
+    "goalieId": "Int32",
+    "strength": "category",
+    "penaltySeverity": "category",
+    "penaltyMinutes": "Int16",
+    "penalizedTeam": "category",
+    "emptyNet": "Int8",
+}
+
+def apply_schema(df : pd.DataFrame, schema : Dict[str, Union[str, pd.CategoricalDtype]] = PLAY_SCHEMA) -> pd.DataFrame:
+    """Cast the columns of `df` declared in `schema` (the others, and the ones already of the right dtype, are left untouched)
+
+        the categories of a "category" column are the values of the column : after a `pd.concat()` of DataFrames whose categories differ
+        (the column is then of dtype object), applying the schema again gives back a categorical column with the union of the categories
+    """
+    casts = {
+        column: dtype for column, dtype in schema.items()
+        if column in df.columns and not _has_dtype(df[column], dtype)
+    }
+    if not casts:
+        return df
+    df = df.copy(deep=False)
+    for column, dtype in casts.items():
+        df[column] = cast_series(df[column], dtype)
+    return df
+
+def cast_series(series : pd.Series, dtype : Union[str, pd.CategoricalDtype]) -> pd.Series:
+    """Cast of one column by `apply_schema()`
+    """
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(series)
+    if isinstance(dtype, str) and dtype[0] == "I":
+        # nullable ints from floats (NaN), booleans or objects (None, digit strings)
+        return pd.to_numeric(series).astype(dtype)
+    return series.astype(dtype)
+
+def _has_dtype(series : pd.Series, dtype : Union[str, pd.CategoricalDtype]) -> bool:
+    if dtype == "category":
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    return series.dtype == dtype
@@ -0,0 +1,184 @@
+"""
+Client-side throttling and metrics of the GET requests made by the fetchers (see `Base_Fetcher.get_rate_limiter()`
+and `Base_Fetcher.get_metrics()`), shared by every fetcher of the process, whether used from threads (`fetch()`)
+or from coroutines (`fetch_async()`).
+
+`Adaptive_Rate_Limiter` is a token bucket whose rate adapts itself (AIMD, as TCP congestion control) :
+    - every request takes a token, waiting for it if the bucket is empty
+    - every success increases the rate additively (+`increase_step` req/s per second of successful requests), up to `max_rate`
+    - every 429 (or response with a Retry-After header) divides the rate by 1/`decrease_factor`, down to `min_rate`,
+        and no token is given until Retry-After seconds have passed
+So a backfill converges by itself to the highest rate the server tolerates, no manual tuning needed.
+
+`Fetch_Metrics` counts requests, bytes, errors and latencies, `summary()` gives requests/s, bytes/s,
+latency percentiles and error rate, `export()` writes them to a json file.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+
+class Adaptive_Rate_Limiter:
+
+    def __init__(
+            self,
+            rate : float = 10.0,
+            min_rate : float = 0.5,
+            max_rate : float = 50.0,
+            burst : int = None,
+            increase_step : float = 1.0,
+            decrease_factor : float = 0.5,
+        ) -> None:
+        """
+        Args:
+            rate (float, optional): initial rate, in requests per second. Defaults to 10.0.
+            min_rate (float, optional): the rate never goes below. Defaults to 0.5.
+            max_rate (float, optional): the rate never goes above. Defaults to 50.0.
+            burst (int, optional): capacity of the bucket (requests that can be sent at once after an idle period). Defaults to `rate`.
+            increase_step (float, optional): req/s added to the rate per second of successful requests. Defaults to 1.0.
+            decrease_factor (float, optional): the rate is multiplied by it at each throttling response. Defaults to 0.5.
+        """
+        if not 0 < min_rate <= rate <= max_rate:
+            raise RuntimeError(f"RATES MUST VERIFY 0 < min_rate <= rate <= max_rate, YOU SPECIFIED {min_rate}, {rate}, {max_rate}")
+        if not 0 < decrease_factor < 1:
+            raise RuntimeError(f"decrease_factor MUST BE IN ]0, 1[, YOU SPECIFIED {decrease_factor}")
+
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.burst = float(burst if burst is not None else max(1, int(rate)))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token (the bucket can go in debt) and return the number of seconds to wait before using it.
+            The lock is never held while waiting, so the same limiter can be used by threads and by an event loop.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate, self._paused_until - now)
+
+    def acquire(self) -> None:
+        """Block the calling thread until a request can be sent
+        """
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Suspend the calling coroutine until a request can be sent
+        """
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_success(self) -> None:
+        with self._lock:
+            # +increase_step / rate per request ---> +increase_step req/s per second at the current rate
+            self.rate = min(self.max_rate, self.rate + self.increase_step / self.rate)
+
+    def on_throttled(self, retry_after : Optional[float] = None) -> None:
+        """To call when the server answered 429 (or sent a Retry-After header)
+        """
+        with self._lock:
+            now = time.monotonic()
+            # The requests in flight when the server started throttling all come back with a 429,
+            # only one decrease per round trip (1/rate) otherwise the rate would collapse to min_rate at once
+            if now - self._last_decrease >= 1 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+            rate = self.rate
+
+        logger.warning(f"Throttled by the server (Retry-After {retry_after}), rate limited to {rate:.2f} req/s")
+
+
+class Fetch_Metrics:
+
+    def __init__(self, max_latency_samples : int = 100_000) -> None:
+        """
+        Args:
+            max_latency_samples (int, optional): latencies kept for the percentiles (the most recent ones). Defaults to 100_000.
+        """
+        self._lock = threading.Lock()
+        self.max_latency_samples = max_latency_samples
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.nb_requests = 0
+            self.nb_bytes = 0
+            self.nb_errors = 0
+            self.nb_throttled = 0
+            self.status_counts = Counter()
+            self.latencies = deque(maxlen=self.max_latency_samples)
+
+    def record(self, latency : Optional[float], nb_bytes : int = 0, status : int = None, error : bool = False) -> None:
+        """Record one GET request (status None if no response, i.e. connection error,
+            latency None if unknown, i.e. attempts retried internally by urllib3)
+        """
+        with self._lock:
+            self.nb_requests += 1
+            self.nb_bytes += nb_bytes
+            self.nb_errors += int(error or status is None or status >= 400)
+            self.nb_throttled += int(status == 429)
+            self.status_counts[str(status)] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            latencies = np.fromiter(self.latencies, dtype=float)
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (np.nan,) * 3
+            return {
+                "elapsed_s": elapsed,
+                "requests": self.nb_requests,
+                "requests_per_s": self.nb_requests / elapsed,
+                "bytes": self.nb_bytes,
+                "bytes_per_s": self.nb_bytes / elapsed,
+                "latency_p50_ms": p50 * 1e3,
+                "latency_p90_ms": p90 * 1e3,
+                "latency_p99_ms": p99 * 1e3,
+                "errors": self.nb_errors,
+                "error_rate": self.nb_errors / self.nb_requests if self.nb_requests else 0.0,
+                "throttled": self.nb_throttled,
+                "status_counts": dict(self.status_counts),
+            }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        return (
+            f"{s['requests']} requests in {s['elapsed_s']:.1f}s ({s['requests_per_s']:.2f} req/s, {s['bytes_per_s'] / 1e6:.2f} MB/s) | "
+            f"latency p50 {s['latency_p50_ms']:.0f}ms p90 {s['latency_p90_ms']:.0f}ms p99 {s['latency_p99_ms']:.0f}ms | "
+            f"errors {s['errors']} ({100 * s['error_rate']:.1f}%), throttled {s['throttled']}"
+        )
+
+    def export(self, path : Union[str, Path], **extra) -> Path:
+        """Write `summary()` (and `extra` key/values, i.e. the final rate of the limiter) to a json file
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({**self.summary(), **extra}, file, indent=4)
+        return path
@@ -0,0 +1,364 @@
+"""
+Compressed storage of the raw json files fetched from the NHL REST API (~5GB for 5 seasons of indented json).
+
+Two layouts are supported :
+    - one compressed file per game, `{gameId}.json.gz` or `{gameId}.json.zst`
+        (written by `Base_Fetcher.fetch()` as soon as `save_local` ends with one of those suffixes)
+    - one archive per season, `{season}.nhlpack`, packing one compressed frame per game
+        followed by an index (gameId ---> offset, length) so that a game can be read without decompressing the others
+
+Layout of a `.nhlpack` file :
+    MAGIC | codec (4 bytes) | frame_1 | ... | frame_n | index (json) | offset of the index (8 bytes, little endian) | MAGIC
+
+The json is stored compact (no indentation), compression is done with zstd if the `zstandard` package is installed, gzip otherwise.
+
+Pack already downloaded seasons with :
+    python -m ift6758.data.raw_archive --input_dir $DATA_FOLDER/2016 --output $DATA_FOLDER/2016.nhlpack
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import json_backend
+
+MAGIC = b"NHLPACK1"
+ARCHIVE_SUFFIX = ".nhlpack"
+COMPRESSED_SUFFIXES = {".gz": "gz", ".zst": "zst"}
+_FOOTER = struct.Struct("<Q")
+
+def default_codec() -> str:
+    """zstd if available (faster to decompress), gzip (standard library) otherwise
+    """
+    try:
+        import zstandard
+        return "zst"
+    except ImportError:
+        return "gz"
+
+def codec_of_path(path : Union[str, Path]) -> str:
+    """Codec encoded in the suffix of a per-game file, None if the file is not compressed
+    """
+    return COMPRESSED_SUFFIXES.get(Path(path).suffix, None)
+
+def is_raw_archive(path : Union[str, Path]) -> bool:
+    return Path(path).suffix == ARCHIVE_SUFFIX
+
+def compress(payload : bytes, codec : str) -> bytes:
+    if codec == "gz":
+        return gzip.compress(payload, compresslevel=6)
+    if codec == "zst":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    raise RuntimeError(f"UNKNOWN CODEC {codec}, SUPPORTED CODECS ARE {tuple(COMPRESSED_SUFFIXES.values())}")
+
+def decompress(frame : bytes, codec : str) -> bytes:
+    if codec == "gz":
+        return gzip.decompress(frame)
+    if codec == "zst":
+        import zstandard
+        # decompressobj() also handles the frames written by `stream_to_file()` (no content size in their header)
+        return zstandard.ZstdDecompressor().decompressobj().decompress(frame)
+    raise RuntimeError(f"UNKNOWN CODEC {codec}, SUPPORTED CODECS ARE {tuple(COMPRESSED_SUFFIXES.values())}")
+
+def encode_json(content : dict) -> bytes:
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+def write_compressed_file(path : Union[str, Path], payload : bytes) -> None:
+    """Compress `payload` with the codec given by the suffix of `path`
+        (written in a temporary file first so that a crash never leaves a truncated frame behind)
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(compress(payload, codec_of_path(path)))
+    os.replace(tmp_path, path)
+
+class _Hashing_Writer:
+    '''
+    File-like object that counts and hashes (sha256) the bytes written to the file it wraps
+    '''
+
+    def __init__(self, file) -> None:
+        self.file = file
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data : bytes) -> int:
+        self.size += len(data)
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+def stream_to_file(chunks : Iterable[bytes], path : Union[str, Path]) -> Tuple[int, str]:
+    """Write `chunks` to `path` as they come, compressed on the fly if `path` ends with .gz or .zst,
+        without ever holding the whole content in memory (written in a temporary file first, as `write_compressed_file()`)
+
+    Returns:
+        Tuple[int, str]: size and sha256 of the file written (the same as `fetch_manifest.sha256_of_file()`, without reading it back)
+    """
+    path = Path(path)
+    codec = codec_of_path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        hashing_file = _Hashing_Writer(file)
+        if codec == "gz":
+            writer = gzip.GzipFile(fileobj=hashing_file, mode="wb", compresslevel=6)
+        elif codec == "zst":
+            import zstandard
+            writer = zstandard.ZstdCompressor(level=10).stream_writer(hashing_file, closefd=False)
+        else:
+            writer = hashing_file
+
+        for chunk in chunks:
+            writer.write(chunk)
+        if writer is not hashing_file:
+            writer.close()
+    os.replace(tmp_path, path)
+
+    return hashing_file.size, hashing_file.digest.hexdigest()
+
+def read_compressed_file(path : Union[str, Path]) -> bytes:
+    with open(path, "rb") as file:
+        return decompress(file.read(), codec_of_path(path))
+
+def read_raw_json(path : Union[str, Path]) -> dict:
+    """Read a raw json file, compressed (`.json.gz`, `.json.zst`) or not (`.json`)
+    """
+    if codec_of_path(path) is not None:
+        return json_backend.loads(read_compressed_file(path))
+    return json_backend.load_file(path)
+
+def open_raw_json(path : Union[str, Path]) -> BinaryIO:
+    """Binary file object of a raw json file, decompressed on the fly if it ends with .gz or .zst
+        (the content is never entirely in memory, for the streaming parsers, see `JsonParser_v2.iter_rows()`)
+    """
+    codec = codec_of_path(path)
+    if codec == "gz":
+        return gzip.open(path, "rb")
+    if codec == "zst":
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def write_raw_json(path : Union[str, Path], content : dict) -> None:
+    """Write a raw json file, compressed if `path` ends with .gz or .zst (indented json otherwise, as `Base_Fetcher._save_local()`)
+    """
+    if codec_of_path(path) is not None:
+        write_compressed_file(path, encode_json(content))
+        return
+    with open(path, "w") as file:
+        json.dump(content, file, indent=4)
+
+def iter_raw_json(paths : Iterable[Union[str, Path]], game_ids : Iterable[int] = None) -> Iterator[Tuple[str, dict]]:
+    """Yield (name, content) of every game in `paths`, where a path is either one game (.json, .json.gz, .json.zst)
+        or a season archive (.nhlpack, then every game of the archive is yielded, ordered by gameId)
+
+        if `game_ids` is specified, only these games are read (the others are not even decompressed)
+    """
+    game_ids = None if game_ids is None else set(map(int, game_ids))
+    for path in paths:
+        if is_raw_archive(path):
+            with Season_Archive(path) as archive:
+                yield from archive.items(None if game_ids is None else sorted(filter(archive.__contains__, game_ids)))
+        else:
+            game_id = Path(path).name.split(".")[0]
+            if game_ids is None or (game_id.isdigit() and int(game_id) in game_ids):
+                yield Path(path).name, read_raw_json(path)
+
+def iter_raw_json_streams(paths : Iterable[Union[str, Path]], game_ids : Iterable[int] = None) -> Iterator[Tuple[str, BinaryIO]]:
+    """Same as `iter_raw_json()` but yield (name, binary file object) without decoding the json (see `open_raw_json()`),
+        the file object is closed once the next game is requested.
+        The games of a .nhlpack archive are yielded as in-memory buffers of their decompressed frame.
+    """
+    game_ids = None if game_ids is None else set(map(int, game_ids))
+    for path in paths:
+        if is_raw_archive(path):
+            with Season_Archive(path) as archive:
+                for game_id in (archive.game_ids() if game_ids is None else sorted(filter(archive.__contains__, game_ids))):
+                    yield f"{game_id}.json", io.BytesIO(archive.read_bytes(game_id))
+        else:
+            game_id = Path(path).name.split(".")[0]
+            if game_ids is None or (game_id.isdigit() and int(game_id) in game_ids):
+                with open_raw_json(path) as file:
+                    yield Path(path).name, file
+
+def chunk_raw_json_sources(
+        paths : Iterable[Union[str, Path]],
+        game_ids : Iterable[int] = None,
+        chunk_size : int = 32,
+    ) -> List[Tuple[List[Path], Optional[List[int]]]]:
+    """Split the games of `paths` (filtered by `game_ids`, as in `iter_raw_json()`) into chunks of at most `chunk_size` games,
+        a chunk being the arguments (paths, game_ids) of `iter_raw_json()` that yield its games.
+        Chained, the chunks yield the same games in the same order as `iter_raw_json(paths, game_ids)`
+        (used to dispatch the parsing of a season to a process pool, each worker reading its games itself).
+    """
+    game_ids = None if game_ids is None else set(map(int, game_ids))
+    chunks, files = [], []
+
+    def flush_files():
+        for i in range(0, len(files), chunk_size):
+            chunks.append((files[i:i + chunk_size], None))
+        files.clear()
+
+    for path in map(Path, paths):
+        if is_raw_archive(path):
+            flush_files()
+            with Season_Archive(path) as archive:
+                ids = [id for id in archive.game_ids() if game_ids is None or id in game_ids]
+            for i in range(0, len(ids), chunk_size):
+                chunks.append(([path], ids[i:i + chunk_size]))
+        else:
+            game_id = path.name.split(".")[0]
+            if game_ids is None or (game_id.isdigit() and int(game_id) in game_ids):
+                files.append(path)
+    flush_files()
+
+    return chunks
+
+
+class Season_Archive:
+    '''
+    Read-only random access to the games packed in a `.nhlpack` file (see `Season_Archive.pack()` to create one)
+
+    Example:
+        with Season_Archive(DATA_FOLDER / "2016.nhlpack") as archive:
+            data = archive.read(2016020001)
+    '''
+
+    def __init__(self, path : Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+
+        header = self._file.read(len(MAGIC) + 4)
+        self._file.seek(-(_FOOTER.size + len(MAGIC)), os.SEEK_END)
+        footer = self._file.read()
+        if header[:len(MAGIC)] != MAGIC or footer[_FOOTER.size:] != MAGIC:
+            raise RuntimeError(f"{self.path} IS NOT A VALID {ARCHIVE_SUFFIX} ARCHIVE (TRUNCATED OR WRONG FORMAT)")
+
+        self.codec = header[len(MAGIC):].rstrip(b"\x00").decode()
+        index_offset, = _FOOTER.unpack(footer[:_FOOTER.size])
+        self._file.seek(index_offset)
+        index_length = os.path.getsize(self.path) - index_offset - _FOOTER.size - len(MAGIC)
+        self.index : Dict[str, List[int]] = json.loads(self._file.read(index_length))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __contains__(self, game_id) -> bool:
+        return str(game_id) in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def game_ids(self) -> List[int]:
+        return sorted(map(int, self.index))
+
+    def read_frame(self, game_id) -> bytes:
+        """Compressed frame of one game, as stored in the archive
+        """
+        if game_id not in self:
+            raise KeyError(f"GAME {game_id} NOT IN ARCHIVE {self.path}")
+        offset, length = self.index[str(game_id)]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def read_bytes(self, game_id) -> bytes:
+        """Decompressed (compact) json of one game, only its frame is read from disk
+        """
+        return decompress(self.read_frame(game_id), self.codec)
+
+    def read(self, game_id) -> dict:
+        return json_backend.loads(self.read_bytes(game_id))
+
+    def items(self, game_ids : Iterable[int] = None) -> Iterator[Tuple[str, dict]]:
+        """Yield (f'{gameId}.json', content) for `game_ids` (all the games of the archive if None), in order of gameId
+        """
+        for game_id in (self.game_ids() if game_ids is None else game_ids):
+            yield f"{game_id}.json", self.read(game_id)
+
+    @staticmethod
+    def pack(
+        games : Iterable[Tuple[int, Union[dict, bytes]]],
+        archive_path : Union[str, Path],
+        codec : str = None,
+    ) -> Path:
+        """Write a `.nhlpack` archive from (gameId, content) pairs, content being a decoded json or its bytes
+
+        Args:
+            games (Iterable[Tuple[int, Union[dict, bytes]]]): games to pack
+            archive_path (Union[str, Path]): path of the archive (must end with .nhlpack)
+            codec (str, optional): "zst" or "gz". Defaults to `default_codec()`.
+
+        Returns:
+            Path: path of the archive
+        """
+        archive_path = Path(archive_path)
+        if not is_raw_archive(archive_path):
+            raise RuntimeError(f"PATH OF THE ARCHIVE MUST END WITH {ARCHIVE_SUFFIX}, YOU SPECIFIED {archive_path}")
+        codec = codec or default_codec()
+
+        index = {}
+        tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            file.write(MAGIC + codec.encode().ljust(4, b"\x00"))
+            for game_id, content in games:
+                payload = content if isinstance(content, bytes) else encode_json(content)
+                frame = compress(payload, codec)
+                index[str(game_id)] = [file.tell(), len(frame)]
+                file.write(frame)
+
+            index_offset = file.tell()
+            file.write(json.dumps(index).encode())
+            file.write(_FOOTER.pack(index_offset) + MAGIC)
+        os.replace(tmp_path, archive_path)
+
+        return archive_path
+
+    @staticmethod
+    def pack_directory(
+        input_dir : Union[str, Path],
+        archive_path : Union[str, Path],
+        codec : str = None,
+    ) -> Path:
+        """Pack every `{gameId}.json[.gz|.zst]` file of a season directory (as written by the fetchers)
+        """
+        def games_of_directory():
+            for path in sorted(Path(input_dir).iterdir()):
+                game_id = path.name.split(".")[0]
+                if game_id.isdigit() and (path.suffix == ".json" or codec_of_path(path) is not None):
+                    yield int(game_id), encode_json(read_raw_json(path))
+
+        return Season_Archive.pack(games_of_directory(), archive_path, codec)
+
+
+def cli_args():
+    '''
+    CLI Interface, to pack a season directory of json files into a .nhlpack archive
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Pack the json files of a season directory into a compressed .nhlpack archive')
+    parser.add_argument('-i', '--input_dir', type=Path, required=True, help='directory containing the {gameId}.json files of a season')
+    parser.add_argument('-o', '--output', type=Path, required=True, help='path of the archive to create (must end with .nhlpack)')
+    parser.add_argument('--codec', choices=tuple(COMPRESSED_SUFFIXES.values()), default=None, help='compression codec, zst if available by default')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    args = cli_args()
+    archive_path = Season_Archive.pack_directory(args.input_dir, args.output, args.codec)
+    print(f"{args.input_dir} packed in {archive_path} ({os.path.getsize(archive_path) / 1e6:.1f} MB)")
@@ -0,0 +1,332 @@
+"""
+Local stand-in of the NHL REST APIs, to test and benchmark the fetchers without hitting the real servers.
+
+It serves :
+    - v1 (statsapi.web.nhl.com) :
+        /api/v1/schedule?season=YYYYYYYY            synthetic schedule (regular season + playoffs)
+        /api/v1/game/{id}/feed/live                 recorded payload `{id}.json` of `payloads_dir` if any, synthetic game otherwise
+        /api/v1/game/{id}/feed/live/diffPatch       empty list (game over)
+    - v2 (api-web.nhle.com) :
+        /v1/gamecenter/{id}/play-by-play            recorded payload (data/v2_api/2022030411.json by default)
+
+with configurable latency (+ uniform jitter), and injection of 503 errors and 429 (with a Retry-After header).
+
+Example:
+    with NHL_Replay_Server(latency=0.05, throttle_rate=0.01) as server:
+        Base_Fetcher.redirect_to(server.url)
+        Game_endpoints_Fetcher("game/2016020001/feed/live").fetch()
+
+Or in its own process (so that it does not share the GIL with the fetchers benchmarked) :
+    python -m ift6758.data.replay_server --port 8000 --latency 0.05 --jitter 0.02
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import urllib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Union
+
+DEFAULT_V2_PAYLOAD = Path(__file__).resolve().parents[5] / "data" / "v2_api" / "2022030411.json"
+
+# Placeholders of the synthetic v1 game, replaced in its encoded bytes by the requested gamePk and season
+_TEMPLATE_GAME_PK = "1999999999"
+_TEMPLATE_SEASON = "19992000"
+
+_TEAMS = [
+    ("MTL", "Montréal Canadiens"), ("TOR", "Toronto Maple Leafs"), ("BOS", "Boston Bruins"), ("NYR", "New York Rangers"),
+    ("CHI", "Chicago Blackhawks"), ("DET", "Detroit Red Wings"), ("EDM", "Edmonton Oilers"), ("VAN", "Vancouver Canucks"),
+]
+
+def synthetic_schedule(season : int, nb_regular_games : int = 1230, seed : int = 0) -> dict:
+    """Response of the v1 `schedule` endpoint for the season `season`-`season+1` :
+        `nb_regular_games` regular season games from October, then 4 rounds of playoff series (4 to 7 games each)
+    """
+    rng = random.Random(seed + season)
+    games_by_date : Dict[str, List[dict]] = {}
+
+    def add_game(game_pk, game_type, day):
+        (home_abbrev, home_name), (away_abbrev, away_name) = rng.sample(_TEAMS, 2)
+        games_by_date.setdefault(day.isoformat(), []).append({
+            "gamePk": game_pk,
+            "gameType": game_type,
+            "season": f"{season}{season+1}",
+            "gameDate": f"{day.isoformat()}T23:00:00Z",
+            "status": {"abstractGameState": "Final"},
+            "teams": {
+                "home": {"team": {"id": _TEAMS.index((home_abbrev, home_name)) + 1, "name": home_name}},
+                "away": {"team": {"id": _TEAMS.index((away_abbrev, away_name)) + 1, "name": away_name}},
+            },
+        })
+
+    first_day = date(season, 10, 10)
+    for i in range(1, nb_regular_games + 1):
+        add_game(int(f"{season}02{i:04d}"), "R", first_day + timedelta(days=i * 180 // max(nb_regular_games, 1)))
+
+    day = date(season + 1, 4, 15)
+    for playoff_round, nb_series in enumerate([8, 4, 2, 1], start=1):
+        for series in range(1, nb_series + 1):
+            for game in range(1, rng.randint(4, 7) + 1):
+                add_game(int(f"{season}030{playoff_round}{series}{game}"), "P", day + timedelta(days=2 * game))
+        day += timedelta(days=15)
+
+    return {"dates": [{"date": day, "games": games} for day, games in sorted(games_by_date.items())]}
+
+def synthetic_v1_game(nb_plays : int = 350, seed : int = 0) -> dict:
+    """Response of the v1 `game/{id}/feed/live` endpoint (the fields read by `JsonParser`) for a game over,
+        with `nb_plays` plays, gamePk 1999999999 and season 19992000 (see `NHL_Replay_Server`, replaced when served)
+    """
+    rng = random.Random(seed)
+    (home_abbrev, home_name), (away_abbrev, away_name) = _TEAMS[0], _TEAMS[1]
+    event_types = ["SHOT", "GOAL", "MISSED_SHOT", "BLOCKED_SHOT", "FACEOFF", "HIT", "GIVEAWAY", "TAKEAWAY", "PENALTY", "STOP"]
+
+    plays, goals = [], {home_abbrev: 0, away_abbrev: 0}
+    for i in range(nb_plays):
+        period = 1 + i * 3 // nb_plays
+        seconds = (i * 3 * 1200 // nb_plays) % 1200
+        event_type = rng.choices(event_types, weights=[25, 3, 12, 12, 18, 15, 5, 4, 3, 3])[0]
+        tri_code = rng.choice([home_abbrev, away_abbrev])
+        goals[tri_code] += event_type == "GOAL"
+        play = {
+            "result": {"eventTypeId": event_type, "secondaryType": rng.choice(["Wrist Shot", "Slap Shot", "Snap Shot", "Backhand"])},
+            "about": {"eventIdx": i, "period": period, "periodTime": f"{seconds // 60:02d}:{seconds % 60:02d}"},
+            "coordinates": {"x": float(rng.randint(-99, 99)), "y": float(rng.randint(-42, 42))},
+            "team": {"triCode": tri_code},
+            "players": [
+                {"player": {"id": 8470000 + rng.randint(0, 999), "fullName": f"Player {rng.randint(0, 999)}"}, "playerType": player_type}
+                for player_type in (["Scorer", "Goalie"] if event_type == "GOAL" else ["Shooter", "Goalie"])
+            ],
+        }
+        if event_type == "GOAL":
+            play["result"].update({"strength": {"code": "EVEN"}, "emptyNet": False})
+        if event_type == "PENALTY":
+            play["result"].update({"penaltySeverity": "Minor", "penaltyMinutes": 2})
+        plays.append(play)
+
+    return {
+        "gamePk": int(_TEMPLATE_GAME_PK),
+        "metaData": {"timeStamp": "20000101_000000"},
+        "gameData": {
+            "game": {"pk": int(_TEMPLATE_GAME_PK), "season": _TEMPLATE_SEASON, "type": "R"},
+            "datetime": {"dateTime": "2000-01-01T00:00:00Z"},
+            "status": {"abstractGameState": "Final"},
+            "teams": {
+                "home": {"abbreviation": home_abbrev, "name": home_name},
+                "away": {"abbreviation": away_abbrev, "name": away_name},
+            },
+        },
+        "liveData": {
+            "plays": {"allPlays": plays},
+            "linescore": {
+                "periods": [
+                    {"num": num, "home": {"rinkSide": side}, "away": {"rinkSide": "left" if side == "right" else "right"}}
+                    for num, side in [(1, "left"), (2, "right"), (3, "left")]
+                ],
+                "teams": {
+                    "home": {"goals": goals[home_abbrev], "team": {"triCode": home_abbrev}},
+                    "away": {"goals": goals[away_abbrev], "team": {"triCode": away_abbrev}},
+                },
+            },
+        },
+    }
+
+
+class _Replay_HTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients closing their keep-alive connections (i.e. end of an aiohttp session) are not errors
+        import sys
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class NHL_Replay_Server:
+
+    ROUTES = {
+        "schedule": re.compile(r"^/api/v1/schedule$"),
+        "v1_game": re.compile(r"^/api/v1/game/(\d{10})/feed/live$"),
+        "v1_diff_patch": re.compile(r"^/api/v1/game/(\d{10})/feed/live/diffPatch$"),
+        "v2_game": re.compile(r"^/v1/gamecenter/(\d{10})/play-by-play$"),
+    }
+
+    def __init__(
+            self,
+            host : str = "127.0.0.1",
+            port : int = 0,
+            latency : float = 0.0,
+            jitter : float = 0.0,
+            error_rate : float = 0.0,
+            throttle_rate : float = 0.0,
+            retry_after : int = 1,
+            payloads_dir : Union[str, Path] = None,
+            v2_payload : Union[str, Path] = DEFAULT_V2_PAYLOAD,
+            nb_plays : int = 350,
+            nb_regular_games : int = 1230,
+            seed : int = 0,
+        ) -> None:
+        """
+        Args:
+            host (str, optional): Defaults to "127.0.0.1".
+            port (int, optional): 0 to let the OS choose a free port (see `url`). Defaults to 0.
+            latency (float, optional): seconds waited before answering each request. Defaults to 0.0.
+            jitter (float, optional): uniform noise in [-jitter, jitter] added to `latency`. Defaults to 0.0.
+            error_rate (float, optional): probability to answer 503. Defaults to 0.0.
+            throttle_rate (float, optional): probability to answer 429 with a Retry-After header. Defaults to 0.0.
+            retry_after (int, optional): seconds of the Retry-After header. Defaults to 1.
+            payloads_dir (Union[str, Path], optional): directory of recorded v1 games `{id}.json`, a synthetic game is served for the others. Defaults to None.
+            v2_payload (Union[str, Path], optional): recorded v2 play-by-play served for every game. Defaults to DEFAULT_V2_PAYLOAD.
+            nb_plays (int, optional): number of plays of the synthetic v1 games. Defaults to 350.
+            nb_regular_games (int, optional): number of regular season games of the synthetic schedules. Defaults to 1230.
+            seed (int, optional): seed of the synthetic payloads and of the error injection. Defaults to 0.
+        """
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.throttle_rate, self.retry_after = error_rate, throttle_rate, retry_after
+        self.payloads_dir = Path(payloads_dir) if payloads_dir is not None else None
+        self.nb_regular_games, self.seed = nb_regular_games, seed
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        # Payloads are encoded once, only the placeholders of the template are replaced at each request
+        self._v1_template = json.dumps(synthetic_v1_game(nb_plays, seed)).encode()
+        self._v2_payload = Path(v2_payload).read_bytes() if v2_payload is not None and Path(v2_payload).exists() else b"{}"
+
+        self.nb_requests = 0
+        self.status_counts : Dict[int, int] = {}
+
+        self._httpd = _Replay_HTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "NHL_Replay_Server":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve in the calling thread (until KeyboardInterrupt)
+        """
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _draw(self) -> tuple:
+        with self._rng_lock:
+            return self._rng.random(), self._rng.uniform(-self.jitter, self.jitter)
+
+    def respond(self, path : str, query : Dict[str, List[str]]) -> tuple:
+        """(status, headers, body) of a GET request at `path`
+        """
+        draw, noise = self._draw()
+        delay = max(0.0, self.latency + noise)
+        if delay > 0:
+            time.sleep(delay)
+
+        if draw < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}, b'{"message": "Too Many Requests"}'
+        if draw < self.throttle_rate + self.error_rate:
+            return 503, {}, b'{"message": "Service Unavailable"}'
+
+        for route, pattern in self.ROUTES.items():
+            match = pattern.match(path)
+            if match is None:
+                continue
+
+            if route == "schedule":
+                season = int(query.get("season", [f"{date.today().year}"])[0][:4])
+                return 200, {}, json.dumps(synthetic_schedule(season, self.nb_regular_games, self.seed)).encode()
+
+            game_id = match.group(1)
+            if route == "v1_game":
+                if self.payloads_dir is not None and (self.payloads_dir / f"{game_id}.json").exists():
+                    return 200, {}, (self.payloads_dir / f"{game_id}.json").read_bytes()
+                body = self._v1_template.replace(_TEMPLATE_GAME_PK.encode(), game_id.encode())
+                return 200, {}, body.replace(_TEMPLATE_SEASON.encode(), f"{game_id[:4]}{int(game_id[:4]) + 1}".encode())
+            if route == "v1_diff_patch":
+                return 200, {}, b"[]"
+            if route == "v2_game":
+                return 200, {}, self._v2_payload
+
+        return 404, {}, b'{"message": "Not Found"}'
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, as the real servers
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                status, headers, body = server.respond(url.path, urllib.parse.parse_qs(url.query))
+                with server._rng_lock:
+                    server.nb_requests += 1
+                    server.status_counts[status] = server.status_counts.get(status, 0) + 1
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def cli_args():
+    '''
+    CLI Interface, to run the replay server in its own process
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Local stand-in of the NHL REST APIs (v1 and v2), see replay_server.py')
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds waited before answering each request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='uniform noise in [-jitter, jitter] added to the latency')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='probability to answer 503')
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help='probability to answer 429 with a Retry-After header')
+    parser.add_argument('--retry_after', type=int, default=1, help='seconds of the Retry-After header of the 429')
+    parser.add_argument('--payloads_dir', type=Path, default=None, help='directory of recorded v1 games {id}.json')
+    parser.add_argument('--v2_payload', type=Path, default=DEFAULT_V2_PAYLOAD, help='recorded v2 play-by-play served for every game')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+
+    args = cli_args()
+    server = NHL_Replay_Server(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        payloads_dir=args.payloads_dir,
+        v2_payload=args.v2_payload,
+    )
+    print(f"Replay server listening on {server.url}, point the fetchers to it with Base_Fetcher.redirect_to('{server.url}')")
+    server.serve_forever()
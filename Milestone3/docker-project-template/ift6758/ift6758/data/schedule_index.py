@@ -0,0 +1,213 @@
+"""
+Local index (sqlite file, with the sqlite_utils library) of the schedule of the NHL seasons, built from the responses
+of the `schedule` endpoint (see `Schedule_endpoints_Fetcher`), so that the game ids can be looked up without any GET request :
+
+    index = Schedule_Index(DATA_FOLDER / "schedule_index.sqlite")
+    index.refresh(2019)                                     # only the games not over yet are requested again
+    index.game_ids(2019, game_types=["P"])                  # all playoff games of 2019
+    index.games(date=datetime.date.today(), status="Live")  # games live today (as of the last refresh)
+
+Table `games` : gamePk, season, gameType, date (local date of the game), gameDate (UTC), homeTeam, homeTeamId, awayTeam, awayTeamId,
+    status (abstractGameState : 'Preview', 'Live', 'Final'), updated_at
+Table `seasons` : season, refreshed_at, gameTypes (the game types indexed, comma separated)
+"""
+
+import datetime
+import os
+import time
+from pathlib import Path
+from typing import Iterable, List, Union
+
+import pandas as pd
+from loguru import logger
+from sqlite_utils import Database
+
+from .http_cache import FINAL_GAME_STATES
+
+def default_schedule_index_path() -> Path:
+    return Path(os.getenv('DATA_FOLDER')) / 'schedule_index.sqlite'
+
+
+class Schedule_Index:
+
+    def __init__(self, sqlite_path_file : Union[str, Path] = None) -> None:
+        """
+        Args:
+            sqlite_path_file (Union[str, Path], optional): sqlite file of the index (created if needed). Defaults to `default_schedule_index_path()`.
+        """
+        self.sqlite_path_file = Path(sqlite_path_file) if sqlite_path_file is not None else default_schedule_index_path()
+        self.sqlite_path_file.parent.mkdir(parents=True, exist_ok=True)
+        self.db = Database(self.sqlite_path_file)
+
+        self.db["games"].create(
+            {
+                "gamePk": int,
+                "season": int,
+                "gameType": str,
+                "date": str,
+                "gameDate": str,
+                "homeTeam": str,
+                "homeTeamId": int,
+                "awayTeam": str,
+                "awayTeamId": int,
+                "status": str,
+                "updated_at": float,
+            },
+            pk="gamePk",
+            if_not_exists=True,
+        )
+        self.db["games"].create_index(["season", "gameType"], if_not_exists=True)
+        self.db["games"].create_index(["date"], if_not_exists=True)
+        self.db["seasons"].create(
+            {
+                "season": int,
+                "refreshed_at": float,
+                "gameTypes": str,
+            },
+            pk="season",
+            if_not_exists=True,
+        )
+
+    # ------------------------------------------------------------------ refresh
+
+    def _upsert_schedule(self, response : dict) -> int:
+        """Upsert every game of a response of the `schedule` endpoint, return the number of games
+        """
+        now = time.time()
+        rows = [
+            {
+                "gamePk": game["gamePk"],
+                "season": int(str(game["season"])[:4]),
+                "gameType": game["gameType"],
+                "date": date_data["date"],
+                "gameDate": game["gameDate"],
+                "homeTeam": game["teams"]["home"]["team"].get("name", None),
+                "homeTeamId": game["teams"]["home"]["team"].get("id", None),
+                "awayTeam": game["teams"]["away"]["team"].get("name", None),
+                "awayTeamId": game["teams"]["away"]["team"].get("id", None),
+                "status": game.get("status", {}).get("abstractGameState", None),
+                "updated_at": now,
+            }
+            for date_data in response["dates"]
+            for game in date_data["games"]
+        ]
+        self.db["games"].upsert_all(rows, pk="gamePk")
+        return len(rows)
+
+    def indexed_game_types(self, season : int) -> List[str]:
+        """Game types whose schedule of the season was already requested (see `refresh()`), none if the season is not indexed
+        """
+        rows = list(self.db["seasons"].rows_where("season = ?", [season]))
+        # seasons indexed before the game types were recorded : unknown, requested again
+        return rows[0]["gameTypes"].split(",") if rows and rows[0].get("gameTypes") else []
+
+    def is_season_indexed(self, season : int, game_types : Iterable[str] = ("R", "P")) -> bool:
+        """True if the schedule of the season was already requested for every type of `game_types` (see `refresh()`)
+        """
+        return set(game_types) <= set(self.indexed_game_types(season))
+
+    def is_season_over(self, season : int) -> bool:
+        """True if the season was already indexed and all its games are over (its schedule can not change anymore)
+        """
+        if not self.indexed_game_types(season):
+            return False
+        return self.db["games"].count_where(
+            f"season = ? AND (status IS NULL OR status NOT IN ({', '.join('?' * len(FINAL_GAME_STATES))}))",
+            [season, *FINAL_GAME_STATES],
+        ) == 0
+
+    def refresh(self, season : int, game_types : Iterable[str] = ("R", "P"), force : bool = False) -> None:
+        """Bring the index of `season` up-to-date for `game_types` and the game types already indexed :
+            - a game type not indexed yet (or `force`) : the whole schedule of the season is requested
+            - season over : nothing is requested
+            - otherwise : only the schedule from the date of the first game not over is requested
+        """
+        from .nhl_rest_api_fetcher import Schedule_endpoints_Fetcher
+
+        indexed_game_types = self.indexed_game_types(season)
+        # a season partially indexed (i.e. only "P") would otherwise look up-to-date and miss the other types for good
+        game_types = list(dict.fromkeys([*indexed_game_types, *game_types]))
+        query_parameters = {"gameType": ",".join(game_types)}
+        if force or not set(game_types) <= set(indexed_game_types):
+            query_parameters["season"] = f"{season}{season+1}"
+        elif self.is_season_over(season):
+            logger.info(f"Schedule of season {season} is over, index up-to-date")
+            return
+        else:
+            first_date, last_date = self.db.execute(
+                f"""
+                SELECT MIN(date), MAX(date) FROM games
+                WHERE season = ? AND (status IS NULL OR status NOT IN ({', '.join('?' * len(FINAL_GAME_STATES))}))
+                """,
+                [season, *FINAL_GAME_STATES],
+            ).fetchone()
+            # playoff games are scheduled after the regular season, request until the end of the season
+            query_parameters.update({"startDate": first_date, "endDate": max(last_date, f"{season+1}-07-31")})
+
+        nb_games = self._upsert_schedule(
+            Schedule_endpoints_Fetcher(path="schedule", query_parameters=query_parameters).fetch()
+        )
+        self.db["seasons"].upsert(
+            {"season": season, "refreshed_at": time.time(), "gameTypes": ",".join(game_types)}, pk="season", alter=True,
+        )
+        logger.info(f"Schedule index of season {season} refreshed ({nb_games} games with {query_parameters})")
+
+    def refresh_dates(self, start_date : Union[str, datetime.date], end_date : Union[str, datetime.date] = None) -> None:
+        """Bring the index up-to-date for the games between `start_date` and `end_date` (`start_date` if None), i.e. the games of today
+        """
+        from .nhl_rest_api_fetcher import Schedule_endpoints_Fetcher
+
+        end_date = end_date if end_date is not None else start_date
+        self._upsert_schedule(
+            Schedule_endpoints_Fetcher(
+                path="schedule",
+                query_parameters={"startDate": str(start_date), "endDate": str(end_date)},
+            ).fetch()
+        )
+
+    # ------------------------------------------------------------------ queries
+
+    def _where(self, season=None, game_types=None, date=None, status=None):
+        clauses, parameters = [], []
+        if season is not None:
+            clauses.append("season = ?")
+            parameters.append(int(season))
+        if game_types is not None:
+            game_types = list(game_types)
+            clauses.append(f"gameType IN ({', '.join('?' * len(game_types))})")
+            parameters.extend(game_types)
+        if date is not None:
+            clauses.append("date = ?")
+            parameters.append(str(date))
+        if status is not None:
+            clauses.append("status = ?")
+            parameters.append(status)
+        return " AND ".join(clauses) or "1", parameters
+
+    def game_ids(
+            self,
+            season : int = None,
+            game_types : Iterable[str] = None,
+            date : Union[str, datetime.date] = None,
+            status : str = None,
+        ) -> List[int]:
+        """gamePk of the indexed games matching every criterion given (ordered by date), no GET request
+        """
+        where, parameters = self._where(season, game_types, date, status)
+        return [
+            row[0] for row in self.db.execute(f"SELECT gamePk FROM games WHERE {where} ORDER BY gameDate, gamePk", parameters).fetchall()
+        ]
+
+    def games(
+            self,
+            season : int = None,
+            game_types : Iterable[str] = None,
+            date : Union[str, datetime.date] = None,
+            status : str = None,
+        ) -> pd.DataFrame:
+        """Same as `game_ids()` but every column of the index is returned
+        """
+        where, parameters = self._where(season, game_types, date, status)
+        return pd.DataFrame(
+            self.db["games"].rows_where(where, parameters, order_by="gameDate, gamePk")
+        )
@@ -1,11 +1,33 @@
 from typing import Generator, List, Tuple
 import os
 from pathlib import Path
-from omegaconf import DictConfig
+from omegaconf import DictConfig, OmegaConf
 import pandas as pd
 
 from .data_preprocessing import NHL_data_preprocessor
 from .feature_engineering import NHLFeatureEngineering
+from .feature_registry import FEATURES
+from .parquet_dataset import read_dataset
+
+def raw_data_subset(DATA_PIPELINE_CONFIG : DictConfig) -> Tuple[List[str], list]:
+    """(columns, filters) of the raw data to load, from the optional keys `raw_data_columns` and `raw_data_filters` of the config
+        (see `parquet_dataset.read_dataset()`), None if absent
+    """
+    columns = DATA_PIPELINE_CONFIG.get("raw_data_columns", None)
+    filters = DATA_PIPELINE_CONFIG.get("raw_data_filters", None)
+    return (
+        OmegaConf.to_container(columns) if columns is not None else None,
+        OmegaConf.to_container(filters) if filters is not None else None,
+    )
+
+def features_of_config(DATA_PIPELINE_CONFIG : DictConfig) -> List[str]:
+    """Features to compute, from the optional key `features` of the config (list of names, see `feature_registry.py`),
+        else from the keys of the features set to True (i.e. `distanceToGoal: True`)
+    """
+    features = DATA_PIPELINE_CONFIG.get("features", None)
+    if features is not None:
+        return list(features)
+    return [name for name in FEATURES if DATA_PIPELINE_CONFIG.get(name, False)]
 
 def create_engineered_data_object(
         RAW_DATA_PATH : Path,
@@ -14,27 +36,18 @@ def create_engineered_data_object(
 ) -> NHLFeatureEngineering:
     
     GOAL_POSITION = [DATA_PIPELINE_CONFIG.GOAL_POSITION_X, DATA_PIPELINE_CONFIG.GOAL_POSITION_Y]
+    RAW_DATA_COLUMNS, RAW_DATA_FILTERS = raw_data_subset(DATA_PIPELINE_CONFIG)
     
     data_engineered = NHLFeatureEngineering(
                 RAW_DATA_PATH = RAW_DATA_PATH ,
-                distanceToGoal= DATA_PIPELINE_CONFIG.distanceToGoal,
-                angleToGoal= DATA_PIPELINE_CONFIG.angleToGoal,
-                isGoal= DATA_PIPELINE_CONFIG.isGoal,
-                emptyNet= DATA_PIPELINE_CONFIG.emptyNet,
+                features= features_of_config(DATA_PIPELINE_CONFIG),
                 verbose= DATA_PIPELINE_CONFIG.verbose,
                 imputeRinkSide= DATA_PIPELINE_CONFIG.imputeRinkSide,
-                periodTimeSeconds= DATA_PIPELINE_CONFIG.periodTimeSeconds,
-                lastEvent= DATA_PIPELINE_CONFIG.lastEvent,
-                lastCoordinates= DATA_PIPELINE_CONFIG.lastCoordinates,
-                timeElapsed= DATA_PIPELINE_CONFIG.timeElapsed,
-                distanceFromLastEvent= DATA_PIPELINE_CONFIG.distanceFromLastEvent,
-                rebound= DATA_PIPELINE_CONFIG.rebound,
-                changeAngle= DATA_PIPELINE_CONFIG.changeAngle,
-                speed= DATA_PIPELINE_CONFIG.speed,
-                computePowerPlayFeatures= DATA_PIPELINE_CONFIG.computePowerPlayFeatures,
                 version= version,
                 GOAL_POSITION=GOAL_POSITION,
                 nhl_api_version= DATA_PIPELINE_CONFIG.NHL_api_version,
+                rawDataColumns= RAW_DATA_COLUMNS,
+                rawDataFilters= RAW_DATA_FILTERS,
             )
     return data_engineered
 
@@ -79,7 +92,8 @@ def init_data_for_isgoal_classification_experiment(
     if load_engineered_data_from:
         PATH_RESUME_DATA_ENGINEERED = Path(os.getenv("DATA_FOLDER"))/ load_engineered_data_from
         logger.info(f" SKIPPING FEATURE ENGINEERING COMPUTATION : Loading feature-engineered data from {PATH_RESUME_DATA_ENGINEERED}")
-        df_processed = pd.read_csv(PATH_RESUME_DATA_ENGINEERED)
+        # the feature-engineered data keeps the season/gameType/eventType columns, the same filters apply
+        df_processed = read_dataset(PATH_RESUME_DATA_ENGINEERED, filters=raw_data_subset(DATA_PIPELINE_CONFIG)[1])
         DATA_ENGINEERED_OBJ = PATH_RESUME_DATA_ENGINEERED
     
     else : 
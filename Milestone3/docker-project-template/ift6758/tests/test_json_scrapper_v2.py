@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ift6758.data.json_backend import load_file
+from ift6758.data.json_scrapper_v2 import JsonParser_v2
+from ift6758.data.play_schema import apply_schema
+
+# recorded play-by-play of the v2 API (data/ at the root of the repository)
+SAMPLE_GAME = Path(__file__).resolve().parents[4] / "data" / "v2_api" / "2022030411.json"
+
+@pytest.fixture(scope="module")
+def sample_game():
+    if not SAMPLE_GAME.exists():
+        pytest.skip(f"{SAMPLE_GAME} not found")
+    return load_file(SAMPLE_GAME)
+
+def test_vectorized_parsing_matches_the_rows_of_extract_play_data(sample_game):
+    """`normalize_plays()` gives the same frame as the play-by-play `extract_play_data()`"""
+    vectorized = JsonParser_v2(data=sample_game, shotGoalOnly=True).df
+    rows = apply_schema(pd.DataFrame(list(JsonParser_v2().iter_rows(True, SAMPLE_GAME))))
+
+    assert len(vectorized) > 0
+    pd.testing.assert_frame_equal(vectorized, rows)
+
+@pytest.mark.parametrize("batch_size", [1, 7, 10_000])
+def test_streaming_parsing_matches_the_vectorized_parsing(sample_game, batch_size):
+    """`parse_json_stream()` gives the same frame as `parse_json_file()`, whatever the size of the batches"""
+    vectorized = JsonParser_v2(data=sample_game, shotGoalOnly=True).df
+    streamed = JsonParser_v2().parse_json_stream(True, SAMPLE_GAME, batch_size=batch_size)
+
+    pd.testing.assert_frame_equal(vectorized, streamed)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ift6758.data.feature_engineering import power_play_state
+
+def _state(events):
+    """`power_play_state()` of events (gameId, gameSeconds, penaltyMinutes or None, home team penalized)"""
+    gameIds, gameSeconds, penaltyMinutes, homePenalized = zip(*events)
+    elapsed, home, away = power_play_state(
+        np.array(gameIds),
+        np.array(gameSeconds, dtype=np.int64),
+        np.array([np.nan if minutes is None else minutes for minutes in penaltyMinutes], dtype=float),
+        np.array(homePenalized, dtype=bool),
+    )
+    return elapsed.tolist(), home.tolist(), away.tolist()
+
+def _state_loop(events):
+    """Same as `power_play_state()`, event by event : the penalties running are the ones given before the event and not over"""
+    elapsed, home, away = [], [], []
+    penalties, start = [], None
+    for i, (gameId, seconds, minutes, homePenalized) in enumerate(events):
+        if i == 0 or gameId != events[i - 1][0]:
+            penalties, start = [], None
+        running = [penalized for end, penalized in penalties if end > seconds]
+        home.append(max(5 - running.count(True), 3))
+        away.append(max(5 - running.count(False), 3))
+        if home[-1] == away[-1]:
+            start = None
+        elif start is None:
+            start = seconds
+        elapsed.append(0 if start is None else seconds - start)
+        if minutes:
+            penalties.append((seconds + 60 * minutes, homePenalized))
+    return elapsed, home, away
+
+def test_one_penalty():
+    events = [(1, 0, 2, True), (1, 30, None, False), (1, 100, None, False), (1, 120, None, False), (1, 150, None, False)]
+    assert _state(events) == ([0, 0, 70, 0, 0], [5, 4, 4, 5, 5], [5, 5, 5, 5, 5])
+
+def test_stacked_penalties_leave_at_least_3_skaters():
+    events = [
+        (1, 0, 2, True), (1, 10, 2, True), (1, 20, 5, True), (1, 30, None, False),
+        (1, 125, None, False), (1, 135, None, False), (1, 400, None, False),
+    ]
+    assert _state(events) == ([0, 0, 10, 20, 115, 125, 0], [5, 4, 3, 3, 3, 4, 5], [5, 5, 5, 5, 5, 5, 5])
+
+def test_penalties_of_both_teams_and_of_0_minutes():
+    events = [(1, 0, 2, True), (1, 5, 2, False), (1, 10, None, False), (1, 60, 0, False), (1, 121, None, False), (1, 124, None, False)]
+    assert _state(events) == ([0, 0, 0, 0, 0, 3], [5, 4, 4, 4, 5, 5], [5, 5, 4, 4, 4, 4])
+
+def test_penalties_do_not_carry_over_to_the_next_game():
+    events = [(1, 0, 5, True), (1, 10, None, False), (2, 20, 2, False), (2, 30, None, False), (2, 50, None, False)]
+    assert _state(events) == ([0, 0, 0, 0, 20], [5, 4, 5, 5, 5], [5, 5, 5, 4, 4])
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_the_event_by_event_loop(seed):
+    rng = np.random.default_rng(seed)
+    events = []
+    for gameId in range(3):
+        seconds = np.sort(rng.integers(0, 3 * 20 * 60, size=rng.integers(1, 80)))
+        for second in seconds:
+            minutes = int(rng.choice([0, 2, 4, 5, 10])) if rng.random() < 0.2 else None
+            events.append((gameId, int(second), minutes, bool(rng.random() < 0.5)))
+    assert _state(events) == _state_loop(events)
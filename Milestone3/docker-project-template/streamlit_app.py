@@ -129,6 +129,18 @@ def retreive_used_data():
 
     return df
 
+def get_games_of_today() -> pd.DataFrame:
+    """
+    Games scheduled today according to the local schedule index (no GET request), empty if the index was never built.
+    """
+    import datetime
+    from ift6758.data.schedule_index import Schedule_Index, default_schedule_index_path
+
+    if not default_schedule_index_path().exists():
+        return pd.DataFrame()
+
+    return Schedule_Index().games(date=datetime.date.today())
+
 def get_backend_logs():
 
     return ServingClient(
@@ -203,6 +215,11 @@ with tab1:
 
     with st.container():
 
+        games_of_today = get_games_of_today()
+        if len(games_of_today) > 0:
+            with st.expander("Games of today (local schedule index)"):
+                st.dataframe(games_of_today[['gamePk', 'gameType', 'awayTeam', 'homeTeam', 'status']], hide_index=True)
+
         game_id_input = st.text_input(
             "Game ID",
             value='2021020329',